@@ -0,0 +1,223 @@
+"""Load the osm4routing CSVs into Postgres with COPY and write the routing graph snapshot.
+
+This one command replaces the import_csv.sh steps and the route-api snapshot
+build. Elevation (nodes_with_elevation.csv) and POI (nodes_with_poi.csv,
+osm_point.csv) columns are merged into each node row before it is COPYed, so
+``nodes`` is written once, with no UPDATE passes. The spatial indexes are
+built after the data is in, and everything commits as one transaction. The
+edge and node columns read on the way through are kept as NumPy arrays, and
+the snapshot route-api memory-maps at startup is written from them. This
+skips the ORM round trip over every edge row.
+
+Needs the route-api requirements, and the tables from init_db.sql::
+
+    docker compose up -d db
+    python bulk_load.py --csv-dir csv_data
+"""
+import argparse
+import csv
+import io
+import logging
+import math
+import os
+import sys
+import time
+import numpy as np
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'route-api'))
+from create_graph import FOOT_FORBIDDEN, build_graph_from_edges  # noqa: E402
+from graph_snapshot import SOURCE_CHECKSUM_SQL, checksum_of, write_snapshot  # noqa: E402
+from node_store import build_node_store  # noqa: E402
+
+# Database connection settings
+conn_settings = {
+    "dbname": "route-db",
+    "user": "user",
+    "password": "example",
+    "host": "localhost",
+    "port": "5432"
+}
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s',
+                    handlers=[logging.StreamHandler()])  # Logs to console
+
+logger = logging.getLogger()
+
+COPY_NODES = "COPY nodes (id, longitude, latitude, geom, elevation, is_poi, poi_desc) FROM STDIN WITH (FORMAT csv)"
+COPY_EDGES = ("COPY edges (id, osm_id, source, target, length, foot, car_forward, car_backward, "
+              "bike_forward, bike_backward, train, wkt) FROM STDIN WITH (FORMAT csv)")
+COPY_POIS = "COPY osm_poi_points (id, name, tourism, historic, leisure, way) FROM STDIN WITH (FORMAT csv)"
+
+# Indexes are cheaper to build once over the loaded rows than to maintain row by row. The
+# change-log trigger only fires on UPDATE, but is recreated with the rest at the end.
+PREPARE_LOAD = [
+    "DROP TRIGGER IF EXISTS nodes_log_change ON nodes;",
+    "DROP INDEX IF EXISTS idx_nodes_geom;",
+    "DROP INDEX IF EXISTS idx_osm_poi_points_geom;",
+]
+TRUNCATE_TABLES = "TRUNCATE edges, nodes, osm_poi_points, node_changes RESTART IDENTITY;"
+FINISH_LOAD = [
+    "UPDATE osm_poi_points SET geom = ST_Transform(way, 4326);",
+    "CREATE INDEX idx_nodes_geom ON nodes USING GIST (geom);",
+    "CREATE INDEX idx_osm_poi_points_geom ON osm_poi_points USING GIST (geom);",
+    # Log later changes to node attributes so running route-api workers can refresh incrementally
+    """
+    CREATE TRIGGER nodes_log_change
+    AFTER UPDATE OF longitude, latitude, elevation, is_poi, poi_desc ON nodes
+    FOR EACH ROW EXECUTE FUNCTION log_node_change();
+    """,
+    "ANALYZE nodes; ANALYZE edges; ANALYZE osm_poi_points;",
+]
+
+
+def read_rows(path, chunk_size):
+    """Yield lists of at most ``chunk_size`` CSV rows, after the header."""
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def copy_rows(cursor, statement, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(statement, buffer)
+
+
+def read_elevations(path):
+    """Sorted node ids and their elevations (NaN where SRTM had no value)."""
+    ids, elevations = [], []
+    for chunk in read_rows(path, 100000):
+        ids.extend(int(row[0]) for row in chunk)
+        elevations.extend(float(row[1]) if row[1] else math.nan for row in chunk)
+    ids = np.array(ids, dtype=np.int64)
+    elevations = np.array(elevations, dtype=np.float64)
+    order = np.argsort(ids, kind='stable')
+    return ids[order], elevations[order]
+
+
+def load_pois(cursor, point_path, node_poi_path, chunk_size):
+    """COPY osm_point.csv into osm_poi_points; returns ``{node_id: description}`` of the POI nodes."""
+    names = {}
+    for chunk in read_rows(point_path, chunk_size):
+        copy_rows(cursor, COPY_POIS, chunk)
+        names.update((int(row[0]), row[1]) for row in chunk)
+    descriptions = {}
+    for chunk in read_rows(node_poi_path, chunk_size):
+        for node_id, poi_ids in chunk:
+            found = [names[poi_id] for poi_id in map(int, poi_ids.split()) if poi_id in names]
+            # Same as the SQL merge: a node is a POI if any of its POIs exists, and unnamed ones are skipped
+            if found:
+                descriptions[int(node_id)] = ', '.join(name for name in found if name)
+    logger.info(f"{len(names):,} POIs, attached to {len(descriptions):,} nodes")
+    return descriptions
+
+
+def load_nodes(cursor, path, elevations, descriptions, chunk_size):
+    """COPY nodes.csv with the elevation and POI columns filled in; returns the node columns as arrays."""
+    elevation_ids, elevation_values = elevations
+    columns = {'ids': [], 'longitude': [], 'latitude': [], 'elevation': []}
+    count = 0
+    for chunk in read_rows(path, chunk_size):
+        ids = np.array([int(row[0]) for row in chunk], dtype=np.int64)
+        elevation = np.full(len(ids), math.nan)
+        if len(elevation_ids):
+            positions = np.minimum(np.searchsorted(elevation_ids, ids), len(elevation_ids) - 1)
+            found = elevation_ids[positions] == ids
+            elevation[found] = elevation_values[positions[found]]
+        rows = []
+        for row, node_elevation in zip(chunk, elevation.tolist()):
+            description = descriptions.get(int(row[0]))
+            rows.append((
+                row[0], row[1], row[2], f'SRID=4326;POINT({row[1]} {row[2]})',
+                '' if math.isnan(node_elevation) else repr(node_elevation),
+                '' if description is None else 't', description,
+            ))
+        copy_rows(cursor, COPY_NODES, rows)
+        columns['ids'].append(ids)
+        columns['longitude'].append(np.array([float(row[1]) for row in chunk]))
+        columns['latitude'].append(np.array([float(row[2]) for row in chunk]))
+        columns['elevation'].append(np.nan_to_num(elevation).astype(np.float32))
+        count += len(ids)
+        logger.info(f"{count:,} nodes loaded")
+    return {name: np.concatenate(arrays) if arrays else np.empty(0) for name, arrays in columns.items()}
+
+
+def load_edges(cursor, path, chunk_size):
+    """COPY edges.csv; returns ``(sources, targets, lengths, ways)`` of the edges pedestrians may use."""
+    sources, targets, lengths, ways = [], [], [], []
+    count = 0
+    for chunk in read_rows(path, chunk_size):
+        copy_rows(cursor, COPY_EDGES, chunk)
+        foot = [row for row in chunk if row[5] != FOOT_FORBIDDEN]
+        sources.append(np.array([int(row[2]) for row in foot], dtype=np.int64))
+        targets.append(np.array([int(row[3]) for row in foot], dtype=np.int64))
+        lengths.append(np.array([float(row[4]) for row in foot], dtype=np.float32))
+        ways.append(np.array([int(row[1] or 0) for row in foot], dtype=np.int64))
+        count += len(chunk)
+        logger.info(f"{count:,} edges loaded")
+    if not sources:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    return np.concatenate(sources), np.concatenate(targets), np.concatenate(lengths), np.concatenate(ways)
+
+
+def bulk_load(csv_dir, snapshot, chunk_size=100000):
+    """Load every table and write the snapshot; returns the snapshot header."""
+    started = time.monotonic()
+    path = lambda name: os.path.join(csv_dir, name)  # noqa: E731
+    connection = psycopg2.connect(**conn_settings)
+    try:
+        with connection:  # One transaction: a failed load leaves the old data in place
+            cursor = connection.cursor()
+            for statement in PREPARE_LOAD:
+                cursor.execute(statement)
+            cursor.execute(TRUNCATE_TABLES)
+            elevations = read_elevations(path('nodes_with_elevation.csv'))
+            descriptions = load_pois(cursor, path('osm_point.csv'), path('nodes_with_poi.csv'), chunk_size)
+            nodes = load_nodes(cursor, path('nodes.csv'), elevations, descriptions, chunk_size)
+            del elevations
+            sources, targets, lengths, ways = load_edges(cursor, path('edges.csv'), chunk_size)
+            logger.info(f"Tables loaded in {time.monotonic() - started:.0f}s, building indexes...")
+            for statement in FINISH_LOAD:
+                cursor.execute(statement)
+        logger.info(f"Committed after {time.monotonic() - started:.0f}s")
+        # Same fingerprint route-api checks the snapshot against (GRAPH_SNAPSHOT_CHECK=1)
+        with connection, connection.cursor() as cursor:
+            cursor.execute(SOURCE_CHECKSUM_SQL)
+            checksum = checksum_of(cursor.fetchone())
+    finally:
+        connection.close()
+
+    graph = build_graph_from_edges(sources, targets, lengths, ways)
+    del sources, targets, lengths, ways
+    is_poi = np.isin(nodes['ids'], np.fromiter(descriptions, dtype=np.int64, count=len(descriptions)))
+    node_store = build_node_store(graph, nodes['ids'], nodes['longitude'], nodes['latitude'],
+                                  nodes['elevation'], is_poi, descriptions)
+    header = write_snapshot(snapshot, graph, node_store, checksum)
+    logger.info(f"Wrote {snapshot}: {header['node_count']:,} nodes, {header['edge_count']:,} edges, "
+                f"checksum {checksum}, {time.monotonic() - started:.0f}s in total")
+    return header
+
+
+def main():
+    currdir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Bulk load the routing tables and write the graph snapshot.')
+    parser.add_argument('--csv-dir', default=os.path.join(currdir, 'csv_data'),
+                        help='directory with nodes.csv, edges.csv, osm_point.csv, nodes_with_elevation.csv and nodes_with_poi.csv')
+    parser.add_argument('--snapshot', default=os.path.join(currdir, '..', 'route-api', 'cache', 'graph.snap'))
+    parser.add_argument('--chunk-size', type=int, default=100000, help='CSV rows per COPY (default: %(default)s)')
+    args = parser.parse_args()
+    bulk_load(args.csv_dir, args.snapshot, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,170 @@
+"""Add SRTM elevations to csv_data/nodes.csv, in parallel and resumably.
+
+The input is streamed in chunks. Within a chunk, nodes are grouped by their
+1x1 degree SRTM tile and cut into batches, so a worker reads each tile file
+once for many nodes. Batches run on a process pool, and each finished batch is
+appended to the output CSV and flushed at once. The output file doubles as the
+checkpoint: a rerun skips every node already in it, so a crash only loses the
+batches in flight. Input rows that already carry an elevation are copied to
+the output as they are, without a lookup.
+
+Usage::
+
+    python elevation.py --workers 8
+"""
+import argparse
 import csv
 import logging
+import math
 import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
 from pyhigh import get_elevation_batch
 
-logging.basicConfig(level=logging.INFO, 
+logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s',
                     handlers=[logging.StreamHandler()])  # Logs to console
 
 logger = logging.getLogger()
-elevation_data = {}
 currdir = os.getcwd()
 
-def get_elevation():
-    # Dictionary to store node_id as key and elevation as value
 
-    # Read coordinates from the CSV file
-    coordinates = []
-    FILEPATH = os.path.join(currdir, 'csv_data/nodes.csv')
+def fetch_batch(batch):
+    """Elevations for one batch of ``(node_id, lat, lon)``; runs in a worker process."""
+    elevations = get_elevation_batch([(lat, lon) for _, lat, lon in batch])
+    return [(node_id, elevation) for (node_id, _, _), elevation in zip(batch, elevations)]
+
+
+def completed_node_ids(output_path):
+    """Sorted ids already in the output file, after cutting off a line left half-written by a crash."""
+    if not os.path.exists(output_path):
+        return np.empty(0, dtype=np.int64)
+    with open(output_path, 'rb+') as file:
+        size = file.seek(0, os.SEEK_END)
+        tail_start = max(size - 4096, 0)
+        file.seek(tail_start)
+        end = tail_start + file.read().rfind(b'\n') + 1
+        if end < size:
+            file.truncate(end)
+    with open(output_path, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        # Rows with an empty elevation (no SRTM coverage) count as done too
+        ids = np.fromiter((int(row[0]) for row in reader if len(row) == 2), dtype=np.int64)
+    return np.sort(ids)
 
-    with open(FILEPATH, mode='r') as file:
+
+def read_chunks(input_path, chunk_size, done):
+    """Yield ``(pending, known)`` for every ``chunk_size`` input rows.
+
+    ``pending`` are the ``(node_id, lat, lon)`` still needing an elevation, ``known``
+    the ``(node_id, elevation)`` of rows that came with one.
+    """
+    with open(input_path, newline='') as file:
         reader = csv.DictReader(file)
+        has_elevation = 'elevation' in (reader.fieldnames or [])
+        chunk = []
         for row in reader:
-            # Extract node_id, latitude, and longitude from the row
-            node_id = row['id']
-            lat = float(row['lat'])
-            lon = float(row['lon'])
-            # Append a tuple with node_id and coordinates
-            coordinates.append((node_id, (lat, lon)))
-
-    # Process in batches of 100
-    batch_size = 100
-    for i in range(0, len(coordinates), batch_size):
-        batch = coordinates[i:i + batch_size]
-        # Prepare the batch of only coordinates for the API call
-        coord_batch = [coord for _, coord in batch]
-        
-        try:
-            # Get elevation data for the batch
-            elevations = get_elevation_batch(coord_batch) 
-            # Store results in the dictionary
-            for (node_id, coord), elevation in zip(batch, elevations):
-                elevation_data[node_id] = elevation
-                logger.info(f"Node ID: {node_id}, Coordinates: {coord}, Elevation: {elevation} meters")
-        
-        except Exception as e:
-            logger.error(f"Error retrieving elevation for batch starting at index {i}: {e}")
-  
-def save_dict_to_csv(filename):
-    output_file_path = os.path.join(currdir, filename)
-    with open(output_file_path, mode='w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['node_id', 'elevation'])  # Write the header
-        for node_id, elevation in elevation_data.items():
-            writer.writerow([node_id, elevation])  # Write each node_id and elevation
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield pending_nodes(chunk, done, has_elevation)
+                chunk = []
+        if chunk:
+            yield pending_nodes(chunk, done, has_elevation)
+
+
+def pending_nodes(rows, done, has_elevation):
+    ids = np.array([int(row['id']) for row in rows], dtype=np.int64)
+    positions = np.minimum(np.searchsorted(done, ids), max(len(done) - 1, 0))
+    finished = done[positions] == ids if len(done) else np.zeros(len(ids), dtype=bool)
+    pending, known = [], []
+    for row, skip in zip(rows, finished.tolist()):
+        if skip:
+            continue
+        if has_elevation and row['elevation']:
+            known.append((int(row['id']), row['elevation']))
+        else:
+            pending.append((int(row['id']), float(row['lat']), float(row['lon'])))
+    return pending, known
+
+
+def tile_batches(nodes, batch_size):
+    """Cut nodes into batches that each stay within one SRTM tile."""
+    tiles = defaultdict(list)
+    for node in nodes:
+        tiles[(math.floor(node[1]), math.floor(node[2]))].append(node)
+    for tile_nodes in tiles.values():
+        for i in range(0, len(tile_nodes), batch_size):
+            yield tile_nodes[i:i + batch_size]
+
+
+def get_elevation(input_path, output_path, workers, chunk_size=100000, batch_size=100):
+    """Fill ``output_path`` with ``node_id,elevation`` rows for every node of ``input_path``; returns nodes written."""
+    done = completed_node_ids(output_path)
+    if len(done):
+        logger.info(f"Resuming: {len(done):,} nodes already have an elevation in {output_path}")
+    new_file = not os.path.exists(output_path)
+    started = time.monotonic()
+    written = failed = 0
+
+    with open(output_path, mode='a', newline='') as output, ProcessPoolExecutor(workers) as pool:
+        writer = csv.writer(output)
+        if new_file:
+            writer.writerow(['node_id', 'elevation'])
+        in_flight = {}
+
+        def collect(block):
+            """Write out finished batches; with ``block``, wait for at least one first."""
+            nonlocal written, failed
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED) if block else (
+                [future for future in in_flight if future.done()], None)
+            for future in finished:
+                batch = in_flight.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # Left out of the output, so the next run retries it
+                    failed += len(batch)
+                    logger.error(f"Error retrieving elevation for batch starting at node {batch[0][0]}: {e}")
+                    continue
+                writer.writerows(results)
+                written += len(results)
+            output.flush()
+
+        for chunk_number, (nodes, known) in enumerate(read_chunks(input_path, chunk_size, done)):
+            # Elevations the input already has go straight through, so the import keeps them
+            writer.writerows(known)
+            written += len(known)
+            for batch in tile_batches(nodes, batch_size):
+                # Bound the batches held in memory to a few per worker
+                while len(in_flight) >= 4 * workers:
+                    collect(block=True)
+                in_flight[pool.submit(fetch_batch, batch)] = batch
+            collect(block=False)
+            elapsed = time.monotonic() - started
+            logger.info(f"Chunk {chunk_number + 1}: {written:,} nodes written, {failed:,} failed, "
+                        f"{written / elapsed if elapsed else 0:,.0f} nodes/s with {workers} workers")
+        while in_flight:
+            collect(block=True)
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Done: {written:,} nodes in {elapsed:.0f}s ({written / elapsed if elapsed else 0:,.0f} nodes/s, "
+                f"{workers} workers), {failed:,} failed and left for the next run")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add SRTM elevations to the nodes CSV.')
+    parser.add_argument('--input', default=os.path.join(currdir, 'csv_data/nodes.csv'))
+    parser.add_argument('--output', default=os.path.join(currdir, 'csv_data/nodes_with_elevation.csv'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=100000, help='input rows read at a time (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=100, help='nodes per elevation lookup (default: %(default)s)')
+    args = parser.parse_args()
+    get_elevation(args.input, args.output, args.workers, args.chunk_size, args.batch_size)
+
 
 if __name__ == "__main__":
-    get_elevation()
-    save_dict_to_csv('csv_data/nodes_with_elevation.csv')
+    main()
@@ -37,4 +37,11 @@ psql -h db -U user -d $database -c "
       update nodes set poi_desc = tmp.names, is_poi = true FROM tmp where tmp.node_id = nodes.id;
       "
 
+# Log later changes to node attributes so running route-api workers can refresh incrementally
+psql -h db -U user -d $database -c "
+        CREATE TRIGGER nodes_log_change
+        AFTER UPDATE OF longitude, latitude, elevation, is_poi, poi_desc ON nodes
+        FOR EACH ROW EXECUTE FUNCTION log_node_change();
+      "
+
 echo "Data migration completed."
\ No newline at end of file
@@ -2,6 +2,7 @@ DROP EXTENSION postgis_tiger_geocoder;
 DROP TABLE IF EXISTS edges;
 DROP TABLE IF EXISTS nodes;
 DROP TABLE IF EXISTS osm_poi_points;
+DROP TABLE IF EXISTS node_changes;
 
 CREATE EXTENSION IF NOT EXISTS postgis;
 CREATE TABLE nodes (
@@ -53,6 +54,19 @@ CREATE TABLE temp_node_elevation (
     elevation FLOAT
 );
 
+-- node change log, read by the route-api node store to refresh incrementally
+CREATE TABLE node_changes (
+    seq BIGSERIAL PRIMARY KEY,
+    node_id BIGINT NOT NULL,
+    changed_at TIMESTAMP DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION log_node_change() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO node_changes(node_id) VALUES (NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
 
 CREATE INDEX idx_nodes_geom ON nodes USING GIST (geom);
 CREATE INDEX idx_osm_poi_points_geom ON osm_poi_points USING GIST (geom);
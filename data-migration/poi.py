@@ -1,6 +1,24 @@
+"""Attach every POI in osm_poi_points to its nearest node, in one set-based pass.
+
+A single lateral join finds each POI's nearest node within ``SEARCH_RADIUS``
+metres. The geometry bounding-box test uses the GiST index on ``nodes.geom``
+and leaves only a handful of candidates, which are then measured on the
+geography. The per-node groups stream out of a server-side cursor and go
+straight into ``temp_node_pois`` through ``COPY``. The ``nodes`` POI columns
+are then updated from that table in the same transaction.
+
+Usage::
+
+    python poi.py                                    # match and update nodes in the database
+    python poi.py --csv csv_data/nodes_with_poi.csv  # also write the CSV import_csv.sh loads
+"""
+import argparse
 import csv
-import psycopg2
+import io
 import logging
+import time
+import psycopg2
+
 # Database connection settings
 conn_settings = {
     "dbname": "route-db",
@@ -9,68 +27,109 @@ conn_settings = {
     "host": "localhost",
     "port": "5432"
 }
-logging.basicConfig(level=logging.INFO, 
+logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s',
                     handlers=[logging.StreamHandler()])  # Logs to console
 
 logger = logging.getLogger()
-nodes_dict = {}
-def find_nearby_nodes():
-    """Finds and prints nodes within 50 meters of each POI in the osm_poi_points table."""
-    # Connect to the PostgreSQL database
-    connection = psycopg2.connect(**conn_settings)
-    cursor = connection.cursor()
 
-    # Query to get all points in osm_poi_points
-    poi_query = "SELECT id, geom FROM osm_poi_points;"
+SEARCH_RADIUS = 100  # metres
+METERS_PER_DEGREE = 111320
+COPY_BATCH_ROWS = 50000
 
-    # Prepare a query to find nearby nodes within 50 meters
-    nearby_nodes_query = """
-      SELECT n.id, ST_AsText(n.geom), ST_Distance(n.geom::geography, %s::geography) as distance
-      FROM nodes AS n
-      WHERE ST_DWithin(n.geom::geography, %s::geography, 100);
-      """
+# ST_Expand grows both axes by the longitude span of the radius, which is the
+# wider one, so the box never cuts off a node inside the radius.
+NEAREST_NODES_QUERY = """
+    SELECT nearest.node_id, array_agg(p.id ORDER BY p.id)
+    FROM osm_poi_points AS p
+    CROSS JOIN LATERAL (
+        SELECT n.id AS node_id
+        FROM nodes AS n
+        WHERE n.geom && ST_Expand(p.geom, %(radius)s / (%(meters_per_degree)s * cos(radians(ST_Y(p.geom)))))
+          AND ST_DWithin(n.geom::geography, p.geom::geography, %(radius)s)
+        ORDER BY ST_Distance(n.geom::geography, p.geom::geography), n.id
+        LIMIT 1
+    ) AS nearest
+    WHERE p.geom IS NOT NULL
+    GROUP BY nearest.node_id;
+"""
 
-    try:
-        # Fetch all points of interest
-        cursor.execute(poi_query)
-        pois = cursor.fetchall()
-        # Iterate over each poi and find nodes within 50 meters
-        for index, poi in enumerate(pois):
-            poi_id = poi[0]
-            poi_geom = poi[1]
-            # Execute the nearby nodes query with the current poi's geometry
-            cursor.execute(nearby_nodes_query, (poi_geom, poi_geom))
-            nearby_nodes = cursor.fetchall()
-            if len(nearby_nodes) == 0:
-                logger.info(f"{index} poi not found.")
-                continue
-            # Print or process each nearby node
-            node_id, node_geom, distance = nearby_nodes[0]
-            nodes_dict.setdefault(node_id, []).append(poi_id)
-            logger.info(f" - Node ID: {node_id}, Distance: {distance:.2f} meters, Geometry: {node_geom}")
+COPY_NODE_POIS = "COPY temp_node_pois (node_id, poi_ids_text, poi_ids) FROM STDIN"
 
+# Same update import_csv.sh runs after loading nodes_with_poi.csv, plus clearing
+# nodes that no longer have a POI when the match is rerun.
+UPDATE_NODES_QUERIES = [
+    """
+    UPDATE nodes SET is_poi = NULL, poi_desc = NULL
+    WHERE is_poi AND NOT EXISTS (SELECT 1 FROM temp_node_pois temp WHERE temp.node_id = nodes.id);
+    """,
+    """
+    WITH tmp AS (
+        SELECT temp.node_id, ARRAY_TO_STRING(ARRAY_AGG(poi.name), ', ') AS names
+        FROM temp_node_pois temp
+        JOIN osm_poi_points poi ON poi.id = ANY(temp.poi_ids)
+        GROUP BY temp.node_id
+    )
+    UPDATE nodes SET poi_desc = tmp.names, is_poi = true FROM tmp WHERE tmp.node_id = nodes.id;
+    """,
+]
+
+
+def copy_rows(cursor, rows):
+    """``COPY`` ``(node_id, poi_ids)`` rows into temp_node_pois."""
+    buffer = io.StringIO()
+    for node_id, poi_ids in rows:
+        ids = [str(poi_id) for poi_id in poi_ids]
+        buffer.write(f"{node_id}\t{' '.join(ids)}\t{{{','.join(ids)}}}\n")
+    buffer.seek(0)
+    cursor.copy_expert(COPY_NODE_POIS, buffer)
+
+
+def match_pois(csv_path=None):
+    """Replace temp_node_pois with the nearest node of every POI and update nodes; returns ``(nodes, pois)`` matched."""
+    connection = psycopg2.connect(**conn_settings)
+    started = time.monotonic()
+    node_count = poi_count = 0
+    csv_file = open(csv_path, mode='w', newline='') if csv_path else None
+    try:
+        writer = csv.writer(csv_file) if csv_file else None
+        if writer:
+            writer.writerow(['node_id', 'pois_id'])
+        with connection:  # One transaction: commits on success, rolls back on error
+            cursor = connection.cursor()
+            cursor.execute("TRUNCATE temp_node_pois;")
+            # A named cursor keeps the result on the server; fetchmany pulls one batch at a time
+            matches = connection.cursor(name='poi_matches')
+            matches.execute(NEAREST_NODES_QUERY, {'radius': SEARCH_RADIUS, 'meters_per_degree': METERS_PER_DEGREE})
+            while True:
+                rows = matches.fetchmany(COPY_BATCH_ROWS)
+                if not rows:
+                    break
+                copy_rows(cursor, rows)
+                if writer:
+                    writer.writerows((node_id, ' '.join(str(poi_id) for poi_id in poi_ids)) for node_id, poi_ids in rows)
+                node_count += len(rows)
+                poi_count += sum(len(poi_ids) for _, poi_ids in rows)
+                logger.info(f"{poi_count:,} POIs matched to {node_count:,} nodes ({time.monotonic() - started:.0f}s)")
+            matches.close()
+            for query in UPDATE_NODES_QUERIES:
+                cursor.execute(query)
+            cursor.close()
     finally:
-        # Close the database connection
-        cursor.close()
+        if csv_file:
+            csv_file.close()
         connection.close()
+    logger.info(f"Done: {poi_count:,} POIs matched to {node_count:,} nodes in {time.monotonic() - started:.0f}s")
+    return node_count, poi_count
+
 
-def save_dict_to_csv(filename):
-    with open(filename, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        # Write header
-        writer.writerow(['node_id', 'pois_id'])
-        
-        # Write each node and its corresponding values
-        for key, values in nodes_dict.items():
-            # Join the list of values into a single string
-            values_as_strings = [str(value) for value in values]
-            writer.writerow([key, ' '.join(values_as_strings)])
-          
 def main():
-    """Main function to initiate the nearby node search."""
-    find_nearby_nodes()
-    save_dict_to_csv('nodes_with_poi.csv')
+    """Main function to initiate the POI matching."""
+    parser = argparse.ArgumentParser(description='Attach POIs to their nearest node.')
+    parser.add_argument('--csv', help='also write node_id,pois_id rows here, for import_csv.sh')
+    args = parser.parse_args()
+    match_pois(args.csv)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,243 @@
+"""asyncio serving mode for the route API (aiohttp).
+
+Serves the same endpoints as ``app.py`` on an event loop:
+
+- ``/proxy/*`` calls go through one shared ``aiohttp.ClientSession`` (and the
+  same cache as the Flask server), so a slow Google response only parks a
+  coroutine instead of holding a thread.
+- Node attribute refreshes read the node_changes log through a pooled async
+  Postgres engine (SQLAlchemy on asyncpg).
+- Route searches are CPU-bound, so they run on the ``RouteExecutor`` worker
+  processes and never hold this interpreter's GIL. ``ROUTE_WORKERS`` defaults
+  to ``ASYNC_SEARCH_THREADS`` here; setting it to 0 keeps searches on the
+  threads, in-process. A small thread pool only snaps, scores and serializes
+  around the searches and waits on the workers. At most
+  ``ASYNC_SEARCH_MAX_PENDING`` requests may be running or queued; beyond that
+  requests get ``503`` with ``Retry-After`` right away, so a burst of slow
+  searches cannot starve the cheap calls served on the loop.
+
+The graph is built at startup with the same helpers as the Flask server, and
+newer snapshots published by ``graph_update.py`` are swapped in while serving.
+
+Usage (from route-api/, needs ``pip install -r requirements-async.txt``)::
+
+    python async_app.py
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import ClientSession, ClientTimeout, web
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+import app as routes
+from controller.node import get_node_changes_async
+from database.db import db
+from metrics import RouteTrace, render_metrics
+from node_store import refresh_interval
+
+search_threads = int(os.getenv('ASYNC_SEARCH_THREADS', '2'))
+search_max_pending = int(os.getenv('ASYNC_SEARCH_MAX_PENDING', str(4 * search_threads)))
+db_pool_size = int(os.getenv('ASYNC_DB_POOL_SIZE', '5'))
+proxy_timeout_seconds = float(os.getenv('ASYNC_PROXY_TIMEOUT_SECONDS', '10'))
+
+
+class SearchPool:
+    """Bounded thread pool for route requests, with admission control.
+
+    Its threads mostly wait on the worker processes running the searches.
+
+    ``pending`` counts searches running or waiting for a thread. It is only
+    touched from the event loop, so it needs no lock.
+    """
+
+    def __init__(self, threads, max_pending):
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='search')
+        self.threads = threads
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+
+    def admit(self):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return False
+        self.pending += 1
+        return True
+
+    def release(self):
+        self.pending -= 1
+
+    async def run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def stats(self):
+        return {'threads': self.threads, 'max_pending': self.max_pending, 'pending': self.pending, 'rejected': self.rejected}
+
+
+def busy():
+    return web.json_response({'message': 'The route server is busy, please retry shortly.'}, status=503,
+                             headers={'Retry-After': '1'})
+
+
+def bad_body():
+    # Flask rejects a body that is not JSON with 400 too
+    return web.json_response({'message': 'The request body is not valid JSON.'}, status=400)
+
+
+def find_routes_traced(data, queued_at):
+    # The trace starts on the search thread so a sampled cProfile follows the search, not the event loop
+    trace = RouteTrace(started=queued_at)
+    trace.mark('queue')
+    body, status = routes.find_routes(data, trace)
+    trace.finish()
+    return body, status, trace
+
+
+async def get_route(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return bad_body()
+    # Only an os.stat when due; a newer snapshot is loaded on a background thread
+    routes.routing.check_if_due()
+    pool = request.app['search_pool']
+    if not pool.admit():
+        return busy()
+    try:
+        body, status, trace = await pool.run(find_routes_traced, data, time.perf_counter())
+    finally:
+        pool.release()
+    headers = {'Server-Timing': trace.server_timing()} if routes.wants_timing(request.headers) else None
+    return web.Response(body=body, status=status, content_type='application/json', headers=headers)
+
+
+async def stream_route(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return bad_body()
+    use_sse = routes.wants_sse(data, request.headers.get('Accept'))
+    routes.routing.check_if_due()
+    pool = request.app['search_pool']
+    if not pool.admit():
+        return busy()
+    events = None
+    try:
+        events = await pool.run(routes.route_events, data, use_sse)
+        response = web.StreamResponse(headers=routes.STREAM_HEADERS)
+        response.content_type = 'text/event-stream' if use_sse else 'application/x-ndjson'
+        await response.prepare(request)
+        # Each step of the search generator runs on the pool; the loop only writes the events
+        while True:
+            chunk = await pool.run(next, events, None)
+            if chunk is None:
+                break
+            await response.write(chunk.encode('utf-8'))
+        await response.write_eof()
+        return response
+    finally:
+        # A client that disconnects makes write raise; closing the events stops the search behind them
+        if events is not None:
+            await pool.run(events.close)
+        pool.release()
+
+
+async def metrics(request):
+    return web.Response(text=render_metrics(), content_type='text/plain')
+
+
+async def route_cache_stats(request):
+    return web.json_response({**routes.route_cache.stats(), 'search_pool': request.app['search_pool'].stats()})
+
+
+async def proxy_google_places(request):
+    proxy = routes.google_proxy
+    status, body = await proxy.fetch_async(request.app['http'], *proxy.places_request(request.query.get('input')))
+    return web.Response(body=body, status=status, content_type='application/json')
+
+
+async def proxy_google_geocode(request):
+    proxy = routes.google_proxy
+    status, body = await proxy.fetch_async(request.app['http'], *proxy.geocode_request(request.query.get('place_id')))
+    if status == 503:
+        return web.Response(body=body, status=status, content_type='application/json')
+    if status != 200:
+        return web.json_response({"error": "Failed to fetch geocode data"}, status=500)
+    return web.Response(body=body, content_type='application/json')
+
+
+async def proxy_stats(request):
+    return web.json_response(routes.google_proxy.stats())
+
+
+async def refresh_node_store(app):
+    """Apply node_changes periodically, like ``NodeStore.refresh_if_due`` does per Flask request."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(refresh_interval)
+        try:
+            node_store = routes.routing.state.node_store
+            if node_store is None:
+                continue  # Tiles are refreshed by rebuilding them
+            rows = await get_node_changes_async(app['db'], node_store.version)
+            # Rewriting the edge profiles is CPU work; keep it off the loop
+            await loop.run_in_executor(app['search_pool'].executor, node_store.apply_changes, rows)
+        except Exception as e:
+            print(f'node store refresh failed: {e}')
+
+
+@web.middleware
+async def preflight(request, handler):
+    if request.method == 'OPTIONS':
+        return web.Response(headers={
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': request.headers.get('Access-Control-Request-Headers', '*'),
+        })
+    return await handler(request)
+
+
+async def allow_any_origin(request, response):
+    # Same policy as flask_cors' CORS(app); added on prepare so streamed responses get it too
+    response.headers['Access-Control-Allow-Origin'] = '*'
+
+
+async def start_background(app):
+    app['http'] = ClientSession(timeout=ClientTimeout(total=proxy_timeout_seconds))
+    app['db'] = create_async_engine(
+        make_url(os.getenv('DATABASE_URL')).set(drivername='postgresql+asyncpg'),
+        pool_size=db_pool_size, pool_pre_ping=True,
+    )
+    app['refresh'] = asyncio.create_task(refresh_node_store(app))
+
+
+async def stop_background(app):
+    app['refresh'].cancel()
+    await app['http'].close()
+    await app['db'].dispose()
+    app['search_pool'].executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_app():
+    app = web.Application(middlewares=[preflight])
+    app['search_pool'] = SearchPool(search_threads, search_max_pending)
+    app.router.add_get('/proxy/google_places', proxy_google_places)
+    app.router.add_get('/proxy/google_geocode', proxy_google_geocode)
+    app.router.add_get('/proxy/stats', proxy_stats)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/route/cache', route_cache_stats)
+    app.router.add_post('/route', get_route)
+    app.router.add_post('/route/stream', stream_route)
+    app.on_response_prepare.append(allow_any_origin)
+    app.on_startup.append(start_background)
+    app.on_cleanup.append(stop_background)
+    return app
+
+
+if __name__ == '__main__':
+    # Keep the searches out of the event loop's interpreter unless ROUTE_WORKERS says otherwise
+    os.environ.setdefault('ROUTE_WORKERS', str(search_threads))
+    with routes.app.app_context():
+        db.init_app(routes.app)
+        routes.load_routing_state()
+    web.run_app(create_app(), port=int(os.getenv('PORT', '5000')))
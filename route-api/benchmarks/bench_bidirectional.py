@@ -0,0 +1,77 @@
+"""Peak memory and wall time of BiDirectionalAStar against the previous path-copying version.
+
+Run from route-api/:  python -m benchmarks.bench_bidirectional
+"""
+import heapq
+import time
+import tracemalloc
+from benchmarks.synthetic import grid_graph
+from route.BiDirectionalAStar import BiDirectionalAStar
+
+
+def legacy_find_paths_within_distance(graph, start, goal, target_distance):
+    """The search as it was before parent-pointer labels: every heap entry copies its path."""
+    min_distance = target_distance * 0.85
+    max_distance = target_distance * 1.15
+    start, goal = graph.index(start), graph.index(goal)
+    forward_open_set, backward_open_set = [], []
+    heapq.heappush(forward_open_set, (0, start, 0, [start]))
+    heapq.heappush(backward_open_set, (0, goal, 0, [goal]))
+    forward_visited = {start: (0, [start])}
+    backward_visited = {goal: (0, [goal])}
+    valid_paths = []
+
+    def expand_search(queue, visited, other_visited, direction):
+        if not queue:
+            return None
+        _, current_node, current_distance, path = heapq.heappop(queue)
+        if current_node in other_visited:
+            other_distance, other_path = other_visited[current_node]
+            total_distance = current_distance + other_distance
+            if min_distance <= total_distance <= max_distance:
+                full_path = path + other_path if direction == 'forward' else other_path + path
+                valid_paths.append((full_path, total_distance))
+            return
+        for neighbor, edge_weight in graph.edges(current_node):
+            new_distance = current_distance + edge_weight
+            if new_distance > max_distance:
+                continue
+            if neighbor not in visited or new_distance < visited[neighbor][0]:
+                new_path = path + [neighbor] if direction == 'forward' else [neighbor] + path
+                visited[neighbor] = (new_distance, new_path)
+                heapq.heappush(queue, (new_distance, neighbor, new_distance, new_path))
+
+    while forward_open_set or backward_open_set:
+        expand_search(forward_open_set, forward_visited, backward_visited, 'forward')
+        expand_search(backward_open_set, backward_visited, forward_visited, 'backward')
+    return [(graph.path_ids(path), total_distance) for path, total_distance in valid_paths]
+
+
+def measure(function):
+    """Wall time of an untraced run, then peak allocation of a traced run."""
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    graph, node_store = grid_graph(160, 160)
+    finder = BiDirectionalAStar(graph, node_store)
+    start = graph.node_id(graph.index(80 * 160 + 40 + 1))
+    print(f"{'distance':>9} {'paths':>7} {'legacy s':>9} {'labels s':>9} {'legacy MB':>10} {'labels MB':>10}")
+    for km, goal_offset in [(2, 10), (5, 25), (10, 50), (15, 75)]:
+        goal = start + goal_offset
+        legacy, legacy_time, legacy_peak = measure(lambda: legacy_find_paths_within_distance(graph, start, goal, km * 1000))
+        current, current_time, current_peak = measure(lambda: finder.find_paths_within_distance(start, goal, km * 1000))
+        assert sorted(map(tuple, (p for p, _ in legacy))) == sorted(map(tuple, (p for p, _ in current))), 'candidate sets differ'
+        print(f"{km:>7}km {len(current):>7} {legacy_time:>9.2f} {current_time:>9.2f} "
+              f"{legacy_peak / 2**20:>10.1f} {current_peak / 2**20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Graph size and search latency before and after degree-2 chain compression.
+
+Run from route-api/:  python -m benchmarks.bench_compression
+"""
+import time
+from benchmarks.synthetic import grid_graph
+from route.BiDirectionalAStar import BiDirectionalAStar
+from route.ParetoRouteFinder import ParetoRouteFinder
+from route.heuristics import HaversineHeuristic
+
+ROWS = COLS = 80
+SHAPE_NODES = 4
+
+
+def timed(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    graph, node_store = grid_graph(ROWS, COLS, shape_nodes=SHAPE_NODES)
+    build_seconds, compressed = timed(graph.compress_chains, repeat=1)
+    print(f'full:       {graph}, {graph.neighbors.nbytes + graph.lengths.nbytes + graph.offsets.nbytes:,} adjacency bytes')
+    print(f'compressed: {compressed}, {int((compressed.degrees() > 0).sum()):,} searchable nodes, '
+          f'{compressed.neighbors.nbytes + compressed.lengths.nbytes + compressed.offsets.nbytes + compressed.via_nodes.nbytes + compressed.via_offsets.nbytes:,} bytes with via lists, '
+          f'built in {build_seconds:.2f}s')
+
+    heuristic = HaversineHeuristic(node_store.longitude, node_store.latitude)
+    print(f"{'request':>8} {'search':>9} {'full s':>8} {'compressed s':>13} {'full routes':>12} {'compressed routes':>18}")
+    for km in (2, 4, 6):
+        row, col = ROWS // 2, COLS // 2
+        offset = int(km * 1000 * 0.4 / 100)
+        start, goal = row * COLS + col + 1, row * COLS + col + offset + 1
+        finders = {
+            'bidir': lambda g: BiDirectionalAStar(g, node_store, heuristic=heuristic).find_paths_within_distance(start, goal, km * 1000),
+            'pareto': lambda g: ParetoRouteFinder(g, node_store, heuristic=heuristic).find_pareto_routes(start, goal, km * 1000),
+            'dijkstra': lambda g: [g.dijkstra_path_length(start, goal)],
+        }
+        for name, run in finders.items():
+            full_seconds, full_routes = timed(lambda: run(graph))
+            compressed_seconds, compressed_routes = timed(lambda: run(compressed))
+            print(f'{km:>6}km {name:>9} {full_seconds:>8.3f} {compressed_seconds:>13.3f} {len(full_routes):>12} {len(compressed_routes):>18}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""/route payload size and JSON serialization time: coordinate lists vs encoded polylines.
+
+Run from route-api/:  python -m benchmarks.bench_encoding
+"""
+import gzip
+import json
+import time
+from benchmarks.synthetic import grid_graph
+from node_store import NodeStore
+from route.BiDirectionalAStar import BiDirectionalAStar
+from route.heuristics import HaversineHeuristic
+from route.scoring import pack_paths, score_paths
+from route_response import route_payload
+
+ROWS = COLS = 100
+
+
+def build(graph, node_store, packed, scores, precision):
+    """The body /route sends for every candidate, in either format."""
+    paths = [route_payload(graph, node_store, packed, scores, i, precision) for i in range(len(packed))]
+    if precision is None:
+        return {"paths": paths, "best_path": paths[0]}
+    return {"format": "polyline", "precision": precision, "paths": paths, "best_path": 0}
+
+
+def main():
+    graph, node_store = grid_graph(ROWS, COLS, shape_nodes=4)
+    graph = graph.compress_chains()
+    node_store = NodeStore(graph, node_store.longitude, node_store.latitude, node_store.poi_desc)
+    heuristic = HaversineHeuristic(node_store.longitude, node_store.latitude)
+
+    print(f"{'request':>8} {'routes':>7} {'nodes':>7} {'format':>11} {'bytes':>10} {'gzip':>9} {'build ms':>9} {'dumps ms':>9}")
+    for km in (3, 6, 10):
+        row, col = ROWS // 2, COLS // 4
+        start, goal = row * COLS + col + 1, row * COLS + col + int(km * 1000 * 0.4 / 100) + 1
+        paths = BiDirectionalAStar(graph, node_store, heuristic=heuristic).find_paths_within_distance(start, goal, km * 1000)
+        packed = pack_paths(node_store, paths)
+        scores = score_paths(packed, node_store.elevation, node_store.is_poi)
+        for name, precision in (('coordinates', None), ('polyline5', 5), ('polyline6', 6)):
+            started = time.perf_counter()
+            body = build(graph, node_store, packed, scores, precision)
+            built = time.perf_counter() - started
+            started = time.perf_counter()
+            text = json.dumps(body).encode('utf-8')
+            dumped = time.perf_counter() - started
+            print(f'{km:>6}km {len(paths):>7} {len(packed.indices):>7} {name:>11} {len(text):>10,} {len(gzip.compress(text)):>9,} '
+                  f'{built * 1000:>9.1f} {dumped * 1000:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Upstream calls and latency of the Google proxy for simulated autocomplete typing.
+
+Several users type the same few place names one keystroke at a time (with
+the occasional trailing space or capital), against the local stub server.
+Compares a plain ``requests.get`` per keystroke with GoogleProxy.
+
+Run from route-api/:  python -m benchmarks.bench_google_proxy
+"""
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from benchmarks.google_stub import serve_stub
+from google_proxy import GoogleProxy
+from route_cache import RouteCache
+
+PLACES = ['granville island', 'stanley park', 'queen elizabeth park', 'kitsilano beach']
+USERS = 24
+DELAY = 0.08
+
+
+def keystrokes(user):
+    place = PLACES[user % len(PLACES)]
+    for end in range(1, len(place) + 1):
+        text = place[:end]
+        yield text.title() if user % 3 == 0 else text + (' ' if user % 5 == 0 else '')
+
+
+def run(lookup):
+    """Type every user's keystrokes concurrently; returns per-keystroke latencies."""
+    def user_session(user):
+        latencies = []
+        for text in keystrokes(user):
+            started = time.perf_counter()
+            lookup(text)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    with ThreadPoolExecutor(USERS) as pool:
+        return [latency for latencies in pool.map(user_session, range(USERS)) for latency in latencies]
+
+
+def report(name, latencies, calls, seconds):
+    latencies = sorted(latencies)
+    print(f'{name:>10}: {len(latencies)} keystrokes, {calls} upstream calls, '
+          f'median {statistics.median(latencies) * 1000:.0f} ms, p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms, '
+          f'{seconds:.2f}s total')
+
+
+def main():
+    server, base_url = serve_stub(DELAY)
+    stub = server.app
+
+    started = time.perf_counter()
+    latencies = run(lambda text: requests.get(f'{base_url}/maps/api/place/autocomplete/json', params={'input': text, 'key': 'test'}).json())
+    report('direct', latencies, stub.config['CALLS'], time.perf_counter() - started)
+
+    stub.config['CALLS'] = 0
+    proxy = GoogleProxy(base_url, 'test', RouteCache(max_bytes=16 * 2**20, ttl=3600), pool_size=USERS)
+    started = time.perf_counter()
+    latencies = run(lambda text: proxy.fetch(*proxy.places_request(text)))
+    report('proxy', latencies, stub.config['CALLS'], time.perf_counter() - started)
+    stats = proxy.stats()
+    print(f"cache hit rate {stats['hit_rate']:.2f}, coalesced {stats['coalesced']}, "
+          f"{stats['saved_rate']:.0%} of lookups served without calling upstream")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Cost of applying a changed-ways diff and of swapping the new snapshot into a running server.
+
+A synthetic street grid stands in for the city: every block is one way of a
+few edges. The diff replaces a few hundred ways (new lengths on some,
+removals, and new connector ways with new nodes). Times ``apply_diff``,
+writing the snapshot, and ``load_state``. The last one is the work a running
+server does on its background thread before it swaps, with no database
+round trip anywhere.
+
+Run from route-api/:  python -m benchmarks.bench_graph_update
+"""
+import os
+import tempfile
+import time
+from collections import namedtuple
+import numpy as np
+from benchmarks.synthetic import grid_graph
+from create_graph import build_graph_from_edges
+from graph_snapshot import load_snapshot, snapshot_version, write_snapshot
+from graph_update import GraphDiff, apply_diff
+from node_store import build_node_store
+from routing_state import load_state
+
+ROWS = COLS = 250
+SHAPE_NODES = 3
+CHANGED_WAYS = 300
+
+NodeRow = namedtuple('NodeRow', 'id longitude latitude elevation is_poi poi_desc')
+
+
+def edge_row(way, source, target, length):
+    return {'id': f'{way}-{source}', 'osm_id': way, 'source': source, 'target': target, 'length': length, 'foot': 'Allowed',
+            'car_forward': None, 'car_backward': None, 'bike_forward': None, 'bike_backward': None, 'train': None, 'wkt': None}
+
+
+def city():
+    """Compressed grid graph with an edge list whose way ids group each block's edges."""
+    raw, raw_store = grid_graph(ROWS, COLS, shape_nodes=SHAPE_NODES)
+    sources = raw.edge_sources()
+    forward = sources < raw.neighbors
+    node_sources, node_targets = raw.node_ids[sources[forward]], raw.node_ids[raw.neighbors[forward]]
+    lengths = raw.lengths[forward]
+    # Every block edge touches one of the block's shape nodes, whose ids follow the intersections block by block
+    ways = (np.maximum(node_sources, node_targets) - ROWS * COLS - 1) // SHAPE_NODES
+    graph = build_graph_from_edges(node_sources, node_targets, lengths, ways)
+    poi_desc = {raw.node_id(index): desc for index, desc in raw_store.poi_desc.items()}
+    node_store = build_node_store(graph, raw.node_ids, raw_store.longitude, raw_store.latitude, raw.elevation, raw.is_poi, poi_desc)
+    return graph, node_store
+
+
+def make_diff(graph, node_store, rng):
+    sources, targets, lengths, ways = graph.edge_list
+    changed = rng.choice(np.unique(ways), CHANGED_WAYS, replace=False)
+    rows, node_rows = [], {}
+    for way in changed[:CHANGED_WAYS // 2].tolist():
+        # Re-measured ways keep their edges with new lengths
+        for i in np.flatnonzero(ways == way).tolist():
+            rows.append(edge_row(way, int(sources[i]), int(targets[i]), float(lengths[i]) * rng.uniform(0.8, 1.5)))
+    # The other half are deleted; a new connector way with a new midpoint node replaces each
+    next_id = int(graph.node_ids.max()) + 1
+    for way in changed[CHANGED_WAYS // 2:].tolist():
+        i = int(np.flatnonzero(ways == way)[0])
+        source, target = int(sources[i]), int(targets[i])
+        rows += [edge_row(10**9 + way, source, next_id, float(lengths[i])), edge_row(10**9 + way, next_id, target, float(lengths[i]))]
+        s = graph.index(source)
+        node_rows[next_id] = NodeRow(next_id, float(node_store.longitude[s]), float(node_store.latitude[s]), 60.0, False, None)
+        next_id += 1
+    diff = GraphDiff(changed.tolist() + [row['osm_id'] for row in rows], rows,
+                     [{'id': row.id, 'longitude': row.longitude, 'latitude': row.latitude, 'elevation': row.elevation}
+                      for row in node_rows.values()])
+    return diff, lambda ids: [node_rows[i] for i in ids if i in node_rows]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    started = time.perf_counter()
+    graph, node_store = city()
+    print(f'city graph: {graph}, {len(graph.edge_list[0]):,} uncompressed edges, built in {time.perf_counter() - started:.1f}s')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'graph.snap')
+        write_snapshot(path, graph, node_store, 'before')
+        graph, node_store, header = load_snapshot(path)
+        graph.version = snapshot_version(header)
+        diff, fetch_nodes = make_diff(graph, node_store, rng)
+
+        started = time.perf_counter()
+        graph_after, store_after, summary = apply_diff(graph, node_store, diff, fetch_nodes)
+        apply_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        write_snapshot(path, graph_after, store_after, 'after')
+        write_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        state = load_state(path)
+        swap_seconds = time.perf_counter() - started
+
+        print(f'{diff}: {summary}')
+        print(f'apply diff      {apply_seconds:6.2f}s  (edge list splice, CSR build, chain compression, components, node store)')
+        print(f'write snapshot  {write_seconds:6.2f}s  ({os.path.getsize(path) / 2**20:.0f} MB, renamed into place)')
+        print(f'load new state  {swap_seconds:6.2f}s  (background thread in a running server: map snapshot, spatial index)')
+        print(f'serving {state}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Nodes expanded by BiDirectionalAStar with no heuristic, haversine and ALT landmarks.
+
+Run from route-api/:  python -m benchmarks.bench_heuristics
+"""
+import time
+import numpy as np
+from benchmarks.synthetic import grid_graph
+from route.BiDirectionalAStar import BiDirectionalAStar
+from route.heuristics import ZeroHeuristic, HaversineHeuristic, LandmarkHeuristic, select_landmarks
+
+ROWS = COLS = 250
+
+
+def main():
+    graph, node_store = grid_graph(ROWS, COLS)
+    haversine = HaversineHeuristic(node_store.longitude, node_store.latitude)
+    started = time.perf_counter()
+    landmarks, distances = select_landmarks(graph, 16)
+    print(f'16 landmarks precomputed in {time.perf_counter() - started:.1f}s')
+    heuristics = {
+        'none': ZeroHeuristic(),
+        'haversine': haversine,
+        'alt': LandmarkHeuristic(distances, landmarks, fallback=haversine),
+    }
+
+    rng = np.random.default_rng(1)
+    print(f"{'request':>8} {'direct':>7} " + ' '.join(f'{name + " exp":>14} {name + " s":>11}' for name in heuristics))
+    for km in (5, 10, 15, 20):
+        # Endpoints roughly 40% of the requested distance apart, as for a typical A-to-B run
+        row, col = rng.integers(60, ROWS - 60), rng.integers(60, COLS - 60)
+        offset = int(km * 1000 * 0.4 / 100)
+        start, goal = row * COLS + col + 1, row * COLS + min(col + offset, COLS - 1) + 1
+        cells = []
+        for heuristic in heuristics.values():
+            finder = BiDirectionalAStar(graph, node_store, heuristic=heuristic)
+            began = time.perf_counter()
+            finder.find_paths_within_distance(start, goal, km * 1000)
+            cells.append(f'{finder.nodes_expanded:>14,} {time.perf_counter() - began:>11.2f}')
+        direct = graph.dijkstra_path_length(start, goal) / 1000
+        print(f'{km:>6}km {direct:>6.1f}k ' + ' '.join(cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Feasibility check latency: BFS + Dijkstra on the full graph vs one contraction hierarchy query.
+
+Regular grids are the hierarchy's worst case, so the build is also timed on
+road-like grids with a third of their streets removed and chains compressed.
+
+Run from route-api/:  python -m benchmarks.bench_hierarchy
+"""
+import time
+import numpy as np
+from benchmarks.synthetic import grid_graph
+from route.CSRGraph import CSRGraph
+from route.ContractionHierarchy import ContractionHierarchy, verify_hierarchy
+
+PAIRS = 200
+
+
+def road_like(size, removed=0.35, seed=0):
+    """A grid with a share of its streets removed and the resulting chains compressed."""
+    graph, _ = grid_graph(size, size)
+    sources = np.repeat(graph.node_ids, np.diff(graph.offsets))
+    targets = graph.node_ids[graph.neighbors]
+    keep = (sources < targets) & (np.random.default_rng(seed).random(len(sources)) >= removed)
+    return CSRGraph.from_edges(sources[keep], targets[keep], graph.lengths[keep]).compress_chains()
+
+
+def main():
+    graphs = [(f'{size}x{size} grid', grid_graph(size, size)[0]) for size in (40, 80)]
+    graphs += [(f'{size}x{size} road-like', road_like(size)) for size in (160, 320)]
+    for name, graph in graphs:
+        started = time.perf_counter()
+        hierarchy = ContractionHierarchy.build(graph)
+        build_seconds = time.perf_counter() - started
+        mismatches = verify_hierarchy(graph, hierarchy, pairs=PAIRS)
+
+        rng = np.random.default_rng(1)
+        pairs = rng.integers(graph.number_of_nodes(), size=(PAIRS, 2)).tolist()
+        started = time.perf_counter()
+        for source, target in pairs:
+            source_id, target_id = graph.node_id(source), graph.node_id(target)
+            if graph.has_path(source_id, target_id):
+                graph.dijkstra_path_length(source_id, target_id)
+        baseline = (time.perf_counter() - started) / PAIRS
+        started = time.perf_counter()
+        for source, target in pairs:
+            hierarchy.distance(source, target)
+        query = (time.perf_counter() - started) / PAIRS
+        print(f'{name}: build {build_seconds:.1f}s, {len(hierarchy.up_neighbors) / graph.number_of_nodes():.1f} upward edges/node, '
+              f'{len(mismatches)} mismatches; bfs+dijkstra {baseline * 1000:.2f} ms, hierarchy {query * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
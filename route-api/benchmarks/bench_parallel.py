@@ -0,0 +1,67 @@
+"""Wall time of parallel candidate generation with 1..N worker processes.
+
+Writes a synthetic grid snapshot to a temporary directory, then runs the same
+label search, Pareto and round-trip requests through RouteExecutor pools of
+growing size. Next to each wall time it prints the critical path: the slowest
+of the request's tasks, timed alone in this process. That is the wall time
+the pool can reach with a core per worker, so it shows what a split buys even
+on a machine with fewer cores than workers.
+
+Run from route-api/:  python -m benchmarks.bench_parallel
+"""
+import os
+import tempfile
+import time
+from benchmarks.synthetic import grid_graph
+from graph_snapshot import write_snapshot
+import route_executor
+from route_executor import RouteExecutor
+
+ROWS = COLS = 80
+TIME_BUDGET = 30.0
+MAX_EXPANSIONS = 400000
+
+
+def requests():
+    row, col = ROWS // 2, COLS // 2
+    start = row * COLS + col + 1
+    return [
+        ('bidir', start, start + 15, 2500),
+        ('bidir', start, start + 20 * COLS + 10, 6000),
+        ('pareto', start, start + 15, 2500),
+        ('pareto', start, start + 20, 3000),
+        ('loop', start, start, 3000),
+    ]
+
+
+def main():
+    graph, node_store = grid_graph(ROWS, COLS)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'graph.snap')
+        write_snapshot(path, graph, node_store, 'synthetic')
+
+        worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+        print(f'{os.cpu_count()} CPUs, {graph}')
+        print(f"{'workers':>7} {'request':>16} {'tasks':>6} {'wall s':>8} {'critical s':>10} {'routes':>7} {'expanded':>9} {'truncated':>9}")
+        # This process opens the snapshot too, to time the tasks one at a time
+        route_executor._start_worker(path)
+        for workers in worker_counts:
+            executor = RouteExecutor(workers, path)
+            # Start every worker (and map the snapshot) before timing
+            executor.search('bidir', requests()[0][1], requests()[0][2], 2500, 1.0, 1000)
+            for kind, source, target, distance in requests():
+                started = time.perf_counter()
+                result = executor.search(kind, source, target, distance, TIME_BUDGET, MAX_EXPANSIONS, count=8)
+                seconds = time.perf_counter() - started
+                task_seconds = []
+                for task in executor.tasks(kind, source, target, distance, TIME_BUDGET, MAX_EXPANSIONS, count=8):
+                    started = time.perf_counter()
+                    route_executor.run_task(task)
+                    task_seconds.append(time.perf_counter() - started)
+                print(f'{workers:>7} {kind + f" {distance / 1000:.1f}km":>16} {result.tasks:>6} {seconds:>8.2f} {max(task_seconds):>10.2f} '
+                      f'{len(result.paths):>7} {getattr(result, "nodes_expanded", 0):>9} {str(result.truncated):>9}')
+            executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
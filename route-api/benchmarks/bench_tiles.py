@@ -0,0 +1,77 @@
+"""Region size and latency of tiled serving against the whole snapshot.
+
+A synthetic grid of about 40 x 40 km is written as a snapshot and cut into
+tiles. The same 3 km requests then run against the whole graph and against
+the region ``TiledState`` merges for each of them. The benchmark reports
+the region's size and the bytes its private copy holds next to the whole
+graph. It times a cold region (tiles
+mapped and merged), a cached one, and the label search on each graph.
+
+Run from route-api/:  python -m benchmarks.bench_tiles
+"""
+import os
+import tempfile
+import time
+import numpy as np
+from benchmarks.synthetic import grid_graph
+from graph_snapshot import load_snapshot, snapshot_version, write_snapshot
+from graph_tiles import TiledGraph, region_bytes, write_tiles
+from node_store import NodeStore
+from route.BiDirectionalAStar import BiDirectionalAStar
+from route.heuristics import HaversineHeuristic
+from routing_state import TiledState
+
+ROWS = COLS = 400
+DEGREES = 0.05
+DISTANCE = 3000
+REQUESTS = 5
+
+
+def main():
+    raw, raw_store = grid_graph(ROWS, COLS, shape_nodes=2)
+    graph = raw.compress_chains()
+    node_store = NodeStore(graph, raw_store.longitude, raw_store.latitude, raw_store.poi_desc)
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'graph.snap')
+        write_snapshot(path, graph, node_store, 'synthetic')
+        graph, node_store, header = load_snapshot(path)
+        graph.version = snapshot_version(header)
+        started = time.perf_counter()
+        index = write_tiles(os.path.join(directory, 'tiles'), graph, node_store, header, DEGREES)
+        print(f'{graph}: {len(index["tiles"])} tiles in {time.perf_counter() - started:.1f}s, '
+              f'snapshot {os.path.getsize(path) / 2**20:.0f} MB')
+        heuristic = HaversineHeuristic(node_store.longitude, node_store.latitude)
+        state = TiledState(TiledGraph(os.path.join(directory, 'tiles')))
+
+        print(f"{'request':>8} {'tiles':>6} {'region nodes':>13} {'region MB':>10} {'cold ms':>8} {'cached ms':>10} {'search ms':>10} {'whole ms':>9} {'same':>5}")
+        for request in range(REQUESTS):
+            row, col = rng.integers(20, ROWS - 20, size=2)
+            source = graph.index(row * COLS + col + 1)
+            target = graph.index((row + 8) * COLS + col + 10 + 1)
+            points = [[float(node_store.latitude[i]), float(node_store.longitude[i])] for i in (source, target)]
+            started = time.perf_counter()
+            region = state.for_request(points[0], points[1], DISTANCE)
+            cold = time.perf_counter() - started
+            started = time.perf_counter()
+            state.for_request(points[0], points[1], DISTANCE)
+            cached = time.perf_counter() - started
+
+            source_id, target_id = graph.node_id(source), graph.node_id(target)
+            started = time.perf_counter()
+            tiled = BiDirectionalAStar(region.graph, region.node_store, heuristic=region.heuristic,
+                                       max_expansions=200000).find_paths_within_distance(source_id, target_id, DISTANCE)
+            tiled_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            whole = BiDirectionalAStar(graph, node_store, heuristic=heuristic,
+                                       max_expansions=200000).find_paths_within_distance(source_id, target_id, DISTANCE)
+            whole_seconds = time.perf_counter() - started
+            same = sorted(map(tuple, (path for path, _ in tiled))) == sorted(map(tuple, (path for path, _ in whole)))
+            print(f'{request:>8} {len(region.tiles):>6} {region.graph.number_of_nodes():>13,} '
+                  f'{region_bytes((region.graph, region.node_store, region.spatial_index, region.heuristic)) / 2**20:>10.1f} {cold * 1000:>8.0f} '
+                  f'{cached * 1000:>10.2f} {tiled_seconds * 1000:>10.0f} {whole_seconds * 1000:>9.0f} {str(same):>5}')
+        print(state.tiles.stats())
+
+
+if __name__ == '__main__':
+    main()
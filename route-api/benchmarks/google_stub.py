@@ -0,0 +1,65 @@
+"""Local stand-in for the Google Places autocomplete and Geocode endpoints.
+
+Point the proxy at it with ``GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8765`` and
+run the API as usual, or use ``serve_stub`` from a script.
+
+Run from route-api/:  python -m benchmarks.google_stub --port 8765 --delay-ms 80
+"""
+import argparse
+import logging
+import threading
+import time
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+from google_proxy import PLACES_PATH, GEOCODE_PATH
+
+
+def create_stub(delay=0.08):
+    """Flask app answering like Google after ``delay`` seconds; ``app.config['CALLS']`` counts requests."""
+    app = Flask(__name__)
+    app.config['CALLS'] = 0
+    lock = threading.Lock()
+
+    def called():
+        with lock:
+            app.config['CALLS'] += 1
+        time.sleep(delay)
+
+    @app.route(PLACES_PATH)
+    def autocomplete():
+        called()
+        text = request.args.get('input', '')
+        predictions = [
+            {'description': f'{text.title()} {suffix}, Vancouver, BC, Canada', 'place_id': f'stub-{text}-{i}'}
+            for i, suffix in enumerate(['Street', 'Park', 'Station'])
+        ]
+        return jsonify({'predictions': predictions if text else [], 'status': 'OK' if text else 'ZERO_RESULTS'})
+
+    @app.route(GEOCODE_PATH)
+    def geocode():
+        called()
+        place_id = request.args.get('place_id', '')
+        if not place_id.startswith('stub-'):
+            return jsonify({'results': [], 'status': 'INVALID_REQUEST'}), 400
+        seed = sum(place_id.encode()) % 1000
+        location = {'lat': 49.25 + seed / 1e5, 'lng': -123.1 - seed / 1e5}
+        return jsonify({'results': [{'place_id': place_id, 'geometry': {'location': location}}], 'status': 'OK'})
+
+    return app
+
+
+def serve_stub(delay=0.08, port=0):
+    """Start the stub on a background thread; returns ``(server, base_url)``."""
+    app = create_stub(delay)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve fake Google Places/Geocode endpoints.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay-ms', type=float, default=80)
+    args = parser.parse_args()
+    create_stub(args.delay_ms / 1000).run(port=args.port, threaded=True)
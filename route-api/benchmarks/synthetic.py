@@ -0,0 +1,42 @@
+"""Synthetic street grids for the benchmarks in this directory (no database needed)."""
+import numpy as np
+from route.CSRGraph import CSRGraph
+from node_store import NodeStore
+
+def grid_graph(rows, cols, spacing=100.0, seed=0, shape_nodes=0):
+    """Jittered rows x cols street grid with ~``spacing`` meter blocks around Vancouver.
+
+    Returns ``(graph, node_store)``; intersection ids are ``row * cols + col + 1``.
+    ``shape_nodes`` splits every block into that many extra degree-2 nodes, like
+    the geometry-only nodes of an OSM way; their ids follow the intersections.
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(rows * cols, dtype=np.int64).reshape(rows, cols) + 1
+    sources = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    targets = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    lengths = spacing * rng.uniform(0.8, 1.2, len(sources))
+
+    # Fractional grid position of every node id, intersections first
+    row, col = np.divmod(np.arange(rows * cols, dtype=np.float64), cols)
+    if shape_nodes:
+        pieces = shape_nodes + 1
+        block_row, block_col = np.divmod((sources - 1).astype(np.float64), cols)
+        step_row = ((targets - sources) == cols).astype(np.float64) / pieces
+        step_col = ((targets - sources) == 1).astype(np.float64) / pieces
+        chain = np.arange(len(sources))[:, None] * shape_nodes + np.arange(shape_nodes) + rows * cols + 1
+        steps = np.arange(1, pieces)
+        row = np.concatenate([row, (block_row[:, None] + step_row[:, None] * steps).ravel()])
+        col = np.concatenate([col, (block_col[:, None] + step_col[:, None] * steps).ravel()])
+        stops = np.column_stack([sources, chain, targets])
+        sources, targets = stops[:, :-1].ravel(), stops[:, 1:].ravel()
+        lengths = np.repeat(lengths / pieces, pieces)
+    graph = CSRGraph.from_edges(sources, targets, lengths)
+
+    row, col = row[graph.node_ids - 1], col[graph.node_ids - 1]
+    latitude = 49.25 + row * spacing / 111320.0
+    longitude = -123.1 + col * spacing / (111320.0 * np.cos(np.radians(49.25)))
+    graph.elevation[:] = 50 + 40 * np.sin(row / 7.0) + 30 * np.cos(col / 5.0)
+    graph.is_poi[rng.random(len(graph.node_ids)) < 0.02] = True
+    graph.update_edge_profiles()
+    poi_desc = {int(i): f'POI {i}' for i in np.flatnonzero(graph.is_poi)}
+    return graph, NodeStore(graph, longitude, latitude, poi_desc)
@@ -24,4 +24,22 @@ def query_edges():
         """)
     result = db.session.execute(query).fetchall()
     edges_list = [{'source': [slon, slat], 'target': [tarlon, tarlat]} for src, slon, slat, tar, tarlon, tarlat in result]
-    return edges_list
\ No newline at end of file
+    return edges_list
+
+DELETE_WAY_EDGES_QUERY = text("""
+    DELETE FROM edges
+    WHERE osm_id = ANY(:ways);
+""")
+
+INSERT_EDGE_QUERY = text("""
+    INSERT INTO edges (id, osm_id, source, target, length, foot, car_forward, car_backward,
+                       bike_forward, bike_backward, train, wkt)
+    VALUES (:id, :osm_id, :source, :target, :length, :foot, :car_forward, :car_backward,
+            :bike_forward, :bike_backward, :train, :wkt);
+""")
+
+def replace_way_edges(ways, rows):
+    """Delete every edge of the given OSM ways and insert their new edge rows; the caller commits."""
+    db.session.execute(DELETE_WAY_EDGES_QUERY, {"ways": ways})
+    if rows:
+        db.session.execute(INSERT_EDGE_QUERY, rows)
@@ -46,3 +46,66 @@ def get_node_details(node_ids):
     result = db.session.execute(query, {"node_ids": node_ids}).fetchall()
     details_dict = {row.id: {'elevation': float(row.elevation), 'is_poi': row.is_poi, 'poi_desc': row.poi_desc} for row in result}
     return details_dict
+
+def get_node_attributes():
+    """Retrieve the coordinates, elevation and POI columns of every node."""
+    query = text("""
+        SELECT 
+            id, longitude, latitude, elevation, is_poi, poi_desc
+        FROM nodes;
+    """)
+    return db.session.execute(query).fetchall()
+
+def get_nodes_by_id(node_ids):
+    """Retrieve the coordinates, elevation and POI columns of the given nodes."""
+    query = text("""
+        SELECT 
+            id, longitude, latitude, elevation, is_poi, poi_desc
+        FROM nodes
+        WHERE id = ANY(:node_ids);
+    """)
+    return db.session.execute(query, {"node_ids": node_ids}).fetchall()
+
+UPSERT_NODE_QUERY = text("""
+    INSERT INTO nodes (id, longitude, latitude, geom, elevation)
+    VALUES (:id, :longitude, :latitude, ST_SetSRID(ST_MakePoint(:longitude, :latitude), 4326), :elevation)
+    ON CONFLICT (id) DO UPDATE
+    SET longitude = EXCLUDED.longitude, latitude = EXCLUDED.latitude, geom = EXCLUDED.geom,
+        elevation = COALESCE(EXCLUDED.elevation, nodes.elevation);
+""")
+
+def upsert_nodes(rows):
+    """Insert new nodes and move existing ones (keeping their elevation unless a new one is given); the caller commits."""
+    if rows:
+        db.session.execute(UPSERT_NODE_QUERY, rows)
+
+LAST_NODE_CHANGE_QUERY = text("""
+    SELECT COALESCE(MAX(seq), 0) AS seq
+    FROM node_changes;
+""")
+
+NODE_CHANGES_QUERY = text("""
+    SELECT 
+        n.id, n.longitude, n.latitude, n.elevation, n.is_poi, n.poi_desc, c.seq
+    FROM (
+        SELECT node_id, MAX(seq) AS seq
+        FROM node_changes
+        WHERE seq > :since
+        GROUP BY node_id
+    ) c
+    JOIN nodes n ON n.id = c.node_id;
+""")
+
+def get_last_node_change():
+    """Return the sequence number of the latest entry in the node change log."""
+    return db.session.execute(LAST_NODE_CHANGE_QUERY).scalar()
+
+def get_node_changes(since):
+    """Retrieve the current attributes of every node changed after the given log sequence number."""
+    return db.session.execute(NODE_CHANGES_QUERY, {"since": since}).fetchall()
+
+async def get_node_changes_async(engine, since):
+    """``get_node_changes`` on a pooled async engine (SQLAlchemy's ``create_async_engine``)."""
+    async with engine.connect() as connection:
+        result = await connection.execute(NODE_CHANGES_QUERY, {"since": since})
+        return result.fetchall()
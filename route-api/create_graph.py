@@ -1,70 +1,96 @@
-import networkx as nx
-import joblib
+import numpy as np
 import os
-from model.models import Edge, Node
+from model.models import Edge
 from database.db import db
-from sqlalchemy.orm import aliased
-from sqlalchemy import func
-from sqlalchemy import text
+from route.CSRGraph import CSRGraph
+from route.SpatialIndex import SpatialIndex
+from route.heuristics import HaversineHeuristic, load_landmarks
+from route.ContractionHierarchy import load_hierarchy
+from node_store import load_node_store
+from graph_snapshot import snapshot_path, landmarks_path, hierarchy_path, source_checksum, snapshot_version, write_snapshot, load_snapshot, read_header, is_stale
 
-cache_directory = 'cache'
-cache_graph_path = os.path.join(cache_directory, 'graph_cache.pkl')
+# osm4routing marks edges pedestrians may not use with this access value
+FOOT_FORBIDDEN = 'Forbidden'
+
+def build_graph_from_db():
+    """Build the pedestrian CSR graph and node store straight from the edges and nodes tables.
+
+    Edges pedestrians may not use (motorways, rail lines) are dropped, and chains
+    of degree-2 shape nodes are collapsed into single edges.
+    """
+    # Query the foot-accessible edges from the database
+    edges = db.session.query(Edge.source, Edge.target, Edge.length, Edge.osm_id).filter(Edge.foot.is_distinct_from(FOOT_FORBIDDEN)).all()
+
+    # Pack the edges into flat arrays and build the CSR graph
+    sources = np.fromiter((edge.source for edge in edges), dtype=np.int64, count=len(edges))
+    targets = np.fromiter((edge.target for edge in edges), dtype=np.int64, count=len(edges))
+    lengths = np.fromiter((edge.length for edge in edges), dtype=np.float32, count=len(edges))
+    ways = np.fromiter((edge.osm_id or 0 for edge in edges), dtype=np.int64, count=len(edges))
+    del edges
+    graph = build_graph_from_edges(sources, targets, lengths, ways)
+    node_store = load_node_store(graph)
+    return graph, node_store
+
+def build_graph_from_edges(sources, targets, lengths, ways):
+    """Compressed CSR graph from parallel arrays of foot-accessible edges (OSM node ids, meters, OSM way ids).
+
+    The arrays are kept as ``graph.edge_list`` so ``graph_update`` can replace
+    the edges of changed ways later without reading the edges table again.
+    """
+    pedestrian_graph = CSRGraph.from_edges(sources, targets, lengths)
+    graph = pedestrian_graph.compress_chains()
+    graph.edge_list = (
+        np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64),
+        np.asarray(lengths, dtype=np.float32), np.asarray(ways, dtype=np.int64),
+    )
+    print(f'pedestrian graph: {pedestrian_graph.number_of_edges():,} edges, '
+          f'{graph.number_of_edges():,} after compressing degree-2 chains '
+          f'({int((graph.degrees() > 0).sum()):,} of {graph.number_of_nodes():,} nodes remain searchable)')
+    return graph
 
 def build_graph():
+    """Return ``(graph, node_store)``, memory-mapped from the snapshot when one is available."""
     print('build graph start...')
-    # Load cached graph
-    if os.path.exists(cache_graph_path):
-        cached_graph = joblib.load(cache_graph_path)
-        print("load cached graph complete.")
-        return cached_graph
-  
-    # Create a new graph
-    graph = nx.Graph()
-    
-    # Query all edges from the database
-    edges =  Edge.query.add_columns(Edge.source, Edge.target, Edge.length).all()
-    
-    # Add edges to the graph
-    for edge in edges:
-        graph.add_edge(edge.source, edge.target, weight=edge.length)
-    # Cache the graph
-    os.makedirs(cache_directory, exist_ok=True)
-    joblib.dump(graph, cache_graph_path)
-    print('build graph complete...', graph)
-    return graph
+    # Load the graph snapshot; set GRAPH_SNAPSHOT_CHECK=1 to verify it against the tables first
+    if os.path.exists(snapshot_path):
+        try:
+            if os.getenv('GRAPH_SNAPSHOT_CHECK') == '1' and is_stale(snapshot_path):
+                print('graph snapshot is stale, rebuilding...')
+            else:
+                graph, node_store, header = load_snapshot(snapshot_path)
+                graph.version = snapshot_version(header)
+                print("load graph snapshot complete.", graph)
+                return graph, node_store
+        except ValueError as e:
+            print(f'cannot use graph snapshot ({e}), rebuilding...')
 
+    checksum = source_checksum()
+    graph, node_store = build_graph_from_db()
 
-def find_path_with_min_distance(graph, source_node_id, min_distance):
-    def dfs(node, current_path, current_distance, visited):
-        # Base case: If the path distance exceeds min_distance, return the path
-        if current_distance > min_distance:
-            return current_path
-        
-        visited.add(node)  # Mark the node as visited
+    # Save the snapshot for the next start
+    header = write_snapshot(snapshot_path, graph, node_store, checksum)
+    graph.version = snapshot_version(header)
+    print('build graph complete...', graph)
+    return graph, node_store
 
-        # Explore neighbors
-        for neighbor in graph.neighbors(node):
-            if neighbor in visited:  # Skip visited nodes
-                continue
-            
-            # Get the weight (distance) of the edge
-            distance = graph[node][neighbor]['weight']
+def build_spatial_index(graph, node_store):
+    """Grid index for snapping coordinates to graph nodes that have edges (not to compressed shape nodes)."""
+    return SpatialIndex(node_store.longitude, node_store.latitude, mask=graph.degrees() > 0, component=graph.component)
 
-            # Recurse with the updated path and distance
-            result = dfs(
-                neighbor,
-                current_path + [neighbor],
-                current_distance + distance,
-                visited
-            )
-            
-            if result:  # If a valid path is found, return it
-                return result
+def build_heuristic(graph, node_store, checksum=None):
+    """ALT landmark bounds when they were precomputed for this snapshot, else plain haversine."""
+    haversine = HaversineHeuristic(node_store.longitude, node_store.latitude)
+    checksum = checksum or read_header(snapshot_path)['checksum']
+    landmarks = load_landmarks(landmarks_path, graph, checksum, fallback=haversine)
+    if landmarks is None:
+        return haversine
+    print(f'loaded {len(landmarks.landmarks)} landmarks')
+    return landmarks
 
-        visited.remove(node)  # Backtrack
-        return None  # No valid path found
 
-    # Initialize DFS
-    visited = set()
-    start_path = [source_node_id]  # Path starts at the source node
-    return dfs(source_node_id, start_path, 0, visited)
\ No newline at end of file
+def build_hierarchy(graph, checksum=None):
+    """Contraction hierarchy for exact shortest distances, if one was built for this snapshot."""
+    hierarchy = load_hierarchy(hierarchy_path, graph, checksum or read_header(snapshot_path)['checksum'])
+    if hierarchy is not None:
+        print('loaded', hierarchy)
+    return hierarchy
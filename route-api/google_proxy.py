@@ -0,0 +1,149 @@
+import asyncio
+import os
+import threading
+from urllib.parse import urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from route_cache import RouteCache
+
+PLACES_PATH = '/maps/api/place/autocomplete/json'
+GEOCODE_PATH = '/maps/api/geocode/json'
+# Google answers these with HTTP 200 too; only successful lookups are cached
+CACHEABLE_STATUSES = (b'"OK"', b'"ZERO_RESULTS"')
+UPSTREAM_FAILED = (502, b'{"error": "Google API request failed"}')
+NOT_CONFIGURED = (503, b'{"error": "Google API key is not configured"}')
+
+
+def normalize_input(input_text):
+    """Autocomplete input as cached: case and repeated whitespace do not change Google's suggestions."""
+    return ' '.join((input_text or '').split()).lower()
+
+
+class GoogleProxy:
+    """Cached, coalescing client for the Google Places autocomplete and Geocode APIs.
+
+    Responses are cached as raw JSON bytes in a ``RouteCache`` (LRU + TTL,
+    bounded by bytes), keyed on the normalized autocomplete input or the
+    place id. While one request for a key is in flight, identical requests
+    wait for its result instead of calling Google again. Outbound calls reuse
+    pooled connections: a ``requests.Session`` for the Flask server, or the
+    async server's ``aiohttp`` session. Without an API key every lookup is
+    answered with ``503`` and Google is never called.
+    """
+
+    def __init__(self, base_url, api_key, cache, timeout=10.0, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.cache = cache
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount(self.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.in_flight = {}  # key -> threading.Event or asyncio.Future of the running fetch
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self.coalesced = 0
+
+    def places_request(self, input_text):
+        # Only the cache key is normalized; Google gets the input as typed, where casing can matter
+        text = (input_text or '').strip()
+        return f'places:{normalize_input(text)}', f'{self.base_url}{PLACES_PATH}?{urlencode({"input": text, "key": self.api_key})}'
+
+    def geocode_request(self, place_id):
+        place_id = (place_id or '').strip()
+        return f'geocode:{place_id}', f'{self.base_url}{GEOCODE_PATH}?{urlencode({"place_id": place_id, "key": self.api_key})}'
+
+    def _finish(self, key, status, body):
+        """Record an upstream answer and cache it if it is a successful lookup."""
+        if status != 200:
+            self.upstream_errors += 1
+        elif any(value in body for value in CACHEABLE_STATUSES):
+            self.cache.put(key, body)
+        return status, body
+
+    def fetch(self, key, url):
+        """``(status, body)`` for a lookup from the cache, a concurrent identical request, or Google."""
+        if not self.api_key:
+            return NOT_CONFIGURED
+        self.lookups += 1
+        body = self.cache.get(key)
+        if body is not None:
+            return 200, body
+        with self.lock:
+            waiting = self.in_flight.get(key)
+            if waiting is None:
+                done = self.in_flight[key] = threading.Event()
+                self.upstream_requests += 1
+            else:
+                self.coalesced += 1
+        if waiting is not None:
+            waiting.wait(self.timeout)
+            return getattr(waiting, 'result', UPSTREAM_FAILED)
+        done.result = UPSTREAM_FAILED
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            done.result = self._finish(key, response.status_code, response.content)
+        except requests.RequestException as e:
+            print(f'google proxy error: {e}')
+            self.upstream_errors += 1
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            done.set()
+        return done.result
+
+    async def fetch_async(self, http, key, url):
+        """``fetch`` for the asyncio server, using its shared ``aiohttp`` session."""
+        if not self.api_key:
+            return NOT_CONFIGURED
+        self.lookups += 1
+        body = self.cache.get(key)
+        if body is not None:
+            return 200, body
+        waiting = self.in_flight.get(key)
+        if waiting is not None:
+            self.coalesced += 1
+            return await asyncio.shield(waiting)
+        done = self.in_flight[key] = asyncio.get_running_loop().create_future()
+        self.upstream_requests += 1
+        result = UPSTREAM_FAILED
+        try:
+            async with http.get(url) as response:
+                result = self._finish(key, response.status, await response.read())
+        except Exception as e:
+            print(f'google proxy error: {e}')
+            self.upstream_errors += 1
+        finally:
+            del self.in_flight[key]
+            # Waiters get the failure too if this request was cancelled
+            done.set_result(result)
+        return result
+
+    def stats(self):
+        """Cache counters plus upstream ones; ``saved_rate`` also credits lookups that joined an in-flight request."""
+        return {
+            **self.cache.stats(),
+            'lookups': self.lookups,
+            'saved_rate': 1 - self.upstream_requests / self.lookups if self.lookups else 0.0,
+            'upstream_requests': self.upstream_requests,
+            'upstream_errors': self.upstream_errors,
+            'coalesced': self.coalesced,
+        }
+
+
+def create_google_proxy():
+    """Build the proxy from GOOGLE_* environment variables; GOOGLE_API_KEY has no default."""
+    api_key = os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        print('GOOGLE_API_KEY is not set; the Google proxy endpoints will answer 503')
+    cache = RouteCache(
+        max_bytes=int(float(os.getenv('GOOGLE_CACHE_MAX_MB', '16')) * 2**20),
+        ttl=float(os.getenv('GOOGLE_CACHE_TTL_SECONDS', '3600')),
+    )
+    return GoogleProxy(
+        os.getenv('GOOGLE_MAPS_BASE_URL', 'https://maps.googleapis.com'),
+        api_key,
+        cache,
+        timeout=float(os.getenv('GOOGLE_TIMEOUT_SECONDS', '10')),
+    )
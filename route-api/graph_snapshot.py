@@ -0,0 +1,264 @@
+"""Versioned, memory-mappable on-disk snapshot of the routing graph.
+
+File layout::
+
+    8 bytes   magic b"RTGRAPH\\0"
+    4 bytes   little-endian uint32 length of the JSON header
+    N bytes   JSON header (schema version, source checksum, bounding box, array table)
+    padding   up to a 64-byte boundary
+    arrays    raw little-endian arrays, each starting on a 64-byte boundary
+
+Workers open the arrays with ``np.memmap`` in copy-on-write mode, so every
+process shares the same pages through the OS cache and startup only reads
+the header.
+
+Usage::
+
+    python graph_snapshot.py build    # rebuild the snapshot from the edges/nodes tables
+    python graph_snapshot.py check    # exit with status 1 if the snapshot is missing or stale
+    python graph_snapshot.py landmarks --count 32   # precompute ALT landmark distances
+    python graph_snapshot.py hierarchy --verify 200  # contraction hierarchy, checked against Dijkstra
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import numpy as np
+from database.db import db
+from sqlalchemy import text
+from route.CSRGraph import CSRGraph
+from node_store import NodeStore
+
+SNAPSHOT_SCHEMA_VERSION = 5
+MAGIC = b"RTGRAPH\0"
+ALIGNMENT = 64
+
+cache_directory = 'cache'
+snapshot_path = os.path.join(cache_directory, 'graph.snap')
+landmarks_path = os.path.join(cache_directory, 'landmarks')
+hierarchy_path = os.path.join(cache_directory, 'hierarchy')
+
+
+def _align(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+# Fingerprint of the edges and nodes tables the snapshot is built from
+SOURCE_CHECKSUM_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM edges) AS edge_count,
+        (SELECT COALESCE(SUM(source), 0) + COALESCE(SUM(target), 0) FROM edges) AS edge_id_sum,
+        (SELECT COALESCE(SUM(length), 0) FROM edges) AS edge_length_sum,
+        (SELECT COUNT(*) FROM nodes) AS node_count,
+        (SELECT COALESCE(SUM(elevation), 0) FROM nodes) AS elevation_sum,
+        (SELECT COUNT(*) FROM nodes WHERE is_poi) AS poi_count;
+"""
+
+
+def checksum_of(row):
+    """Checksum of a ``SOURCE_CHECKSUM_SQL`` result row, from any DB-API cursor."""
+    fingerprint = '|'.join(str(value) for value in row)
+    return hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+def source_checksum():
+    """Fingerprint of the edges and nodes tables the snapshot is built from."""
+    return checksum_of(db.session.execute(text(SOURCE_CHECKSUM_SQL)).fetchone())
+
+
+def snapshot_arrays(graph, node_store):
+    """Flat arrays written to the snapshot, in file order."""
+    poi_indices = np.array(sorted(node_store.poi_desc), dtype=np.int64)
+    encoded = [node_store.poi_desc[i].encode('utf-8') for i in poi_indices.tolist()]
+    poi_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(desc) for desc in encoded], out=poi_offsets[1:])
+    edge_list = graph.edge_list or (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                                    np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64))
+    return {
+        'node_ids': graph.node_ids,
+        'offsets': graph.offsets,
+        'neighbors': graph.neighbors,
+        'lengths': graph.lengths,
+        'foot': graph.foot,
+        'elevation': graph.elevation,
+        'is_poi': graph.is_poi,
+        'component': graph.component,
+        'via_offsets': graph.via_offsets,
+        'via_nodes': graph.via_nodes,
+        'edge_gain': graph.edge_gain,
+        'edge_loss': graph.edge_loss,
+        'edge_poi': graph.edge_poi,
+        'longitude': node_store.longitude,
+        'latitude': node_store.latitude,
+        'poi_indices': poi_indices,
+        'poi_desc_offsets': poi_offsets,
+        'poi_desc_bytes': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'edge_list_source': edge_list[0],
+        'edge_list_target': edge_list[1],
+        'edge_list_length': edge_list[2],
+        'edge_list_way': edge_list[3],
+    }
+
+
+def write_snapshot(path, graph, node_store, checksum, extra_arrays=None, **metadata):
+    """Write the graph and node store to ``path`` atomically (temp file + rename).
+
+    ``extra_arrays`` are stored after the standard ones and memory-mapped by
+    ``open_arrays`` like them; ``load_snapshot`` leaves them alone.
+    """
+    arrays = snapshot_arrays(graph, node_store)
+    arrays.update(extra_arrays or {})
+    table, position = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        table[name] = {'dtype': array.dtype.newbyteorder('<').str, 'shape': list(array.shape), 'offset': position}
+        position = _align(position + array.nbytes)
+
+    valid = node_store.longitude != 0
+    bbox = [
+        float(node_store.longitude[valid].min()), float(node_store.latitude[valid].min()),
+        float(node_store.longitude[valid].max()), float(node_store.latitude[valid].max()),
+    ] if valid.any() else None
+    header = {
+        'schema_version': SNAPSHOT_SCHEMA_VERSION,
+        'checksum': checksum,
+        'bbox': bbox,
+        'created_at': time.time(),
+        'node_count': graph.number_of_nodes(),
+        'edge_count': graph.number_of_edges(),
+        'component_count': int(graph.component.max(initial=-1)) + 1,
+        'node_change_seq': node_store.version,
+        'arrays': table,
+    }
+    header.update(metadata)
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _align(len(MAGIC) + 4 + len(header_bytes))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f'{path}.tmp.{os.getpid()}'
+    with open(temp_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<I', len(header_bytes)))
+        file.write(header_bytes)
+        for name, array in arrays.items():
+            file.write(b'\0' * (data_start + table[name]['offset'] - file.tell()))
+            file.write(array.astype(table[name]['dtype'], copy=False).tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    return header
+
+
+def read_header(path):
+    """Read and validate the JSON header; raise ValueError for unknown files or schema versions."""
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a graph snapshot')
+        (header_length,) = struct.unpack('<I', file.read(4))
+        header = json.loads(file.read(header_length))
+    if header.get('schema_version') != SNAPSHOT_SCHEMA_VERSION:
+        raise ValueError(f"{path} has schema version {header.get('schema_version')}, expected {SNAPSHOT_SCHEMA_VERSION}")
+    header['data_start'] = _align(len(MAGIC) + 4 + header_length)
+    return header
+
+
+def open_arrays(path, header):
+    """Memory-map every array in the snapshot (copy-on-write, so in-place refreshes stay private)."""
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        shape = tuple(spec['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=spec['dtype'])
+        else:
+            arrays[name] = np.memmap(path, dtype=spec['dtype'], mode='c', offset=header['data_start'] + spec['offset'], shape=shape)
+    return arrays
+
+
+def load_snapshot(path=snapshot_path):
+    """Open a snapshot and return ``(graph, node_store, header)`` backed by memory maps."""
+    header = read_header(path)
+    arrays = open_arrays(path, header)
+    graph = CSRGraph(
+        arrays['node_ids'], arrays['offsets'], arrays['neighbors'], arrays['lengths'],
+        elevation=arrays['elevation'], is_poi=arrays['is_poi'], foot=arrays['foot'],
+        component=arrays['component'], via_offsets=arrays['via_offsets'], via_nodes=arrays['via_nodes'],
+        edge_gain=arrays['edge_gain'], edge_loss=arrays['edge_loss'], edge_poi=arrays['edge_poi'],
+    )
+    if len(arrays['edge_list_source']):
+        graph.edge_list = tuple(arrays[f'edge_list_{name}'] for name in ('source', 'target', 'length', 'way'))
+    offsets = arrays['poi_desc_offsets'].tolist()
+    text_bytes = arrays['poi_desc_bytes'].tobytes()
+    poi_desc = {
+        index: text_bytes[offsets[i]:offsets[i + 1]].decode('utf-8')
+        for i, index in enumerate(arrays['poi_indices'].tolist())
+    }
+    node_store = NodeStore(graph, arrays['longitude'], arrays['latitude'], poi_desc, version=header['node_change_seq'])
+    return graph, node_store, header
+
+
+def snapshot_version(header):
+    """Short identifier of one snapshot build, used to invalidate derived caches."""
+    return f"{header['checksum'][:12]}-{int(header['created_at'])}"
+
+
+def is_stale(path=snapshot_path):
+    """True if the snapshot is missing, unreadable or built from different table contents."""
+    try:
+        header = read_header(path)
+    except (OSError, ValueError):
+        return True
+    return header['checksum'] != source_checksum()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or check the routing graph snapshot.')
+    parser.add_argument('command', choices=['build', 'check', 'landmarks', 'hierarchy'])
+    parser.add_argument('--path', default=snapshot_path, help='snapshot file (default: %(default)s)')
+    parser.add_argument('--count', type=int, default=32, help='number of ALT landmarks (default: %(default)s)')
+    parser.add_argument('--verify', type=int, default=100, help='random pairs to check the hierarchy against Dijkstra (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'landmarks':
+        from route.heuristics import select_landmarks, save_landmarks
+        graph, _, header = load_snapshot(args.path)
+        landmarks, distances = select_landmarks(graph, args.count)
+        save_landmarks(landmarks_path, graph, landmarks, distances, header['checksum'])
+        print(f'wrote {landmarks_path}.npy: {args.count} landmarks x {graph.number_of_nodes():,} nodes')
+        return 0
+
+    if args.command == 'hierarchy':
+        from route.ContractionHierarchy import ContractionHierarchy, save_hierarchy, verify_hierarchy
+        graph, _, header = load_snapshot(args.path)
+        started = time.monotonic()
+        hierarchy = ContractionHierarchy.build(graph)
+        print(f'contracted {graph.number_of_nodes():,} nodes in {time.monotonic() - started:.0f}s: {hierarchy}')
+        mismatches = verify_hierarchy(graph, hierarchy, pairs=args.verify)
+        for source, target, expected, actual in mismatches:
+            print(f'mismatch {source} -> {target}: dijkstra {expected:.1f} m, hierarchy {actual:.1f} m')
+        if mismatches:
+            return 1
+        save_hierarchy(hierarchy_path, graph, hierarchy, header['checksum'])
+        print(f'wrote {hierarchy_path}.npz, {args.verify} random pairs match Dijkstra')
+        return 0
+
+    from app import app
+    from create_graph import build_graph_from_db
+    db.init_app(app)
+    with app.app_context():
+        if args.command == 'check':
+            stale = is_stale(args.path)
+            print(f"{args.path}: {'stale' if stale else 'up to date'}")
+            return 1 if stale else 0
+        checksum = source_checksum()
+        graph, node_store = build_graph_from_db()
+        header = write_snapshot(args.path, graph, node_store, checksum)
+        print(f"wrote {args.path}: {header['node_count']:,} nodes, {header['edge_count']:,} edges, checksum {checksum}")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,349 @@
+"""Geographic tiles of the routing graph, memory-mapped on demand and evicted least recently used first.
+
+A route never strays farther from its start than the longest route the
+finders accept (1.15x the requested distance), so a search only needs the
+part of the graph within that disc. ``write_tiles`` cuts the snapshot into a
+grid of ``--degrees`` wide cells. Each searchable node belongs to the tile its
+coordinates fall in. A tile file holds every edge with an end it owns, so an
+edge across a tile border is stored in both tiles. A tile file also holds the
+edges' shape nodes and both ends of each edge. Ends owned by another tile are
+the tile's boundary nodes. They are recorded with their owner, and the index
+lists each tile's neighbours.
+
+Tiles are ordinary snapshot files. ``TiledGraph`` maps only the tiles a
+request's disc touches and merges them into one CSR graph for the search. It
+keeps the last few merged regions and at most ``GRAPH_TILE_CACHE`` mapped tiles.
+Memory then depends on the requests being served, not on the size of the
+loaded area.
+
+A merged region is a copy, not a view of the mapped tiles: its arrays, spatial
+index and heuristic are private to the process that built it. On the
+``bench_tiles`` grid a 3 km region of 41k to 92k nodes takes 4 to 9 MB. Each
+process (the server and every ``ROUTE_WORKERS`` worker) keeps up to
+``GRAPH_REGION_CACHE`` of them, about 31 MB at the default of four, on top of
+its mapped tiles. ``stats()`` reports the bytes the cached regions hold.
+
+Every build goes into its own ``<directory>/<version>/`` and ``index.json`` is
+renamed into place last, so a server never mixes tiles of two builds.
+
+Usage (from route-api/)::
+
+    python graph_tiles.py build --degrees 0.25   # split cache/graph.snap into cache/tiles/
+    GRAPH_TILES=1 python app.py                   # serve from the tiles
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from graph_snapshot import cache_directory, snapshot_path, load_snapshot, snapshot_version, write_snapshot
+from node_store import NodeStore
+from route.CSRGraph import CSRGraph
+from route.SpatialIndex import SpatialIndex, EARTH_RADIUS
+from route.heuristics import HaversineHeuristic
+
+tiles_path = os.path.join(cache_directory, 'tiles')
+TILE_INDEX = 'index.json'
+TILE_DEGREES = 0.25
+# The finders accept routes up to this factor of the requested distance
+SEARCH_RADIUS_FACTOR = 1.15
+# Requested points are snapped to nodes up to this far away (meters)
+SNAP_RADIUS = 1000.0
+METERS_PER_DEGREE = math.radians(1) * EARTH_RADIUS
+
+tile_cache_size = int(os.getenv('GRAPH_TILE_CACHE', '64'))
+region_cache_size = int(os.getenv('GRAPH_REGION_CACHE', '4'))
+
+
+def tile_index_path(directory):
+    return os.path.join(directory, TILE_INDEX)
+
+
+def tile_name(col, row):
+    return f'{col}_{row}'
+
+
+def _ranges(starts, counts):
+    """Concatenated ``range(start, start + count)`` for every pair, as one int64 array."""
+    total = int(counts.sum())
+    return np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+
+
+def combine(parts):
+    """``(graph, node_store)`` made of chosen adjacency entries of one or more graphs.
+
+    ``parts`` are ``(graph, node_store, entries)`` with ``entries`` the
+    adjacency entry positions to take. The new graph holds the entries' ends
+    and shape nodes, with their columns. An entry found in several parts
+    (between the same two node ids) is kept once, so the parts must agree on
+    it, as tiles cut from one snapshot do. Component labels are recomputed for
+    the new graph.
+    """
+    pieces = []
+    for graph, node_store, entries in parts:
+        entries = np.asarray(entries, dtype=np.int64)
+        sources = np.searchsorted(graph.offsets, entries, side='right') - 1
+        via_starts = graph.via_offsets[entries]
+        via_counts = graph.via_offsets[entries + 1] - via_starts
+        vias = graph.via_nodes[_ranges(via_starts, via_counts)].astype(np.int64)
+        used = np.unique(np.concatenate([sources, graph.neighbors[entries], vias]))
+        pieces.append((graph, node_store, entries, sources, via_counts, vias, used))
+
+    node_ids = np.unique(np.concatenate([np.empty(0, dtype=np.int64)] + [piece[0].node_ids[piece[-1]] for piece in pieces]))
+    node_count = len(node_ids)
+    longitude = np.zeros(node_count, dtype=np.float64)
+    latitude = np.zeros(node_count, dtype=np.float64)
+    elevation = np.zeros(node_count, dtype=np.float32)
+    is_poi = np.zeros(node_count, dtype=bool)
+    poi_desc = {}
+    columns = {name: [] for name in ('u', 'v', 'lengths', 'foot', 'gain', 'loss', 'poi', 'via_counts', 'vias')}
+    for graph, node_store, entries, sources, via_counts, vias, used in pieces:
+        position = np.searchsorted(node_ids, graph.node_ids[used])
+        longitude[position] = node_store.longitude[used]
+        latitude[position] = node_store.latitude[used]
+        elevation[position] = graph.elevation[used]
+        is_poi[position] = graph.is_poi[used]
+        for index in np.intersect1d(used, np.fromiter(node_store.poi_desc, dtype=np.int64)).tolist():
+            poi_desc[int(position[np.searchsorted(used, index)])] = node_store.poi_desc[index]
+        columns['u'].append(position[np.searchsorted(used, sources)])
+        columns['v'].append(position[np.searchsorted(used, graph.neighbors[entries])])
+        columns['vias'].append(position[np.searchsorted(used, vias)])
+        columns['via_counts'].append(via_counts)
+        columns['lengths'].append(graph.lengths[entries])
+        columns['foot'].append(graph.foot[entries])
+        columns['gain'].append(graph.edge_gain[entries])
+        columns['loss'].append(graph.edge_loss[entries])
+        columns['poi'].append(graph.edge_poi[entries])
+    empty = {'u': np.int64, 'v': np.int64, 'vias': np.int64, 'via_counts': np.int64, 'lengths': np.float32,
+             'foot': bool, 'gain': np.float32, 'loss': np.float32, 'poi': np.int32}
+    columns = {name: np.concatenate(arrays) if arrays else np.empty(0, dtype=empty[name]) for name, arrays in columns.items()}
+
+    # CSR order, with the second copy of an entry stored in two parts dropped
+    u, v = columns['u'], columns['v']
+    order = np.lexsort((v, u))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (u[order][1:] != u[order][:-1]) | (v[order][1:] != v[order][:-1])
+    order = order[first]
+    via_starts = np.cumsum(columns['via_counts']) - columns['via_counts']
+    via_counts = columns['via_counts'][order]
+    via_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(via_counts, out=via_offsets[1:])
+    offsets = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(u[order], minlength=node_count), out=offsets[1:])
+    graph = CSRGraph(
+        node_ids, offsets, v[order].astype(np.int32), columns['lengths'][order],
+        elevation=elevation, is_poi=is_poi, foot=columns['foot'][order],
+        via_offsets=via_offsets, via_nodes=columns['vias'][_ranges(via_starts[order], via_counts)].astype(np.int32),
+        edge_gain=columns['gain'][order], edge_loss=columns['loss'][order], edge_poi=columns['poi'][order],
+    )
+    # Shape nodes have no edges of their own; like compress_chains, label them with their chain's component
+    via_entry = np.repeat(np.arange(len(order)), via_counts)
+    labels = graph.component.copy()
+    labels[graph.via_nodes] = labels[graph.edge_sources()[via_entry]]
+    _, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(sizes), dtype=np.int32)
+    rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes), dtype=np.int32)
+    graph.component = rank[labels.ravel()]
+    version = pieces[0][1].version if pieces else 0
+    return graph, NodeStore(graph, longitude, latitude, poi_desc, version=version)
+
+
+def region_bytes(region):
+    """Bytes held by the arrays of a merged region (graph, node store, spatial index, heuristic)."""
+    arrays = {}
+    for part in region:
+        for value in vars(part).values():
+            if isinstance(value, np.ndarray):
+                arrays[id(value)] = value.nbytes
+    return sum(arrays.values())
+
+
+def tile_cells(longitude, latitude, degrees):
+    """Grid column and row of every coordinate."""
+    return (np.floor(np.asarray(longitude) / degrees).astype(np.int64),
+            np.floor(np.asarray(latitude) / degrees).astype(np.int64))
+
+
+def write_tiles(directory, graph, node_store, header, degrees=TILE_DEGREES):
+    """Cut a snapshot's graph into tiles under ``directory`` and publish their index; returns the index."""
+    started = time.monotonic()
+    version = snapshot_version(header)
+    build_directory = os.path.join(directory, version)
+    os.makedirs(build_directory, exist_ok=True)
+
+    searchable = np.flatnonzero(graph.degrees() > 0)
+    cols, rows = tile_cells(node_store.longitude[searchable], node_store.latitude[searchable], degrees)
+    cells, cell_of = np.unique(np.column_stack([cols, rows]), axis=0, return_inverse=True)
+    owner = np.full(graph.number_of_nodes(), -1, dtype=np.int64)
+    owner[searchable] = cell_of.ravel()
+
+    # Every entry goes to the tile owning its source and, if different, the one owning its target
+    entry_count = len(graph.neighbors)
+    source_owner = owner[graph.edge_sources()]
+    target_owner = owner[graph.neighbors]
+    crossing = np.flatnonzero(source_owner != target_owner)
+    entry_tile = np.concatenate([source_owner, target_owner[crossing]])
+    entry = np.concatenate([np.arange(entry_count, dtype=np.int64), crossing])
+    order = np.lexsort((entry, entry_tile))
+    entry_tile, entry = entry_tile[order], entry[order]
+    bounds = np.searchsorted(entry_tile, np.arange(len(cells) + 1))
+
+    tiles = {}
+    for cell, (col, row) in enumerate(cells.tolist()):
+        tile_graph, tile_store = combine([(graph, node_store, entry[bounds[cell]:bounds[cell + 1]])])
+        tile_owner = owner[np.searchsorted(graph.node_ids, tile_graph.node_ids)]
+        boundary = np.flatnonzero((tile_owner >= 0) & (tile_owner != cell))
+        boundary_cells = cells[tile_owner[boundary]]
+        name = tile_name(col, row)
+        file = os.path.join(version, f'{name}.snap')
+        write_snapshot(os.path.join(directory, file), tile_graph, tile_store, header['checksum'],
+                       extra_arrays={'boundary_nodes': boundary.astype(np.int32), 'boundary_tiles': boundary_cells},
+                       tile=[col, row], degrees=degrees, tiles_version=version)
+        tiles[name] = {
+            'file': file,
+            'cell': [col, row],
+            'node_count': tile_graph.number_of_nodes(),
+            'edge_count': tile_graph.number_of_edges(),
+            'boundary_count': len(boundary),
+            'neighbors': sorted({tile_name(*neighbor) for neighbor in boundary_cells.tolist()}),
+        }
+
+    index_path = tile_index_path(directory)
+    previous = read_index(directory)['version'] if os.path.exists(index_path) else None
+    index = {'version': version, 'checksum': header['checksum'], 'degrees': degrees, 'created_at': time.time(), 'tiles': tiles}
+    temp_path = f'{index_path}.tmp.{os.getpid()}'
+    with open(temp_path, 'w') as file:
+        json.dump(index, file)
+    os.replace(temp_path, index_path)
+    # Servers may still map the build they were started on; anything older is unused
+    for entry_name in os.listdir(directory):
+        stale = os.path.join(directory, entry_name)
+        if os.path.isdir(stale) and entry_name not in (version, previous):
+            shutil.rmtree(stale, ignore_errors=True)
+    print(f'wrote {len(tiles)} tiles of {degrees} degrees to {build_directory} in {time.monotonic() - started:.1f}s')
+    return index
+
+
+def read_index(directory):
+    """Tile index of a tile directory; raises OSError if there is none."""
+    with open(tile_index_path(directory)) as file:
+        return json.load(file)
+
+
+class TiledGraph:
+    """The tiles of one build, mapped when a request first needs them.
+
+    ``region(names)`` merges tiles into a graph the finders search as usual
+    and returns ``(graph, node_store, spatial_index, heuristic)``. Mapped
+    tiles and merged regions are both kept in LRU order. A tile dropped from
+    the LRU is unmapped once no cached region still uses it.
+    """
+
+    def __init__(self, directory, max_tiles=tile_cache_size, max_regions=region_cache_size):
+        self.directory = directory
+        self.index = read_index(directory)
+        self.version = self.index['version']
+        self.degrees = self.index['degrees']
+        self.max_tiles = max_tiles
+        self.max_regions = max_regions
+        self.tiles = OrderedDict()  # name -> (graph, node_store)
+        self.regions = OrderedDict()  # sorted tuple of names -> (graph, node_store, spatial_index, heuristic)
+        self.loads = 0
+        self.evictions = 0
+        self.region_hits = 0
+        self.region_builds = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f"TiledGraph {self.version}: {len(self.index['tiles'])} tiles of {self.degrees} degrees, {len(self.tiles)} mapped"
+
+    def tile(self, name):
+        """``(graph, node_store)`` of one tile, mapping it if it is not yet."""
+        with self.lock:
+            loaded = self.tiles.get(name)
+            if loaded is not None:
+                self.tiles.move_to_end(name)
+                return loaded
+        graph, node_store, header = load_snapshot(os.path.join(self.directory, self.index['tiles'][name]['file']))
+        if header.get('tiles_version') != self.version:
+            raise ValueError(f"tile {name} belongs to build {header.get('tiles_version')}, expected {self.version}")
+        with self.lock:
+            self.tiles[name] = (graph, node_store)
+            self.loads += 1
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+                self.evictions += 1
+        return graph, node_store
+
+    def tiles_around(self, longitude, latitude, radius):
+        """Names of the tiles with any part within ``radius`` meters of a point."""
+        cos_latitude = max(math.cos(math.radians(latitude)), 0.01)
+        lon_span = radius / (METERS_PER_DEGREE * cos_latitude)
+        lat_span = radius / METERS_PER_DEGREE
+        first_col, first_row = (int(value) for value in tile_cells(longitude - lon_span, latitude - lat_span, self.degrees))
+        last_col, last_row = (int(value) for value in tile_cells(longitude + lon_span, latitude + lat_span, self.degrees))
+        names = set()
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                name = tile_name(col, row)
+                if name not in self.index['tiles']:
+                    continue
+                # Distance from the point to the closest point of the cell
+                dx = (min(max(longitude, col * self.degrees), (col + 1) * self.degrees) - longitude) * cos_latitude
+                dy = min(max(latitude, row * self.degrees), (row + 1) * self.degrees) - latitude
+                if math.hypot(dx, dy) * METERS_PER_DEGREE <= radius:
+                    names.add(name)
+        return names
+
+    def region(self, names):
+        """Merged graph of the named tiles with its spatial index and heuristic, built once per tile set."""
+        key = tuple(sorted(names))
+        with self.lock:
+            region = self.regions.get(key)
+            if region is not None:
+                self.regions.move_to_end(key)
+                self.region_hits += 1
+                return region
+        tiles = [self.tile(name) for name in key]
+        graph, node_store = combine([(graph, node_store, np.arange(len(graph.neighbors))) for graph, node_store in tiles])
+        graph.version = self.version
+        spatial_index = SpatialIndex(node_store.longitude, node_store.latitude, mask=graph.degrees() > 0, component=graph.component)
+        region = (graph, node_store, spatial_index, HaversineHeuristic(node_store.longitude, node_store.latitude))
+        with self.lock:
+            self.regions[key] = region
+            self.region_builds += 1
+            while len(self.regions) > self.max_regions:
+                self.regions.popitem(last=False)
+        return region
+
+    def stats(self):
+        return {
+            'version': self.version, 'tiles': len(self.index['tiles']), 'mapped': len(self.tiles), 'loads': self.loads,
+            'evictions': self.evictions, 'regions': len(self.regions), 'region_hits': self.region_hits,
+            'region_builds': self.region_builds,
+            'region_bytes': sum(region_bytes(region) for region in list(self.regions.values())),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Split the routing graph snapshot into geographic tiles.')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--path', default=snapshot_path, help='snapshot to split (default: %(default)s)')
+    parser.add_argument('--directory', default=tiles_path, help='tile directory (default: %(default)s)')
+    parser.add_argument('--degrees', type=float, default=TILE_DEGREES, help='tile width and height (default: %(default)s)')
+    args = parser.parse_args(argv)
+    graph, node_store, header = load_snapshot(args.path)
+    index = write_tiles(args.directory, graph, node_store, header, args.degrees)
+    sizes = [tile['node_count'] for tile in index['tiles'].values()]
+    boundary = sum(tile['boundary_count'] for tile in index['tiles'].values())
+    print(f"{len(sizes)} tiles, {min(sizes, default=0):,} to {max(sizes, default=0):,} nodes each, {boundary:,} boundary nodes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""Apply a set of changed OSM ways and nodes to the routing graph and publish it as a new snapshot.
+
+Instead of re-running the whole osm2pgsql / osm4routing import and rebuilding
+the graph from the tables, run osm4routing on the changed ways only and point
+this script at a directory holding:
+
+    edges.csv          osm4routing edge rows of every changed or new way (all of each way's edges)
+    deleted_ways.csv   optional, ``osm_id`` of ways removed entirely
+    nodes.csv          optional, ``id,lon,lat`` of new or moved nodes
+    nodes_with_elevation.csv   optional, ``node_id,elevation`` for those nodes (``elevation.py --input``)
+
+Every edge of a changed way is replaced, which covers insertions, deletions
+and length changes alike. The edges and nodes tables are updated in one
+transaction. The new graph is built from the snapshot's own edge list, not
+by reading the tables back: the ways' edges are swapped out, the CSR arrays,
+chain compression and component labels are rebuilt in NumPy, and node
+attributes carry over from the current snapshot. The result is written next
+to the snapshot and renamed over it, and running servers swap to it on their
+next poll (see ``routing_state``). Route caches are keyed by the snapshot
+version and start afresh. Landmarks and the contraction hierarchy belong to
+the old table checksum and are ignored until rebuilt with ``graph_snapshot.py``.
+If the snapshot has been cut into tiles (``graph_tiles.py``), the tiles are
+rebuilt from the new graph as well.
+
+Usage (from route-api/)::
+
+    python graph_update.py path/to/diff --dry-run   # report what would change
+    python graph_update.py path/to/diff
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import numpy as np
+from database.db import db
+from create_graph import FOOT_FORBIDDEN, build_graph_from_edges
+from graph_snapshot import snapshot_path, load_snapshot, snapshot_version, source_checksum, write_snapshot
+from graph_tiles import tiles_path, tile_index_path, read_index, write_tiles
+from node_store import build_node_store
+from controller.edge import replace_way_edges
+from controller.node import upsert_nodes, get_nodes_by_id
+
+EDGE_COLUMNS = ['id', 'osm_id', 'source', 'target', 'length', 'foot', 'car_forward', 'car_backward',
+                'bike_forward', 'bike_backward', 'train', 'wkt']
+
+
+class GraphDiff:
+    """Changed ways with their new edge rows, and new or moved nodes, read from a diff directory."""
+
+    def __init__(self, ways, edge_rows, node_rows):
+        self.ways = np.unique(np.asarray(ways, dtype=np.int64))
+        self.edge_rows = edge_rows  # dicts keyed by EDGE_COLUMNS, as the edges table takes them
+        self.node_rows = node_rows  # dicts with id, longitude, latitude, elevation (None if unknown)
+
+    def __repr__(self):
+        return f'GraphDiff of {len(self.ways):,} ways, {len(self.edge_rows):,} edges, {len(self.node_rows):,} nodes'
+
+    def foot_edges(self):
+        """``(sources, targets, lengths, ways)`` of the new edges pedestrians may use."""
+        rows = [row for row in self.edge_rows if row['foot'] != FOOT_FORBIDDEN]
+        return (
+            np.array([row['source'] for row in rows], dtype=np.int64),
+            np.array([row['target'] for row in rows], dtype=np.int64),
+            np.array([row['length'] for row in rows], dtype=np.float32),
+            np.array([row['osm_id'] for row in rows], dtype=np.int64),
+        )
+
+
+def _read_csv(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        return list(csv.DictReader(file))
+
+
+def read_diff(directory):
+    edge_rows = []
+    for row in _read_csv(os.path.join(directory, 'edges.csv')):
+        edge = {column: row.get(column) or None for column in EDGE_COLUMNS}
+        edge.update(osm_id=int(edge['osm_id']), source=int(edge['source']), target=int(edge['target']),
+                    length=float(edge['length']))
+        edge_rows.append(edge)
+    deleted = [int(row['osm_id']) for row in _read_csv(os.path.join(directory, 'deleted_ways.csv'))]
+    elevations = {
+        int(row['node_id']): float(row['elevation'])
+        for row in _read_csv(os.path.join(directory, 'nodes_with_elevation.csv')) if row['elevation']
+    }
+    node_rows = [
+        {'id': int(row['id']), 'longitude': float(row['lon']), 'latitude': float(row['lat']),
+         'elevation': elevations.get(int(row['id']))}
+        for row in _read_csv(os.path.join(directory, 'nodes.csv'))
+    ]
+    return GraphDiff([row['osm_id'] for row in edge_rows] + deleted, edge_rows, node_rows)
+
+
+def apply_diff(graph, node_store, diff, fetch_nodes):
+    """New ``(graph, node_store, summary)`` with the diff's ways replaced; the inputs are left untouched.
+
+    ``fetch_nodes(ids)`` returns node rows (id, longitude, latitude, elevation,
+    is_poi, poi_desc) for the diff's nodes and for nodes the new edges reach
+    that the old graph did not have. Every other node keeps the snapshot's
+    columns.
+    """
+    if graph.edge_list is None:
+        raise ValueError('the snapshot has no edge list; rebuild it once with "python graph_snapshot.py build"')
+    sources, targets, lengths, ways = graph.edge_list
+    keep = ~np.isin(ways, diff.ways)
+    new_sources, new_targets, new_lengths, new_ways = diff.foot_edges()
+    graph_after = build_graph_from_edges(
+        np.concatenate([sources[keep], new_sources]), np.concatenate([targets[keep], new_targets]),
+        np.concatenate([lengths[keep], new_lengths]), np.concatenate([ways[keep], new_ways]),
+    )
+
+    diff_ids = np.array([row['id'] for row in diff.node_rows], dtype=np.int64)
+    fetch_ids = np.union1d(diff_ids, np.setdiff1d(graph_after.node_ids, graph.node_ids))
+    rows = fetch_nodes(fetch_ids.tolist()) if len(fetch_ids) else []
+    count = len(rows)
+    old = ~np.isin(graph.node_ids, fetch_ids)
+    poi_desc = {graph.node_id(index): desc for index, desc in node_store.poi_desc.items() if old[index]}
+    poi_desc.update((row.id, row.poi_desc) for row in rows if row.is_poi and row.poi_desc)
+    store_after = build_node_store(
+        graph_after,
+        np.concatenate([graph.node_ids[old], np.fromiter((row.id for row in rows), dtype=np.int64, count=count)]),
+        np.concatenate([node_store.longitude[old], np.fromiter((row.longitude for row in rows), dtype=np.float64, count=count)]),
+        np.concatenate([node_store.latitude[old], np.fromiter((row.latitude for row in rows), dtype=np.float64, count=count)]),
+        np.concatenate([graph.elevation[old], np.fromiter((row.elevation or 0 for row in rows), dtype=np.float32, count=count)]),
+        np.concatenate([graph.is_poi[old], np.fromiter((bool(row.is_poi) for row in rows), dtype=bool, count=count)]),
+        poi_desc, node_store.version,
+    )
+
+    summary = {
+        'ways': len(diff.ways),
+        'edges_removed': int((~keep).sum()),
+        'edges_added': len(new_sources),
+        'nodes_before': graph.number_of_nodes(),
+        'nodes_after': graph_after.number_of_nodes(),
+        'nodes_fetched': count,
+        'nodes_missing': len(fetch_ids) - count,
+    }
+    return graph_after, store_after, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply changed OSM ways to the routing graph snapshot.')
+    parser.add_argument('diff', help='directory with edges.csv and optionally deleted_ways.csv, nodes.csv, nodes_with_elevation.csv')
+    parser.add_argument('--path', default=snapshot_path, help='snapshot file (default: %(default)s)')
+    parser.add_argument('--tiles', default=tiles_path, help='tile directory to rebuild, if it exists (default: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true', help='report the change, then roll the tables back and leave the snapshot alone')
+    args = parser.parse_args(argv)
+
+    from app import app
+    db.init_app(app)
+    with app.app_context():
+        started = time.monotonic()
+        graph, node_store, header = load_snapshot(args.path)
+        # Bring node attributes up to the change log first, so the new snapshot carries them
+        node_store.refresh()
+        diff = read_diff(args.diff)
+        # Write the tables first: the new graph's node rows are then read back inside the same transaction
+        upsert_nodes(diff.node_rows)
+        replace_way_edges(diff.ways.tolist(), diff.edge_rows)
+        graph_after, store_after, summary = apply_diff(graph, node_store, diff, get_nodes_by_id)
+        print(f'{diff}: {summary} in {time.monotonic() - started:.1f}s')
+        if summary['nodes_missing']:
+            print(f"warning: {summary['nodes_missing']:,} nodes of the new edges are not in the nodes table; "
+                  f"add them to nodes.csv")
+        if args.dry_run:
+            db.session.rollback()
+            return 0
+
+        db.session.commit()
+        checksum = source_checksum()
+        header_after = write_snapshot(args.path, graph_after, store_after, checksum,
+                                      previous_version=snapshot_version(header), update=summary)
+        if os.path.exists(tile_index_path(args.tiles)):
+            write_tiles(args.tiles, graph_after, store_after, header_after, read_index(args.tiles)['degrees'])
+        print(f"published {args.path} version {snapshot_version(header_after)}: {header_after['node_count']:,} nodes, "
+              f"{header_after['edge_count']:,} edges, {time.monotonic() - started:.1f}s in total")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
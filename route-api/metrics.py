@@ -0,0 +1,145 @@
+"""Per-request stage timers and search counters, exported in the Prometheus text format.
+
+A ``RouteTrace`` follows one request: ``mark(stage)`` records the time since
+the previous mark under that stage name, ``count(name, value)`` records a
+search counter. ``finish()`` folds both into the process-wide histograms
+served at ``/metrics``. Requests can also be profiled: a sampled share of
+them runs under cProfile, and the profile is written out when the request
+turns out slower than ``ROUTE_PROFILE_THRESHOLD_MS``.
+"""
+import cProfile
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; route searches run from milliseconds to the multi-second budget
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Node expansions, heap pushes, candidate counts
+COUNT_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+profile_threshold_ms = float(os.getenv('ROUTE_PROFILE_THRESHOLD_MS', '0'))  # 0 turns profiling off
+profile_sample_rate = float(os.getenv('ROUTE_PROFILE_SAMPLE_RATE', '0.05'))
+profile_directory = os.getenv('ROUTE_PROFILE_DIR', os.path.join('cache', 'profiles'))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value."""
+
+    def __init__(self, name, description, label=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self.series = {}  # label value -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for label_value, series in sorted(self.series.items(), key=lambda item: str(item[0])):
+                labels = f'{self.label}="{label_value}",' if self.label else ''
+                cumulative = 0
+                for bound, count in zip((*self.buckets, '+Inf'), series[:-1]):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_sum{{{labels.rstrip(",")}}} {series[-1]}')
+                lines.append(f'{self.name}_count{{{labels.rstrip(",")}}} {cumulative}')
+        return '\n'.join(lines)
+
+
+class Counter:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self):
+        return f'# HELP {self.name} {self.description}\n# TYPE {self.name} counter\n{self.name} {self.value}'
+
+
+request_seconds = Histogram('route_request_duration_seconds', 'Route request latency.', label='endpoint')
+stage_seconds = Histogram('route_stage_duration_seconds', 'Time spent in each stage of a route request.', label='stage')
+search_counts = Histogram('route_search_work', 'Search work per request (nodes expanded, heap pushes, candidates).',
+                          label='counter', buckets=COUNT_BUCKETS)
+truncated_searches = Counter('route_search_truncated_total', 'Searches stopped by their time or expansion budget.')
+profiles_written = Counter('route_profiles_written_total', 'Slow sampled requests written out as cProfile dumps.')
+METRICS = [request_seconds, stage_seconds, search_counts, truncated_searches, profiles_written]
+
+
+def render_metrics():
+    return '\n'.join(metric.render() for metric in METRICS) + '\n'
+
+
+class RouteTrace:
+    """Stage timings and search counters of one request."""
+
+    def __init__(self, endpoint='route', profile=True, started=None):
+        self.endpoint = endpoint
+        self.started = started or time.perf_counter()
+        self.last_mark = self.started
+        self.stages = {}
+        self.counters = {}
+        self.profiler = None
+        # cProfile only follows one thread, so requests that hop between threads pass profile=False
+        if profile and profile_threshold_ms > 0 and random.random() < profile_sample_rate:
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:  # Another profiler is already active on this thread
+                self.profiler = None
+
+    def mark(self, stage):
+        """Charge the time since the previous mark to ``stage``."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last_mark
+        self.last_mark = now
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def search(self, stats):
+        """Record the counters of a ``search_stats`` dict."""
+        for name, value in stats.items():
+            if name == 'truncated':
+                if value:
+                    truncated_searches.inc()
+            elif name != 'elapsed_ms':
+                self.count(name, value)
+
+    def server_timing(self):
+        """``Server-Timing`` header value, which browser dev tools show next to the request."""
+        stages = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in self.stages.items()]
+        return ', '.join(stages + [f'total;dur={(self.last_mark - self.started) * 1000:.1f}'])
+
+    def finish(self):
+        """Record the request into the histograms; call once, after the response body is built."""
+        self.last_mark = time.perf_counter()
+        total = self.last_mark - self.started
+        request_seconds.observe(total, self.endpoint)
+        for stage, seconds in self.stages.items():
+            stage_seconds.observe(seconds, stage)
+        for name, value in self.counters.items():
+            search_counts.observe(value, name)
+        if self.profiler is not None:
+            self.profiler.disable()
+            if total * 1000 >= profile_threshold_ms:
+                os.makedirs(profile_directory, exist_ok=True)
+                path = os.path.join(profile_directory, f'{self.endpoint}-{time.strftime("%Y%m%d-%H%M%S")}-{int(total * 1000)}ms-{threading.get_ident()}.prof')
+                self.profiler.dump_stats(path)
+                profiles_written.inc()
+                print(f'slow {self.endpoint} request ({total * 1000:.0f} ms) profiled to {path}')
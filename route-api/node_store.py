@@ -0,0 +1,128 @@
+import os
+import time
+import numpy as np
+from controller.node import get_node_attributes, get_last_node_change, get_node_changes
+
+refresh_interval = float(os.getenv('NODE_STORE_REFRESH_SECONDS', '60'))
+
+class NodeStore:
+    """Node attributes held in arrays aligned with the routing graph's dense index.
+
+    The store is loaded once at startup. Created before the server forks its
+    workers (e.g. ``gunicorn --preload``), the arrays are shared read-only
+    between them through copy-on-write pages. Elevation and POI flags are the
+    graph's own columns, so search code and the store always agree.
+    POI descriptions are kept in a separate ``{index: description}`` table
+    because only a small fraction of nodes are POIs.
+    """
+
+    def __init__(self, graph, longitude, latitude, poi_desc, version=0):
+        self.graph = graph
+        self.node_ids = graph.node_ids
+        self.longitude = longitude
+        self.latitude = latitude
+        self.poi_desc = poi_desc
+        self.version = version  # Last node_changes sequence number applied
+        self.refreshed_at = time.monotonic()
+
+    @property
+    def elevation(self):
+        return self.graph.elevation
+
+    @property
+    def is_poi(self):
+        return self.graph.is_poi
+
+    def index(self, node_id):
+        return self.graph.index(node_id)
+
+    def indices(self, node_ids):
+        """Dense indices of a sequence of node ids that are known to be in the graph."""
+        return np.searchsorted(self.node_ids, np.asarray(node_ids, dtype=np.int64))
+
+    def coordinates(self, indices):
+        """List of (latitude, longitude) tuples for the given node indices."""
+        return list(zip(self.latitude[indices].tolist(), self.longitude[indices].tolist()))
+
+    def description(self, index):
+        return self.poi_desc.get(int(index)) or "Unknown POI"
+
+    def apply(self, rows):
+        """Write node rows (id, longitude, latitude, elevation, is_poi, poi_desc) into the arrays."""
+        for row in rows:
+            if row.id not in self.graph:
+                continue
+            i = self.graph.index(row.id)
+            self.longitude[i] = row.longitude
+            self.latitude[i] = row.latitude
+            self.elevation[i] = row.elevation or 0
+            self.is_poi[i] = bool(row.is_poi)
+            if row.is_poi and row.poi_desc:
+                self.poi_desc[i] = row.poi_desc
+            else:
+                self.poi_desc.pop(i, None)
+        if rows:
+            # Compressed edges summarize the elevation and POIs of their shape nodes
+            self.graph.update_edge_profiles()
+
+    def refresh(self):
+        """Apply the node rows changed since the last refresh, using the node_changes log."""
+        return self.apply_changes(get_node_changes(self.version))
+
+    def apply_changes(self, rows):
+        """Apply rows from the node_changes log query (with their ``seq``) and advance the version."""
+        self.apply(rows)
+        if rows:
+            self.version = max(row.seq for row in rows)
+        self.refreshed_at = time.monotonic()
+        return len(rows)
+
+    def refresh_if_due(self):
+        if time.monotonic() - self.refreshed_at >= refresh_interval:
+            return self.refresh()
+        return 0
+
+
+def load_node_store(graph):
+    """Load every node's attributes once and align them with the graph's index."""
+    print('load node store start...')
+    version = get_last_node_change()
+    rows = get_node_attributes()
+    count = len(rows)
+    ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=count)
+    longitude = np.fromiter((row.longitude for row in rows), dtype=np.float64, count=count)
+    latitude = np.fromiter((row.latitude for row in rows), dtype=np.float64, count=count)
+    elevation = np.fromiter((row.elevation or 0 for row in rows), dtype=np.float32, count=count)
+    is_poi = np.fromiter((bool(row.is_poi) for row in rows), dtype=bool, count=count)
+    poi_desc = {row.id: row.poi_desc for row in rows if row.is_poi and row.poi_desc}
+    del rows
+    return build_node_store(graph, ids, longitude, latitude, elevation, is_poi, poi_desc, version)
+
+
+def build_node_store(graph, ids, longitude, latitude, elevation, is_poi, poi_desc, version=0):
+    """Align per-node columns given for arbitrary node ``ids`` with the graph's index.
+
+    ``poi_desc`` maps node ids to descriptions. Nodes outside the graph are
+    dropped, and graph nodes without a row keep zeros.
+    """
+    node_count = len(graph.node_ids)
+    ids = np.asarray(ids, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(graph.node_ids, ids), node_count - 1)
+    in_graph = graph.node_ids[positions] == ids
+    positions = positions[in_graph]
+
+    store_longitude = np.zeros(node_count, dtype=np.float64)
+    store_latitude = np.zeros(node_count, dtype=np.float64)
+    store_longitude[positions] = np.asarray(longitude)[in_graph]
+    store_latitude[positions] = np.asarray(latitude)[in_graph]
+    graph.elevation[positions] = np.asarray(elevation)[in_graph]
+    graph.is_poi[positions] = np.asarray(is_poi)[in_graph]
+    store_poi_desc = {}
+    for node_id, desc in poi_desc.items():
+        if node_id in graph:
+            store_poi_desc[graph.index(node_id)] = desc
+    graph.update_edge_profiles()
+
+    store = NodeStore(graph, store_longitude, store_latitude, store_poi_desc, version=version)
+    print('load node store complete...', f'{len(positions):,} nodes, {len(store_poi_desc):,} POI descriptions')
+    return store
@@ -1,36 +1,62 @@
 # route-api/route/AStarAlgorithmn.py
 
+import time
+from route.heuristics import ZeroHeuristic
+
 class AStarAlgorithm:
-    def __init__(self, graph):
+    def __init__(self, graph, heuristic=None, time_budget=None, max_expansions=None):
         self.graph = graph
+        self.estimator = heuristic or ZeroHeuristic()
+        self.time_budget = time_budget
+        self.max_expansions = max_expansions
+        self.nodes_expanded = 0
+        self.heap_pushes = 0
+        self.truncated = False
 
     def heuristic(self, node, target):
-        """Calculates the heuristic for A* (currently a placeholder)."""
-        return 0  # Implement your heuristic logic based on coordinates if needed
+        """Calculates the heuristic for A*: a lower bound on the distance from node to target."""
+        return self.estimator.towards(target)(node)
 
     def calculate_constrained_path(self, start, goal, target_distance):
-        """Calculate a path from start to goal with a constrained distance range."""
+        """Calculate a path from start to goal with a constrained distance range.
+
+        When ``time_budget`` seconds or ``max_expansions`` pops run out, the
+        closest path found so far is returned and ``truncated`` is set.
+        """
         min_distance = target_distance * 0.9
         max_distance = target_distance * 1.1
 
+        # Search on dense graph indices
+        start = self.graph.index(start)
+        goal = self.graph.index(goal)
+
         # Initialize structures
         open_set = {start}
         closed_set = set()
         came_from = {}
 
-        g_score = {node: float('inf') for node in self.graph.nodes()}
-        g_score[start] = 0
+        # Scores default to infinity for nodes that have not been reached yet
+        estimate = self.estimator.towards(goal)
+        g_score = {start: 0}
 
-        f_score = {node: float('inf') for node in self.graph.nodes()}
-        f_score[start] = self.heuristic(start, goal)
+        f_score = {start: estimate(start)}
+        self.nodes_expanded = 0
+        self.heap_pushes = 0
+        self.truncated = False
+        deadline = time.monotonic() + self.time_budget if self.time_budget is not None else float('inf')
+        max_expansions = self.max_expansions if self.max_expansions is not None else float('inf')
 
         closest_path = None
         closest_distance = float('inf')
 
         while open_set:
+            if self.nodes_expanded >= max_expansions or time.monotonic() > deadline:
+                self.truncated = True
+                break
             # Pick the node with the lowest f_score
             current = min(open_set, key=lambda node: f_score[node])
             current_distance = g_score[current]
+            self.nodes_expanded += 1
 
             # Check if current path to goal meets distance constraints
             if current == goal:
@@ -40,7 +66,7 @@ class AStarAlgorithm:
                         path.append(current)
                         current = came_from[current]
                     path.append(start)
-                    return path[::-1]  # Return the path from start to goal
+                    return self.graph.path_ids(path[::-1])  # Return the path from start to goal
 
                 # Record the closest path if within the min_distance
                 if abs(current_distance - target_distance) < abs(closest_distance - target_distance):
@@ -57,24 +83,26 @@ class AStarAlgorithm:
             closed_set.add(current)
 
             # Evaluate neighbors
-            for neighbor in self.graph.neighbors(current):
+            for neighbor, edge_weight in self.graph.edges(current):
                 if neighbor in closed_set:
                     continue
 
-                tentative_g_score = g_score[current] + self.graph[current][neighbor]['weight']
+                tentative_g_score = g_score[current] + edge_weight
+                lower_bound = estimate(neighbor)
 
-                # Skip if over max_distance
-                if tentative_g_score > max_distance:
+                # Skip if the goal cannot be reached within max_distance
+                if tentative_g_score + lower_bound > max_distance:
                     continue
 
                 # Update path if better than existing
-                if tentative_g_score < g_score[neighbor]:
+                if tentative_g_score < g_score.get(neighbor, float('inf')):
                     came_from[neighbor] = current
                     g_score[neighbor] = tentative_g_score
-                    f_score[neighbor] = g_score[neighbor] + self.heuristic(neighbor, goal)
+                    f_score[neighbor] = g_score[neighbor] + lower_bound
 
                     if neighbor not in open_set:
                         open_set.add(neighbor)
+                        self.heap_pushes += 1
 
         # Return the closest path if no exact match within range
-        return closest_path if closest_path is not None else None
+        return self.graph.path_ids(closest_path) if closest_path is not None else None
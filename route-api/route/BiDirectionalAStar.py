@@ -1,63 +1,135 @@
 import heapq
-from math import sqrt
+import time
+from array import array
+from route.heuristics import ZeroHeuristic
+
+# Accepted route lengths as fractions of the requested distance
+WINDOW = (0.85, 1.15)
 
 class BiDirectionalAStar:
-    def __init__(self, graph, node_details, elevation_pref="max", poi_pref="max"):
+    def __init__(self, graph, node_store, elevation_pref="max", poi_pref="max", heuristic=None,
+                 time_budget=None, max_expansions=None):
         self.graph = graph
-        self.node_details = node_details
+        self.node_store = node_store
         self.elevation_pref = elevation_pref
         self.poi_pref = poi_pref
+        self.estimator = heuristic or ZeroHeuristic()
+        self.time_budget = time_budget
+        self.max_expansions = max_expansions
+        self.nodes_expanded = 0
+        self.heap_pushes = 0
+        self.truncated = False
+
+    def heuristic(self, node, target):
+        """Lower bound on the network distance between two node indices."""
+        return self.estimator.towards(target)(node)
+
+    def find_paths_within_distance(self, start, goal, target_distance, deadline=None, window=WINDOW):
+        """Find paths from start to goal within the target distance range."""
+        return list(self.iter_paths_within_distance(start, goal, target_distance, deadline, window))
 
-    def heuristic(self, node, neighbor):
-        return 0
+    def iter_paths_within_distance(self, start, goal, target_distance, deadline=None, window=WINDOW):
+        """Yield ``(path_ids, distance)`` for each path in the target distance range as soon as the frontiers meet on it.
 
-    def find_paths_within_distance(self, start, goal, target_distance):
-        """Find paths from start to goal within the target distance range."""
-        
-        min_distance = target_distance * 0.85
-        max_distance = target_distance * 1.15
+        The range is ``window`` as fractions of ``target_distance``; a narrower
+        window searches one slice of it, so slices can run as separate tasks.
 
-        forward_open_set = []
-        backward_open_set = []
+        ``deadline`` is a ``time.monotonic()`` timestamp after which the search
+        stops early; the finder's own ``time_budget`` (seconds) and
+        ``max_expansions`` bound it too. Either way the paths found so far stand
+        and ``truncated`` is set.
+
+        Every heap push creates a label (node, parent label) instead of copying the
+        whole path prefix. Labels are never modified, so a heap entry still refers
+        to the exact path it was pushed with even after a shorter one replaces it in
+        ``visited``; full paths are rebuilt only when the two frontiers meet.
+
+        Each frontier is guided by the heuristic towards the opposite endpoint, and
+        a label whose distance plus that lower bound exceeds ``max_distance`` is
+        pruned because no route in the window can pass through it.
+        """
 
-        heapq.heappush(forward_open_set, (0, start, 0, [start]))
-        heapq.heappush(backward_open_set, (0, goal, 0, [goal]))
+        min_distance = target_distance * window[0]
+        max_distance = target_distance * window[1]
 
-        forward_visited = {start: (0, [start])}
-        backward_visited = {goal: (0, [goal])}
+        # The search runs on dense graph indices; paths are mapped back to node ids at the end
+        start = self.graph.index(start)
+        goal = self.graph.index(goal)
 
-        valid_paths = []
+        # Label storage: node and parent label of every pushed entry (-1 marks the root)
+        label_node = array('q', [start, goal])
+        label_parent = array('q', [-1, -1])
 
-        def expand_search(queue, visited, other_visited, direction):
+        forward_open_set = []
+        backward_open_set = []
+
+        heapq.heappush(forward_open_set, (0, start, 0, 0))  # (priority, node, distance, label)
+        heapq.heappush(backward_open_set, (0, goal, 0, 1))
+
+        forward_visited = {start: (0, 0)}  # node -> (distance, label)
+        backward_visited = {goal: (0, 1)}
+
+        self.nodes_expanded = 0
+        self.heap_pushes = 0
+        self.truncated = False
+        if self.time_budget is not None:
+            budget_deadline = time.monotonic() + self.time_budget
+            deadline = budget_deadline if deadline is None else min(deadline, budget_deadline)
+        max_expansions = self.max_expansions if self.max_expansions is not None else float('inf')
+        to_goal = self.estimator.towards(goal)
+        to_start = self.estimator.towards(start)
+
+        def trace(label):
+            """Nodes from a label back to its root (current node first)."""
+            path = []
+            while label >= 0:
+                path.append(label_node[label])
+                label = label_parent[label]
+            return path
+
+        def expand_search(queue, visited, other_visited, direction, estimate):
             if not queue:
                 return None
 
-            _, current_node, current_distance, path = heapq.heappop(queue)
+            _, current_node, current_distance, label = heapq.heappop(queue)
+            self.nodes_expanded += 1
 
             if current_node in other_visited:
-                other_distance, other_path = other_visited[current_node]
+                other_distance, other_label = other_visited[current_node]
                 total_distance = current_distance + other_distance
                 if min_distance <= total_distance <= max_distance:
-                    full_path = path + other_path if direction == 'forward' else other_path + path
-                    valid_paths.append((full_path, total_distance))
-                return
+                    # The forward half is traced goal-ward and reversed; the backward half is already in order
+                    forward_label, backward_label = (label, other_label) if direction == 'forward' else (other_label, label)
+                    return trace(forward_label)[::-1] + trace(backward_label), total_distance
+                return None
 
-            for neighbor in self.graph.neighbors(current_node):
-                edge_weight = self.graph[current_node][neighbor]['weight']
+            for neighbor, edge_weight in self.graph.edges(current_node):
                 new_distance = current_distance + edge_weight
 
-                if new_distance > max_distance:
+                # Lower bound on any route through the neighbor
+                priority = new_distance + estimate(neighbor)
+                if priority > max_distance:
                     continue
 
-                # Updated heuristic to consider elevation difference and POI status between current node and neighbor
-                priority = new_distance + self.heuristic(current_node, neighbor)
-
                 if neighbor not in visited or new_distance < visited[neighbor][0]:
-                    visited[neighbor] = (new_distance, path + [neighbor] if direction == 'forward' else [neighbor] + path)
-                    heapq.heappush(queue, (priority, neighbor, new_distance, path + [neighbor] if direction == 'forward' else [neighbor] + path))
+                    new_label = len(label_node)
+                    label_node.append(neighbor)
+                    label_parent.append(label)
+                    visited[neighbor] = (new_distance, new_label)
+                    heapq.heappush(queue, (priority, neighbor, new_distance, new_label))
+            return None
 
         while forward_open_set or backward_open_set:
-            expand_search(forward_open_set, forward_visited, backward_visited, 'forward')
-            expand_search(backward_open_set, backward_visited, forward_visited, 'backward')
-
-        return valid_paths
+            if self.nodes_expanded >= max_expansions or (deadline is not None and time.monotonic() > deadline):
+                self.truncated = True
+                break
+            for found in (
+                expand_search(forward_open_set, forward_visited, backward_visited, 'forward', to_goal),
+                expand_search(backward_open_set, backward_visited, forward_visited, 'backward', to_start),
+            ):
+                if found is not None:
+                    path, total_distance = found
+                    # Every label but the two roots was pushed once
+                    self.heap_pushes = len(label_node) - 2
+                    yield self.graph.path_ids(path), total_distance
+        self.heap_pushes = len(label_node) - 2
@@ -0,0 +1,311 @@
+# route-api/route/CSRGraph.py
+
+import heapq
+import numpy as np
+
+
+class CSRGraph:
+    """Undirected routing graph stored as compressed sparse row (CSR) arrays.
+
+    Nodes are addressed by a dense index ``0..n-1``. ``node_ids`` maps an index
+    back to the OSM node id and is kept sorted, so looking an id up is a binary
+    search instead of a dict. The neighbors of node ``i`` are
+    ``neighbors[offsets[i]:offsets[i + 1]]`` with matching edge ``lengths``.
+    Per-node columns (elevation, POI flag) are stored beside the topology, and
+    ``foot`` flags every adjacency entry whose edge is open to pedestrians.
+    ``component`` labels every node with its connected component, numbered by
+    size so that component 0 is the largest.
+
+    After ``compress_chains`` an adjacency entry may stand for a whole chain of
+    degree-2 shape nodes: ``via_nodes[via_offsets[e]:via_offsets[e + 1]]`` are
+    the nodes between the two ends of entry ``e``, in travel direction. Per
+    entry ``edge_gain``/``edge_loss`` (meters climbed and descended) and
+    ``edge_poi`` (POIs among the via nodes) summarize the chain for searches
+    that score elevation and POIs; ``update_edge_profiles`` recomputes them
+    after the node columns change.
+    """
+
+    def __init__(self, node_ids, offsets, neighbors, lengths, elevation=None, is_poi=None, foot=None, component=None,
+                 via_offsets=None, via_nodes=None, edge_gain=None, edge_loss=None, edge_poi=None):
+        self.node_ids = node_ids
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.lengths = lengths
+        node_count = len(node_ids)
+        self.elevation = elevation if elevation is not None else np.zeros(node_count, dtype=np.float32)
+        self.is_poi = is_poi if is_poi is not None else np.zeros(node_count, dtype=bool)
+        self.foot = foot if foot is not None else np.ones(len(neighbors), dtype=bool)
+        self.component = component if component is not None else self.connected_components()
+        self.via_offsets = via_offsets if via_offsets is not None else np.zeros(len(neighbors) + 1, dtype=np.int64)
+        self.via_nodes = via_nodes if via_nodes is not None else np.empty(0, dtype=np.int32)
+        self.edge_gain, self.edge_loss, self.edge_poi = edge_gain, edge_loss, edge_poi
+        if edge_gain is None or edge_loss is None or edge_poi is None:
+            self.update_edge_profiles()
+        self.version = None  # Identifies the snapshot the arrays came from
+        # Foot edges before compression as (source ids, target ids, lengths, way ids), kept for graph_update
+        self.edge_list = None
+
+    @classmethod
+    def from_edges(cls, sources, targets, lengths, foot=None):
+        """Build the graph from parallel arrays of edge endpoints (OSM ids), lengths and foot flags."""
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        foot = np.ones(len(sources), dtype=bool) if foot is None else np.asarray(foot, dtype=bool)
+
+        node_ids = np.unique(np.concatenate([sources, targets]))
+        src = np.searchsorted(node_ids, sources)
+        dst = np.searchsorted(node_ids, targets)
+
+        # Self loops never help a route
+        keep = src != dst
+        src, dst, lengths, foot = src[keep], dst[keep], lengths[keep], foot[keep]
+
+        # Store both directions, keeping only the shortest of any parallel edges
+        u = np.concatenate([src, dst])
+        v = np.concatenate([dst, src])
+        w = np.concatenate([lengths, lengths])
+        f = np.concatenate([foot, foot])
+        order = np.lexsort((w, v, u))
+        u, v, w, f = u[order], v[order], w[order], f[order]
+        first = np.ones(len(u), dtype=bool)
+        first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        u, v, w, f = u[first], v[first], w[first], f[first]
+
+        offsets = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(u, minlength=len(node_ids)), out=offsets[1:])
+        return cls(node_ids, offsets, v.astype(np.int32), w.astype(np.float32), foot=f)
+
+    def __repr__(self):
+        return f"CSRGraph with {self.number_of_nodes():,} nodes and {self.number_of_edges():,} edges"
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __contains__(self, node_id):
+        i = np.searchsorted(self.node_ids, node_id)
+        return i < len(self.node_ids) and self.node_ids[i] == node_id
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        return len(self.neighbors) // 2
+
+    def index(self, node_id):
+        """Return the dense index of an OSM node id, raising KeyError if it is not in the graph."""
+        i = int(np.searchsorted(self.node_ids, node_id))
+        if i >= len(self.node_ids) or self.node_ids[i] != node_id:
+            raise KeyError(node_id)
+        return i
+
+    def node_id(self, index):
+        return int(self.node_ids[index])
+
+    def path_ids(self, path):
+        """Translate a path of dense indices back to OSM node ids, expanding compressed chains."""
+        return self.node_ids[self.expand_path(path)].tolist()
+
+    def expand_path(self, path):
+        """Dense indices of a path with the via nodes of every compressed edge filled in."""
+        path = np.asarray(path, dtype=np.int64)
+        if len(self.via_nodes) == 0 or len(path) < 2:
+            return path
+        pieces = [path[:1]]
+        for u, v in zip(path[:-1].tolist(), path[1:].tolist()):
+            entry = self.edge_entry(u, v)
+            if entry is not None:
+                pieces.append(self.via_nodes[self.via_offsets[entry]:self.via_offsets[entry + 1]])
+            pieces.append(np.array([v], dtype=np.int64))
+        return np.concatenate(pieces).astype(np.int64)
+
+    def edge_entry(self, u, v):
+        """Adjacency entry of the edge from index ``u`` to ``v``, or None if they are not adjacent."""
+        start = self.offsets[u]
+        hits = np.flatnonzero(self.neighbors[start:self.offsets[u + 1]] == v)
+        return int(start + hits[0]) if len(hits) else None
+
+    def degree(self, index):
+        return int(self.offsets[index + 1] - self.offsets[index])
+
+    def degrees(self):
+        return np.diff(self.offsets)
+
+    def edge_sources(self):
+        """Source index of every adjacency entry (the row each entry belongs to)."""
+        return np.repeat(np.arange(len(self.node_ids), dtype=np.int32), self.degrees())
+
+    def foot_nodes(self):
+        """Boolean mask of nodes that touch at least one foot-legal edge."""
+        mask = np.zeros(len(self.node_ids), dtype=bool)
+        mask[self.edge_sources()[self.foot]] = True
+        return mask
+
+    def edges(self, index):
+        """Yield ``(neighbor_index, length)`` pairs for a node."""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return zip(self.neighbors[start:end].tolist(), self.lengths[start:end].tolist())
+
+    def edge_profiles(self, index):
+        """Yield ``(neighbor_index, length, elevation_change, via_poi_count)`` for a node's edges."""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        change = self.edge_gain[start:end] + self.edge_loss[start:end]
+        return zip(self.neighbors[start:end].tolist(), self.lengths[start:end].tolist(),
+                   change.tolist(), self.edge_poi[start:end].tolist())
+
+    def edge_length(self, u, v):
+        """Length of the edge between two node indices, or None if they are not adjacent."""
+        for neighbor, length in self.edges(u):
+            if neighbor == v:
+                return length
+        return None
+
+    def update_edge_profiles(self):
+        """Recompute per-entry elevation gain/loss and via POI counts from the node columns."""
+        entry_count = len(self.neighbors)
+        via_counts = np.diff(self.via_offsets)
+        # Every entry is walked as source, via nodes..., neighbor in one flat sequence
+        sequence_lengths = via_counts + 2
+        sequence_offsets = np.zeros(entry_count + 1, dtype=np.int64)
+        np.cumsum(sequence_lengths, out=sequence_offsets[1:])
+        sequence = np.empty(int(sequence_offsets[-1]), dtype=np.int64)
+        sequence[sequence_offsets[:-1]] = self.edge_sources()
+        sequence[sequence_offsets[1:] - 1] = self.neighbors
+        via_entry = np.repeat(np.arange(entry_count, dtype=np.int64), via_counts)
+        sequence[np.arange(len(self.via_nodes)) - self.via_offsets[:-1][via_entry] + sequence_offsets[:-1][via_entry] + 1] = self.via_nodes
+
+        steps = np.diff(self.elevation[sequence].astype(np.float64))
+        within = np.ones(len(steps), dtype=bool)
+        within[sequence_offsets[1:-1] - 1] = False
+        steps = steps[within]
+        step_entry = np.repeat(np.arange(entry_count, dtype=np.int64), sequence_lengths - 1)
+        self.edge_gain = np.bincount(step_entry, weights=np.maximum(steps, 0), minlength=entry_count).astype(np.float32)
+        self.edge_loss = np.bincount(step_entry, weights=np.maximum(-steps, 0), minlength=entry_count).astype(np.float32)
+        self.edge_poi = np.bincount(via_entry, weights=self.is_poi[self.via_nodes], minlength=entry_count).astype(np.int32)
+
+    def compress_chains(self):
+        """Return a graph where every chain of degree-2 nodes is one edge between its end nodes.
+
+        The node index space is kept: shape nodes simply end up with no edges of
+        their own (so they are never snapped to or searched) and are listed as via
+        nodes of the edge that replaced their chain. A chain that leads back to
+        its start node (a loop hanging off a junction) keeps its first and last
+        shape nodes as junctions, so it survives as three edges. Of parallel
+        chains between the same two nodes only the shortest is kept, as
+        ``from_edges`` does for parallel edges.
+        Foot flags are not carried over, so prune to foot-legal edges first.
+        """
+        node_count = len(self.node_ids)
+        offsets = self.offsets.tolist()
+        neighbors = self.neighbors.tolist()
+        lengths = self.lengths.tolist()
+        junction = bytearray((self.degrees() != 2).astype(np.uint8).tobytes())
+
+        while True:
+            sources, targets, totals, vias = [], [], [], []
+            visited = bytearray(node_count)
+            promote = set()
+            for u in range(node_count):
+                if not junction[u]:
+                    continue
+                for entry in range(offsets[u], offsets[u + 1]):
+                    previous, current, total, via = u, neighbors[entry], lengths[entry], []
+                    while not junction[current]:
+                        via.append(current)
+                        visited[current] = 1
+                        step = offsets[current] if neighbors[offsets[current]] != previous else offsets[current] + 1
+                        previous, current = current, neighbors[step]
+                        total += lengths[step]
+                    if current == u:
+                        # One junction inside the loop would make two parallel edges, and the shorter
+                        # would replace the other; two keep every part of it
+                        promote.update((via[0], via[-1]))
+                        continue
+                    sources.append(u)
+                    targets.append(current)
+                    totals.append(total)
+                    vias.append(via)
+            # Rings made only of degree-2 nodes have no end to start from; keep them uncompressed
+            promote.update(node for node in range(node_count) if not junction[node] and not visited[node])
+            if not promote:
+                break
+            for node in promote:
+                junction[node] = 1
+
+        u = np.array(sources, dtype=np.int64)
+        v = np.array(targets, dtype=np.int64)
+        w = np.array(totals, dtype=np.float64)
+        order = np.lexsort((w, v, u))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (u[order][1:] != u[order][:-1]) | (v[order][1:] != v[order][:-1])
+        order = order[first]
+
+        new_offsets = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(u[order], minlength=node_count), out=new_offsets[1:])
+        kept = [vias[i] for i in order.tolist()]
+        via_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum([len(via) for via in kept], out=via_offsets[1:])
+        via_nodes = np.fromiter((node for via in kept for node in via), dtype=np.int32, count=int(via_offsets[-1]))
+        return CSRGraph(
+            self.node_ids, new_offsets, v[order].astype(np.int32), w[order].astype(np.float32),
+            elevation=self.elevation, is_poi=self.is_poi, component=self.component,
+            via_offsets=via_offsets, via_nodes=via_nodes,
+        )
+
+    def connected_components(self):
+        """Component label of every node, 0 for the largest component, 1 for the next, ...
+
+        Labels are found by repeatedly hooking every component root onto the
+        smallest root among its neighbors and then compressing the pointers, so
+        each round is a few NumPy passes over the edge arrays.
+        """
+        node_count = len(self.node_ids)
+        labels = np.arange(node_count, dtype=np.int64)
+        sources, targets = self.edge_sources(), self.neighbors
+        while True:
+            hooked = labels.copy()
+            np.minimum.at(hooked, labels[sources], labels[targets])
+            while True:
+                jumped = hooked[hooked]
+                if np.array_equal(jumped, hooked):
+                    break
+                hooked = jumped
+            if np.array_equal(hooked, labels):
+                break
+            labels = hooked
+        roots, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+        rank = np.empty(len(roots), dtype=np.int32)
+        rank[np.argsort(-sizes, kind='stable')] = np.arange(len(roots), dtype=np.int32)
+        return rank[labels.ravel()]
+
+    def component_sizes(self):
+        """Node count of every component, largest first."""
+        return np.bincount(self.component)
+
+    def connected(self, u, v):
+        """Whether two node indices are in the same component, without searching."""
+        return bool(self.component[u] == self.component[v])
+
+    def has_path(self, source, target):
+        """Check whether two OSM node ids are connected."""
+        if source not in self or target not in self:
+            return False
+        return self.connected(self.index(source), self.index(target))
+
+    def dijkstra_path_length(self, source, target):
+        """Shortest distance between two OSM node ids, or infinity if they are not connected."""
+        start, goal = self.index(source), self.index(target)
+        distances = {start: 0.0}
+        open_set = [(0.0, start)]
+        while open_set:
+            distance, node = heapq.heappop(open_set)
+            if node == goal:
+                return distance
+            if distance > distances[node]:
+                continue
+            for neighbor, length in self.edges(node):
+                new_distance = distance + length
+                if new_distance < distances.get(neighbor, float('inf')):
+                    distances[neighbor] = new_distance
+                    heapq.heappush(open_set, (new_distance, neighbor))
+        return float('inf')
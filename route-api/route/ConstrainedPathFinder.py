@@ -1,22 +1,37 @@
 # route-api/route/ConstrainedPathFinder.py
 
 import heapq
+import time
+from route.heuristics import ZeroHeuristic
 
 class ConstrainedPathFinder:
-    def __init__(self, graph):
+    def __init__(self, graph, heuristic=None, time_budget=None, max_expansions=None):
         self.graph = graph
+        self.estimator = heuristic or ZeroHeuristic()
+        self.time_budget = time_budget
+        self.max_expansions = max_expansions
+        self.nodes_expanded = 0
+        self.heap_pushes = 0
+        self.truncated = False
 
     def heuristic(self, node, goal):
-        """Heuristic function for A* (can use straight-line distance as an example)."""
-        # Placeholder heuristic function, returns 0
-        return 0
+        """Heuristic function for A*: a lower bound on the distance from node to goal."""
+        return self.estimator.towards(goal)(node)
 
     def find_path_within_distance(self, start, goal, target_distance):
-        """Find a path from start to goal within target_distance ± 10% using A* with distance constraint."""
+        """Find a path from start to goal within target_distance ± 10% using A* with distance constraint.
+
+        When ``time_budget`` seconds or ``max_expansions`` pops run out, the
+        closest path found so far is returned and ``truncated`` is set.
+        """
 
         min_distance = target_distance * 0.9
         max_distance = target_distance * 1.1
 
+        # Search on dense graph indices
+        start = self.graph.index(start)
+        goal = self.graph.index(goal)
+
         # Priority queue for A* search
         open_set = []
         heapq.heappush(open_set, (0, start, 0, [start]))  # (priority, current_node, current_distance, path)
@@ -24,10 +39,20 @@ class ConstrainedPathFinder:
         # Track the closest path found within distance range
         best_path = None
         closest_distance = float('inf')
+        self.nodes_expanded = 0
+        self.heap_pushes = 0
+        self.truncated = False
+        estimate = self.estimator.towards(goal)
+        deadline = time.monotonic() + self.time_budget if self.time_budget is not None else float('inf')
+        max_expansions = self.max_expansions if self.max_expansions is not None else float('inf')
 
         while open_set:
+            if self.nodes_expanded >= max_expansions or time.monotonic() > deadline:
+                self.truncated = True
+                break
             # Pop node with lowest priority
             _, current_node, current_distance, path = heapq.heappop(open_set)
+            self.nodes_expanded += 1
 
             # Check if current path reaches the goal within distance range
             if current_node == goal:
@@ -39,18 +64,18 @@ class ConstrainedPathFinder:
                     continue
 
             # Expand neighbors
-            for neighbor in self.graph.neighbors(current_node):
-                edge_weight = self.graph[current_node][neighbor]['weight']
+            for neighbor, edge_weight in self.graph.edges(current_node):
                 new_distance = current_distance + edge_weight
 
-                # Skip this path if the new distance exceeds max_distance
-                if new_distance > max_distance:
-                    continue
-
                 # Calculate heuristic (estimate to goal) for A* priority
-                priority = new_distance + self.heuristic(neighbor, goal)
+                priority = new_distance + estimate(neighbor)
+
+                # Skip this path if it cannot reach the goal within max_distance
+                if priority > max_distance:
+                    continue
 
                 # Add neighbor to the open set with updated path and distance
                 heapq.heappush(open_set, (priority, neighbor, new_distance, path + [neighbor]))
+                self.heap_pushes += 1
 
-        return best_path if best_path is not None else None
+        return self.graph.path_ids(best_path) if best_path is not None else None
@@ -0,0 +1,223 @@
+# route-api/route/ContractionHierarchy.py
+
+import heapq
+import json
+import os
+import time
+import numpy as np
+
+
+class ContractionHierarchy:
+    """Contraction hierarchy over a CSRGraph for exact shortest distances.
+
+    Nodes are contracted one by one in ``rank`` order; whenever removing a node
+    would lengthen the shortest path between two of its remaining neighbors, a
+    shortcut edge between them is added. Every node keeps only its "upward"
+    edges (to neighbors contracted later), stored as CSR arrays indexed like
+    the graph. A query runs Dijkstra upward from both endpoints and meets at the
+    highest-ranked node of the shortest path, which only touches a few hundred
+    nodes instead of the whole disc around the source.
+    """
+
+    def __init__(self, rank, up_offsets, up_neighbors, up_lengths):
+        self.rank = rank
+        self.up_offsets = up_offsets
+        self.up_neighbors = up_neighbors
+        self.up_lengths = up_lengths
+
+    def __repr__(self):
+        return f"ContractionHierarchy with {len(self.rank):,} nodes and {len(self.up_neighbors):,} upward edges"
+
+    @classmethod
+    def build(cls, graph, settle_limit=500, hop_limit=16):
+        """Contract every node of ``graph``, cheapest first by edge difference.
+
+        Witness searches stop after ``settle_limit`` settled nodes or
+        ``hop_limit`` edges; a capped search may add a shortcut that was not
+        strictly needed, which costs space but never correctness. Priorities
+        are updated lazily: a node's priority is recomputed when it reaches
+        the top of the queue, and it goes back in if it is no longer the
+        cheapest. The shortcuts found by that check are the ones added.
+        """
+        node_count = graph.number_of_nodes()
+        # Working adjacency as dicts, filled from the CSR arrays in one pass; parallel edges keep the shortest
+        offsets, neighbor_list, length_list = graph.offsets.tolist(), graph.neighbors.tolist(), graph.lengths.tolist()
+        adjacency = [{} for _ in range(node_count)]
+        for node in range(node_count):
+            edges = adjacency[node]
+            for index in range(offsets[node], offsets[node + 1]):
+                neighbor, length = neighbor_list[index], length_list[index]
+                if neighbor != node and length < edges.get(neighbor, float('inf')):
+                    edges[neighbor] = length
+        contracted_neighbors = [0] * node_count
+        level = [0] * node_count
+        rank = np.full(node_count, -1, dtype=np.int32)
+        upward = [None] * node_count
+
+        def priority(node):
+            # Edge difference, plus terms that spread contraction evenly over the graph
+            shortcuts = cls._shortcuts(adjacency, node, settle_limit, hop_limit)
+            return 4 * (len(shortcuts) - len(adjacency[node])) + contracted_neighbors[node] + level[node], shortcuts
+
+        queue = [(priority(node)[0], node) for node in range(node_count)]
+        heapq.heapify(queue)
+        started = time.monotonic()
+        order = 0
+        while queue:
+            _, node = heapq.heappop(queue)
+            value, shortcuts = priority(node)
+            # Contracting neighbors only ever changes a node's priority; check it is still the cheapest
+            if queue and value > queue[0][0]:
+                heapq.heappush(queue, (value, node))
+                continue
+
+            neighbors = adjacency[node]
+            for source, target, length in shortcuts:
+                if length < adjacency[source].get(target, float('inf')):
+                    adjacency[source][target] = length
+                    adjacency[target][source] = length
+            for neighbor in neighbors:
+                del adjacency[neighbor][node]
+                contracted_neighbors[neighbor] += 1
+                level[neighbor] = max(level[neighbor], level[node] + 1)
+            upward[node] = neighbors
+            adjacency[node] = {}
+            rank[node] = order
+            order += 1
+            if order % 100000 == 0:
+                print(f'contracted {order:,}/{node_count:,} nodes in {time.monotonic() - started:.0f}s')
+
+        up_offsets = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum([len(edges) for edges in upward], out=up_offsets[1:])
+        up_neighbors = np.fromiter((v for edges in upward for v in edges), dtype=np.int32, count=int(up_offsets[-1]))
+        up_lengths = np.fromiter((w for edges in upward for w in edges.values()), dtype=np.float64, count=int(up_offsets[-1]))
+        return cls(rank, up_offsets, up_neighbors, up_lengths)
+
+    @staticmethod
+    def _shortcuts(adjacency, node, settle_limit, hop_limit):
+        """Shortcuts ``(u, w, length)`` needed if ``node`` were contracted now."""
+        neighbors = adjacency[node]
+        shortcuts = []
+        for source, source_length in neighbors.items():
+            # Each unordered pair is checked once, from its smaller endpoint
+            targets = {
+                target: source_length + target_length
+                for target, target_length in neighbors.items() if target > source
+            }
+            if not targets:
+                continue
+            limit = max(targets.values())
+            remaining = len(targets)
+            distances = {source: 0.0}
+            open_set = [(0.0, 0, source)]
+            settled = 0
+            while open_set and settled < settle_limit:
+                distance, hops, current = heapq.heappop(open_set)
+                if distance > limit:
+                    break
+                if distance > distances[current]:
+                    continue
+                settled += 1
+                if current in targets:
+                    remaining -= 1
+                    if not remaining:
+                        break
+                if hops == hop_limit:
+                    continue
+                for neighbor, length in adjacency[current].items():
+                    if neighbor == node:
+                        continue
+                    new_distance = distance + length
+                    if new_distance <= limit and new_distance < distances.get(neighbor, float('inf')):
+                        distances[neighbor] = new_distance
+                        heapq.heappush(open_set, (new_distance, hops + 1, neighbor))
+            for target, via_length in targets.items():
+                if distances.get(target, float('inf')) > via_length:
+                    shortcuts.append((source, target, via_length))
+        return shortcuts
+
+    def distance(self, source, target):
+        """Exact shortest distance between two node indices, or infinity if they are not connected."""
+        if source == target:
+            return 0.0
+        forward = {source: 0.0}
+        backward = {target: 0.0}
+        forward_open = [(0.0, source)]
+        backward_open = [(0.0, target)]
+        best = float('inf')
+        infinity = float('inf')
+        while forward_open or backward_open:
+            for open_set, distances, other in ((forward_open, forward, backward), (backward_open, backward, forward)):
+                if not open_set:
+                    continue
+                distance, node = heapq.heappop(open_set)
+                # Neither direction can improve on a meeting point shorter than its smallest key
+                if distance >= best:
+                    open_set.clear()
+                    continue
+                if distance > distances[node]:
+                    continue
+                if node in other:
+                    best = min(best, distance + other[node])
+                start, end = self.up_offsets[node], self.up_offsets[node + 1]
+                neighbors = self.up_neighbors[start:end].tolist()
+                lengths = self.up_lengths[start:end].tolist()
+                # Stall-on-demand: if a higher node already reached reaches this one shorter,
+                # this label is not a shortest path and its upward edges need no relaxing
+                stalled = False
+                for neighbor, length in zip(neighbors, lengths):
+                    if distances.get(neighbor, infinity) + length < distance:
+                        stalled = True
+                        break
+                if stalled:
+                    continue
+                for neighbor, length in zip(neighbors, lengths):
+                    new_distance = distance + length
+                    if new_distance < distances.get(neighbor, infinity):
+                        distances[neighbor] = new_distance
+                        heapq.heappush(open_set, (new_distance, neighbor))
+        return best
+
+    def has_path(self, source, target):
+        return self.distance(source, target) != float('inf')
+
+
+def save_hierarchy(path, graph, hierarchy, checksum):
+    """Save the hierarchy as ``<path>.npz`` with a JSON sidecar for validation."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    np.savez(
+        f'{path}.npz', rank=hierarchy.rank, up_offsets=hierarchy.up_offsets,
+        up_neighbors=hierarchy.up_neighbors, up_lengths=hierarchy.up_lengths,
+    )
+    with open(f'{path}.json', 'w') as file:
+        json.dump({
+            'checksum': checksum,
+            'node_count': graph.number_of_nodes(),
+            'upward_edge_count': len(hierarchy.up_neighbors),
+        }, file)
+
+
+def load_hierarchy(path, graph, checksum):
+    """Load a saved hierarchy, or return None if it is missing or built for other table contents."""
+    try:
+        with open(f'{path}.json') as file:
+            metadata = json.load(file)
+    except OSError:
+        return None
+    if metadata['checksum'] != checksum or metadata['node_count'] != graph.number_of_nodes():
+        print(f'contraction hierarchy in {path} does not match the graph, ignoring it')
+        return None
+    with np.load(f'{path}.npz') as arrays:
+        return ContractionHierarchy(arrays['rank'], arrays['up_offsets'], arrays['up_neighbors'], arrays['up_lengths'])
+
+
+def verify_hierarchy(graph, hierarchy, pairs=100, seed=0):
+    """Compare hierarchy distances with plain Dijkstra on random node pairs; return the mismatches."""
+    rng = np.random.default_rng(seed)
+    mismatches = []
+    for source, target in rng.integers(graph.number_of_nodes(), size=(pairs, 2)).tolist():
+        expected = graph.dijkstra_path_length(graph.node_id(source), graph.node_id(target))
+        actual = hierarchy.distance(source, target)
+        if expected != actual and not abs(expected - actual) <= 1e-6 * expected:
+            mismatches.append((graph.node_id(source), graph.node_id(target), expected, actual))
+    return mismatches
@@ -0,0 +1,159 @@
+# route-api/route/LoopGenerator.py
+
+import heapq
+import math
+import random
+import time
+from route.heuristics import ZeroHeuristic
+
+METERS_PER_DEGREE = 111320.0
+
+class LoopGenerator:
+    """Round-trip routes for requests whose start and end snap to the same node.
+
+    Each attempt picks a triangle of waypoints around the start (random bearing,
+    radius scaled to the requested distance), snaps them to the graph and
+    stitches shortest-path legs start -> w1 -> w2 -> start. Later legs pay a
+    penalty for reusing edges of earlier legs so they prefer a real loop over an
+    out-and-back. Loops are scored by how much of their length is repeated and
+    how far they are from the requested distance; near-duplicates are dropped.
+    """
+
+    def __init__(self, graph, node_store, spatial_index, heuristic=None,
+                 reuse_penalty=3.0, max_overlap=0.35, max_similarity=0.6, seed=None):
+        self.graph = graph
+        self.node_store = node_store
+        self.spatial_index = spatial_index
+        self.estimator = heuristic or ZeroHeuristic()
+        self.reuse_penalty = reuse_penalty
+        self.max_overlap = max_overlap
+        self.max_similarity = max_similarity
+        self.random = random.Random(seed)
+        self.attempts = 0
+
+    def generate(self, start, target_distance, count=5, time_budget=2.0):
+        """Return up to ``count`` distinct loops as ``(path_ids, distance)``, best first.
+
+        Loops stay within the same 0.85-1.15 window of ``target_distance`` that
+        BiDirectionalAStar uses. Sampling stops when ``count`` loops are found
+        or ``time_budget`` seconds have passed; in the latter case ``truncated``
+        is set.
+        """
+        loops = list(self._accepted_loops(start, target_distance, count * 3, time_budget))
+        # Extra samples only improve the choice; running short of ``count`` is what matters
+        self.truncated = len(loops) < count
+        # Least repeated ground first, then closest to the requested distance
+        loops.sort(key=lambda loop: (round(loop[3], 2), abs(loop[1] - target_distance)))
+        return [(self.graph.path_ids(path), distance) for path, distance, _, _ in loops[:count]]
+
+    def iter_loops(self, start, target_distance, count=5, time_budget=2.0):
+        """Yield loops as ``(path_ids, distance)`` in the order they are found, up to ``count``."""
+        for path, distance, _, _ in self._accepted_loops(start, target_distance, count, time_budget):
+            yield self.graph.path_ids(path), distance
+
+    def _accepted_loops(self, start, target_distance, limit, time_budget):
+        """Sample loops and yield ``(path, distance, edges, overlap)`` for each one that is kept."""
+        start = self.graph.index(start)
+        min_distance = target_distance * 0.85
+        max_distance = target_distance * 1.15
+        deadline = time.monotonic() + time_budget
+
+        # Straight-line triangle perimeter is 3r; streets add roughly a quarter on top
+        radius = target_distance / (3 * 1.25)
+        loops = []
+        self.attempts = 0
+        self.truncated = False
+        while len(loops) < limit and time.monotonic() < deadline:
+            self.attempts += 1
+            waypoints = self._sample_waypoints(start, radius)
+            if waypoints is None:
+                continue
+            loop = self._stitch([start, *waypoints, start], max_distance)
+            if loop is None:
+                continue
+            path, distance, edges, overlap = loop
+
+            # Steer the radius towards the requested distance for the next samples
+            radius *= min(max(target_distance / distance, 0.5), 2.0) ** 0.5
+            if not min_distance <= distance <= max_distance or overlap > self.max_overlap:
+                continue
+            if any(self._similarity(edges, other[2]) > self.max_similarity for other in loops):
+                continue
+            loops.append(loop)
+            yield loop
+        # The time budget ran out before enough loops were found
+        self.truncated = len(loops) < limit
+
+    def _sample_waypoints(self, start, radius):
+        """Two waypoints 60 degrees apart at ``radius`` meters, snapped to graph nodes."""
+        longitude = float(self.node_store.longitude[start])
+        latitude = float(self.node_store.latitude[start])
+        bearing = self.random.uniform(0, 2 * math.pi)
+        waypoints = []
+        for angle in (bearing, bearing + math.pi / 3):
+            distance = radius * self.random.uniform(0.8, 1.2)
+            point_lat = latitude + distance * math.cos(angle) / METERS_PER_DEGREE
+            point_lon = longitude + distance * math.sin(angle) / (METERS_PER_DEGREE * math.cos(math.radians(latitude)))
+            node = self.spatial_index.nearest(point_lon, point_lat, max_distance=radius / 2)
+            if node is None or node == start or node in waypoints:
+                return None
+            waypoints.append(node)
+        return waypoints
+
+    def _stitch(self, stops, max_distance):
+        """Join consecutive stops with penalized shortest legs; None if a leg fails."""
+        path = [stops[0]]
+        used = {}
+        distance = 0.0
+        for source, target in zip(stops, stops[1:]):
+            leg = self._leg(source, target, used, max_distance - distance)
+            if leg is None:
+                return None
+            leg_path, leg_distance = leg
+            for u, v in zip(leg_path, leg_path[1:]):
+                key = (u, v) if u < v else (v, u)
+                used[key] = used.get(key, 0) + 1
+            path.extend(leg_path[1:])
+            distance += leg_distance
+
+        repeated = sum(
+            self.graph.edge_length(u, v) * (times - 1)
+            for (u, v), times in used.items() if times > 1
+        )
+        return path, distance, set(used), repeated / distance if distance else 1.0
+
+    def _leg(self, source, target, used, budget):
+        """A* from source to target where edges in ``used`` cost ``reuse_penalty`` times more."""
+        estimate = self.estimator.towards(target)
+        costs = {source: 0.0}
+        lengths = {source: 0.0}
+        parents = {source: -1}
+        open_set = [(estimate(source), 0.0, source)]
+        while open_set:
+            _, cost, node = heapq.heappop(open_set)
+            if node == target:
+                path = []
+                while node >= 0:
+                    path.append(node)
+                    node = parents[node]
+                return path[::-1], lengths[target]
+            if cost > costs[node]:
+                continue
+            for neighbor, length in self.graph.edges(node):
+                new_length = lengths[node] + length
+                bound = estimate(neighbor)
+                if new_length + bound > budget:
+                    continue
+                key = (node, neighbor) if node < neighbor else (neighbor, node)
+                new_cost = cost + (length * self.reuse_penalty if key in used else length)
+                if new_cost < costs.get(neighbor, float('inf')):
+                    costs[neighbor] = new_cost
+                    lengths[neighbor] = new_length
+                    parents[neighbor] = node
+                    heapq.heappush(open_set, (new_cost + bound, new_cost, neighbor))
+        return None
+
+    @staticmethod
+    def _similarity(edges, other_edges):
+        """Jaccard similarity of two loops' edge sets."""
+        return len(edges & other_edges) / len(edges | other_edges)
@@ -0,0 +1,226 @@
+# route-api/route/ParetoRouteFinder.py
+
+import heapq
+import time
+from array import array
+from route.heuristics import ZeroHeuristic
+
+# Width of the per-label path bitmask; wider masks collide less on long routes
+TRAIL_BITS = 1024
+
+
+def _trail_bit(node):
+    return 1 << (node * 2654435761 >> 7) % TRAIL_BITS
+
+class ParetoRouteFinder:
+    """Multi-criteria label-setting search over distance, elevation change and POIs.
+
+    A label is one partial route: (node, parent label, distance, cumulative
+    elevation change, POI count), read from the graph's per-edge profiles as it
+    is extended. Labels at the same node are compared when their distances fall
+    in the same bucket (``bucket_fraction`` of the target distance), or when the
+    other one is shorter by less than a bucket. A label that is no better on
+    either elevation or POIs than another one there is dropped as soon as it is
+    created; elevation changes within ``elevation_tolerance`` meters count as
+    equal. Elevation change counts climb plus descent, the quantity the route
+    filter checks against the elevation range, so labels over the range's upper
+    bound are pruned too. Routes that reach the goal inside the 0.85-1.15
+    distance window form the Pareto front that is returned.
+
+    Routes are kept simple, so no POI is counted twice. Each label carries a
+    bitmask of hashed node ids on its path; only when a neighbor's bit is set is
+    the path walked to tell a real revisit from a collision.
+
+    ``max_labels``, ``max_expansions`` and ``time_budget`` bound the work; when
+    any of them runs out the front found so far is returned and ``truncated``
+    is set.
+    """
+
+    def __init__(self, graph, node_store, elevation_pref="max", poi_pref="max", heuristic=None,
+                 bucket_fraction=0.1, elevation_tolerance=5.0, max_labels=200000, time_budget=2.0, max_expansions=None):
+        self.graph = graph
+        self.node_store = node_store
+        self.elevation_pref = elevation_pref
+        self.poi_pref = poi_pref
+        self.estimator = heuristic or ZeroHeuristic()
+        self.bucket_fraction = bucket_fraction
+        self.elevation_tolerance = elevation_tolerance
+        self.max_labels = max_labels
+        self.time_budget = time_budget
+        self.max_expansions = max_expansions
+        self.labels_created = 0
+        self.nodes_expanded = 0
+        self.truncated = False
+
+    def _better_or_equal(self, a_change, a_poi, b_change, b_poi):
+        """True if route A is at least as good as route B on both elevation and POIs."""
+        if self.elevation_pref == "min":
+            elevation_ok = a_change <= b_change
+        else:
+            elevation_ok = a_change >= b_change
+        poi_ok = a_poi <= b_poi if self.poi_pref == "min" else a_poi >= b_poi
+        return elevation_ok and poi_ok
+
+    def find_pareto_routes(self, start, goal, target_distance, max_elevation_change=float('inf')):
+        """Return the Pareto front as ``[(path_ids, distance), ...]``, most POIs first."""
+        min_distance = target_distance * 0.85
+        max_distance = target_distance * 1.15
+        bucket_size = max(target_distance * self.bucket_fraction, 1.0)
+        deadline = time.monotonic() + self.time_budget
+        max_expansions = self.max_expansions if self.max_expansions is not None else float('inf')
+
+        start = self.graph.index(start)
+        goal = self.graph.index(goal)
+        is_poi = self.node_store.is_poi
+        estimate = self.estimator.towards(goal)
+        tolerance = self.elevation_tolerance
+        # Dominance compares gains: the objectives signed so that larger is better
+        elevation_sign = 1.0 if self.elevation_pref == "max" else -1.0
+        poi_sign = 1 if self.poi_pref == "max" else -1
+
+        # Label columns; a label's path is rebuilt by following parents
+        label_node = array('q', [start])
+        label_parent = array('q', [-1])
+        label_distance = array('d', [0.0])
+        label_change = array('d', [0.0])
+        label_poi = array('q', [int(is_poi[start])])
+        change_gain = array('d', [0.0])
+        poi_gain = array('q', [poi_sign * label_poi[0]])
+        # Path bitmask of every label still waiting to be expanded; 0 once it is expanded or dropped
+        label_trail = [_trail_bit(start)]
+        alive = bytearray(b'\x01')
+        # (node, distance bucket) -> labels that are not dominated there
+        fronts = {(start, 0): [0]}
+        open_set = [(target_distance - estimate(start), 0.0, 0)]
+        results = []
+        # Nodes are reached by many labels, so their edges and bounds are read once per search
+        node_edges = {}
+        node_bounds = {}
+        self.labels_created = 1
+        self.nodes_expanded = 0
+        self.truncated = False
+
+        while open_set:
+            if (self.labels_created >= self.max_labels or self.nodes_expanded >= max_expansions
+                    or time.monotonic() > deadline):
+                self.truncated = True
+                break
+            _, _, label = heapq.heappop(open_set)
+            if not alive[label]:
+                continue
+            self.nodes_expanded += 1
+            node = label_node[label]
+            distance, change, pois = label_distance[label], label_change[label], label_poi[label]
+            trail, label_trail[label] = label_trail[label], 0
+
+            if node == goal and distance >= min_distance:
+                results.append(label)
+                continue
+
+            edges = node_edges.get(node)
+            if edges is None:
+                # Compressed edges carry the climb and POIs of the shape nodes they replaced
+                edges = node_edges[node] = [
+                    (neighbor, length, edge_change, edge_poi + int(is_poi[neighbor]), _trail_bit(neighbor))
+                    for neighbor, length, edge_change, edge_poi in self.graph.edge_profiles(node)
+                ]
+            parent = label_parent[label]
+            previous = label_node[parent] if parent >= 0 else -1
+            on_path = None
+            for neighbor, length, edge_change, edge_poi, bit in edges:
+                # Revisiting a node would count its POI (and the climb around it) again
+                if neighbor == previous:
+                    continue
+                if trail & bit:
+                    if on_path is None:
+                        on_path = set()
+                        step = label
+                        while step >= 0:
+                            on_path.add(label_node[step])
+                            step = label_parent[step]
+                    if neighbor in on_path:
+                        continue
+                new_distance = distance + length
+                bound = node_bounds.get(neighbor)
+                if bound is None:
+                    bound = node_bounds[neighbor] = estimate(neighbor)
+                lower_bound = new_distance + bound
+                if lower_bound > max_distance:
+                    continue
+                new_change = change + edge_change
+                if new_change > max_elevation_change:
+                    continue
+                new_poi = pois + edge_poi
+                new_change_gain = elevation_sign * new_change
+                new_poi_gain = poi_sign * new_poi
+
+                bucket = int(new_distance // bucket_size)
+                # A label less than a bucket shorter stands in for this one as well as one in its own bucket
+                shorter = fronts.get((neighbor, bucket - 1), ())
+                if any(
+                    label_distance[other] + bucket_size >= new_distance
+                    and change_gain[other] + tolerance >= new_change_gain and poi_gain[other] >= new_poi_gain
+                    for other in shorter
+                ):
+                    continue
+                key = (neighbor, bucket)
+                front = fronts.get(key)
+                if front is not None:
+                    if any(
+                        change_gain[other] + tolerance >= new_change_gain and poi_gain[other] >= new_poi_gain
+                        for other in front
+                    ):
+                        continue
+                    # Drop the labels the new one dominates
+                    survivors = []
+                    for other in front:
+                        if new_change_gain >= change_gain[other] and new_poi_gain >= poi_gain[other]:
+                            alive[other] = 0
+                            label_trail[other] = 0
+                        else:
+                            survivors.append(other)
+                    front = survivors
+                else:
+                    front = []
+
+                new_label = len(label_node)
+                label_node.append(neighbor)
+                label_parent.append(label)
+                label_distance.append(new_distance)
+                label_change.append(new_change)
+                label_poi.append(new_poi)
+                change_gain.append(new_change_gain)
+                poi_gain.append(new_poi_gain)
+                label_trail.append(trail | bit)
+                alive.append(1)
+                front.append(new_label)
+                fronts[key] = front
+                self.labels_created += 1
+                # Expand the labels closest to finishing at the target distance first, so
+                # complete routes appear early instead of after the whole disc is labelled
+                heapq.heappush(open_set, (abs(target_distance - lower_bound), -new_distance, new_label))
+
+        # Keep one route per (elevation change, POI count) and drop the dominated ones
+        distinct = {}
+        for label in results:
+            distinct.setdefault((round(label_change[label], 1), label_poi[label]), label)
+        candidates = list(distinct.values())
+        front = [
+            label for label in candidates
+            if not any(
+                other != label
+                and self._better_or_equal(label_change[other], label_poi[other], label_change[label], label_poi[label])
+                for other in candidates
+            )
+        ]
+        front.sort(key=lambda label: (-label_poi[label], label_distance[label]))
+
+        routes = []
+        for label in front:
+            path = []
+            step = label
+            while step >= 0:
+                path.append(label_node[step])
+                step = label_parent[step]
+            routes.append((self.graph.path_ids(path[::-1]), label_distance[label]))
+        return routes
@@ -0,0 +1,163 @@
+# route-api/route/SpatialIndex.py
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8  # meters
+
+
+class SpatialIndex:
+    """Uniform grid index over node coordinates for nearest-node snapping.
+
+    Coordinates are projected to meters with an equirectangular projection
+    around the mean latitude, which is accurate to well under a meter over the
+    few hundred meters a snap query looks at. Nodes are sorted by grid cell,
+    so a cell lookup is a binary search over the occupied cell keys.
+    ``mask`` restricts the index to a subset of nodes (e.g. nodes on
+    foot-legal edges); query results are always indices into the full arrays.
+    With per-node ``component`` labels, single-point queries can be limited
+    to one connected component.
+    """
+
+    def __init__(self, longitude, latitude, mask=None, cell_size=250.0, component=None):
+        longitude = np.asarray(longitude, dtype=np.float64)
+        latitude = np.asarray(latitude, dtype=np.float64)
+        # Nodes without coordinates are stored as 0/0 and never snapped to
+        valid = (longitude != 0) | (latitude != 0)
+        if mask is not None:
+            valid &= np.asarray(mask, dtype=bool)
+        self.indices = np.flatnonzero(valid)
+        self.cell_size = cell_size
+        self.reference_cos = np.cos(np.radians(latitude[self.indices].mean())) if len(self.indices) else 1.0
+
+        x, y = self.project(longitude[self.indices], latitude[self.indices])
+        keys = self._cell_keys(np.floor(x / cell_size), np.floor(y / cell_size))
+        order = np.argsort(keys, kind='stable')
+        self.indices = self.indices[order]
+        self.x, self.y = x[order], y[order]
+        self.component = np.asarray(component)[self.indices] if component is not None else None
+        keys = keys[order]
+        self.cell_keys, self.cell_starts = np.unique(keys, return_index=True)
+        self.cell_ends = np.append(self.cell_starts[1:], len(keys))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def project(self, longitude, latitude):
+        """Project lon/lat degrees to local x/y meters."""
+        x = np.radians(longitude) * EARTH_RADIUS * self.reference_cos
+        y = np.radians(latitude) * EARTH_RADIUS
+        return x, y
+
+    @staticmethod
+    def _cell_keys(cx, cy):
+        return cx.astype(np.int64) * (1 << 32) + cy.astype(np.int64)
+
+    def _block_too_large(self, radius):
+        return (2 * radius + 1) ** 2 > max(len(self.cell_keys), 9)
+
+    def _gather(self, cx, cy, radius):
+        """Candidate positions from the (2r+1)^2 block of cells around each query cell.
+
+        Returns ``(query, position)`` pairs: the query row each candidate belongs to
+        and its position in the sorted node arrays.
+        """
+        steps = np.arange(-radius, radius + 1)
+        dx, dy = np.meshgrid(steps, steps)
+        keys = self._cell_keys(cx[:, None] + dx.ravel(), cy[:, None] + dy.ravel())
+        slots = np.searchsorted(self.cell_keys, keys.ravel())
+        slots = np.minimum(slots, len(self.cell_keys) - 1)
+        hit = self.cell_keys[slots] == keys.ravel()
+        query = np.repeat(np.arange(len(cx)), keys.shape[1])[hit]
+        starts, ends = self.cell_starts[slots[hit]], self.cell_ends[slots[hit]]
+        counts = ends - starts
+        total = int(counts.sum())
+        # Expand every [start, end) range into consecutive positions
+        positions = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        return np.repeat(query, counts), positions
+
+    def nearest_batch(self, longitude, latitude, max_distance=None):
+        """Snap many points at once.
+
+        Returns ``(indices, distances)``; points with no node within
+        ``max_distance`` meters (or an empty index) get index -1 and distance inf.
+        """
+        px, py = self.project(np.atleast_1d(np.asarray(longitude, dtype=np.float64)),
+                              np.atleast_1d(np.asarray(latitude, dtype=np.float64)))
+        best_index = np.full(len(px), -1, dtype=np.int64)
+        best_distance = np.full(len(px), np.inf)
+        if len(self.indices) == 0:
+            return best_index, best_distance
+
+        cx, cy = np.floor(px / self.cell_size), np.floor(py / self.cell_size)
+        pending = np.arange(len(px))
+        radius = 1
+        while len(pending):
+            if self._block_too_large(radius):
+                # Far from every node: a scan is cheaper than visiting empty cells
+                for row in pending.tolist():
+                    distance = np.hypot(self.x - px[row], self.y - py[row])
+                    closest = int(np.argmin(distance))
+                    best_index[row] = self.indices[closest]
+                    best_distance[row] = distance[closest]
+                break
+            query, positions = self._gather(cx[pending], cy[pending], radius)
+            if len(positions):
+                distance = np.hypot(self.x[positions] - px[pending][query], self.y[positions] - py[pending][query])
+                order = np.lexsort((distance, query))
+                first = np.ones(len(order), dtype=bool)
+                first[1:] = query[order][1:] != query[order][:-1]
+                rows, closest = query[order][first], order[first]
+                best_index[pending[rows]] = self.indices[positions[closest]]
+                best_distance[pending[rows]] = distance[closest]
+
+            # Anything outside the searched block is at least radius * cell_size away
+            reach = radius * self.cell_size
+            done = best_distance[pending] <= reach
+            if max_distance is not None:
+                done |= reach >= max_distance
+            pending = pending[~done]
+            radius *= 2
+
+        if max_distance is not None:
+            too_far = best_distance > max_distance
+            best_index[too_far] = -1
+            best_distance[too_far] = np.inf
+        return best_index, best_distance
+
+    def nearest(self, longitude, latitude, max_distance=None, component=None):
+        """Index of the node closest to a point, or None if there is none within ``max_distance``."""
+        closest = self.k_nearest(longitude, latitude, 1, max_distance, component)
+        return closest[0][0] if closest else None
+
+    def k_nearest(self, longitude, latitude, k, max_distance=None, component=None):
+        """Up to ``k`` ``(index, distance)`` pairs ordered by distance from the point.
+
+        ``component`` only considers nodes with that component label.
+        """
+        if len(self.indices) == 0 or k <= 0:
+            return []
+        px, py = self.project(np.array([longitude], dtype=np.float64), np.array([latitude], dtype=np.float64))
+        cx, cy = np.floor(px / self.cell_size), np.floor(py / self.cell_size)
+        radius = 1
+        while True:
+            if self._block_too_large(radius):
+                positions = np.arange(len(self.indices))
+                if component is not None:
+                    positions = positions[self.component == component]
+                distance = np.hypot(self.x[positions] - px[0], self.y[positions] - py[0])
+                order = np.argsort(distance, kind='stable')[:k]
+                break
+            _, positions = self._gather(cx, cy, radius)
+            exhausted = len(positions) == len(self.indices)
+            if component is not None:
+                positions = positions[self.component[positions] == component]
+            distance = np.hypot(self.x[positions] - px[0], self.y[positions] - py[0])
+            order = np.argsort(distance, kind='stable')[:k]
+            reach = radius * self.cell_size
+            enough = len(order) == k and distance[order[-1]] <= reach
+            if enough or exhausted or (max_distance is not None and reach >= max_distance):
+                break
+            radius *= 2
+        if max_distance is not None:
+            order = order[distance[order] <= max_distance]
+        return list(zip(self.indices[positions[order]].tolist(), distance[order].tolist()))
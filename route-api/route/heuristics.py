@@ -0,0 +1,156 @@
+# route-api/route/heuristics.py
+"""Pluggable lower bounds on the remaining distance for the A* finders.
+
+A heuristic is bound to a search target once with ``towards(target)``, which
+returns a plain ``estimate(node)`` function; the finders call it for every
+relaxed edge, so anything target-dependent is computed up front. All bounds
+are admissible (never larger than the true network distance), which lets the
+finders prune any label whose distance plus bound exceeds ``max_distance``.
+"""
+
+import heapq
+import json
+import math
+import os
+import numpy as np
+
+EARTH_RADIUS = 6371008.8  # meters
+# Shave a little off every bound so float rounding (and float32 landmark
+# distances) can never make it larger than the true network distance
+BOUND_SLACK = 0.999
+
+
+class ZeroHeuristic:
+    """No guidance: the finders behave like plain Dijkstra."""
+
+    def towards(self, target):
+        return lambda node: 0.0
+
+
+class HaversineHeuristic:
+    """Great-circle distance computed from the node coordinate columns."""
+
+    def __init__(self, longitude, latitude):
+        self.longitude = np.radians(np.asarray(longitude, dtype=np.float64))
+        self.latitude = np.radians(np.asarray(latitude, dtype=np.float64))
+        self.cos_latitude = np.cos(self.latitude)
+
+    def towards(self, target):
+        longitude, latitude, cos_latitude = self.longitude, self.latitude, self.cos_latitude
+        target_lon, target_lat = float(longitude[target]), float(latitude[target])
+        target_cos = float(cos_latitude[target])
+        scale = 2 * EARTH_RADIUS * BOUND_SLACK
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+
+        def estimate(node):
+            half_dlat = (float(latitude[node]) - target_lat) / 2
+            half_dlon = (float(longitude[node]) - target_lon) / 2
+            a = sin(half_dlat) ** 2 + float(cos_latitude[node]) * target_cos * sin(half_dlon) ** 2
+            return scale * asin(sqrt(min(a, 1.0)))
+        return estimate
+
+
+class LandmarkHeuristic:
+    """ALT bound from precomputed landmark distances, combined with a fallback bound.
+
+    ``distances`` has one row per node and one column per landmark. On an
+    undirected graph the triangle inequality gives
+    ``d(n, t) >= |d(L, t) - d(L, n)|`` for every landmark L.
+    """
+
+    def __init__(self, distances, landmarks, fallback=None):
+        self.distances = distances
+        self.landmarks = landmarks
+        self.fallback = fallback or ZeroHeuristic()
+
+    def towards(self, target):
+        distances = self.distances
+        target_row = np.asarray(distances[target], dtype=np.float64)
+        fallback = self.fallback.towards(target)
+        fmax = np.fmax.reduce
+        # A node is relaxed once per incident edge; compute its bound only once
+        bounds = {}
+
+        def estimate(node):
+            bound = bounds.get(node)
+            if bound is None:
+                # fmax skips the NaN from landmarks that reach neither node
+                bound = float(fmax(np.abs(distances[node] - target_row))) * BOUND_SLACK
+                if bound != bound:
+                    bound = 0.0
+                bound = bounds[node] = max(bound, fallback(node))
+            return bound
+        return estimate
+
+
+def single_source_distances(graph, source):
+    """Network distance from one node index to every node (inf when unreachable)."""
+    distances = np.full(graph.number_of_nodes(), np.inf, dtype=np.float64)
+    distances[source] = 0.0
+    done = np.zeros(graph.number_of_nodes(), dtype=bool)
+    offsets, neighbors, lengths = graph.offsets, graph.neighbors, graph.lengths
+    open_set = [(0.0, source)]
+    while open_set:
+        distance, node = heapq.heappop(open_set)
+        if done[node]:
+            continue
+        done[node] = True
+        start, end = offsets[node], offsets[node + 1]
+        for neighbor, length in zip(neighbors[start:end].tolist(), lengths[start:end].tolist()):
+            new_distance = distance + length
+            if new_distance < distances[neighbor]:
+                distances[neighbor] = new_distance
+                heapq.heappush(open_set, (new_distance, neighbor))
+    return distances
+
+
+def select_landmarks(graph, count, seed=0):
+    """Pick landmarks by farthest-point selection and return ``(landmarks, distances)``.
+
+    Landmarks are spread over the largest reachable area: each new landmark is the
+    node farthest (by network distance) from all landmarks chosen so far.
+    """
+    rng = np.random.default_rng(seed)
+    node_count = graph.number_of_nodes()
+    distances = np.empty((node_count, count), dtype=np.float32)
+
+    # Start from the node farthest from a random node in the graph
+    probe = single_source_distances(graph, int(rng.integers(node_count)))
+    current = int(np.argmax(np.where(np.isfinite(probe), probe, -1)))
+    closest = np.full(node_count, np.inf)
+    landmarks = []
+    for column in range(count):
+        landmarks.append(current)
+        row = single_source_distances(graph, current)
+        distances[:, column] = row
+        closest = np.minimum(closest, row)
+        current = int(np.argmax(np.where(np.isfinite(closest), closest, -1)))
+        print(f'landmark {column + 1}/{count}: node {graph.node_id(landmarks[-1])}')
+    return np.array(landmarks, dtype=np.int64), distances
+
+
+def save_landmarks(path, graph, landmarks, distances, checksum):
+    """Save landmark distances as ``<path>.npy`` with a JSON sidecar for validation."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    np.save(f'{path}.npy', distances)
+    with open(f'{path}.json', 'w') as file:
+        json.dump({
+            'checksum': checksum,
+            'node_count': graph.number_of_nodes(),
+            'landmarks': graph.node_ids[landmarks].tolist(),
+        }, file)
+
+
+def load_landmarks(path, graph, checksum, fallback=None):
+    """Memory-map saved landmark distances, or return None if they are missing or out of date."""
+    try:
+        with open(f'{path}.json') as file:
+            metadata = json.load(file)
+    except OSError:
+        return None
+    if metadata['checksum'] != checksum or metadata['node_count'] != graph.number_of_nodes():
+        print(f'landmarks in {path} do not match the graph, ignoring them')
+        return None
+    distances = np.load(f'{path}.npy', mmap_mode='r')
+    landmarks = np.array([graph.index(node_id) for node_id in metadata['landmarks']], dtype=np.int64)
+    return LandmarkHeuristic(distances, landmarks, fallback)
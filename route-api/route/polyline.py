@@ -0,0 +1,74 @@
+# route-api/route/polyline.py
+"""Encoded polyline format (the one used by Google Maps and most map clients).
+
+Every value is rounded to ``precision`` decimals, delta-coded against the
+previous one, zigzag-mapped to an unsigned int and written as 5-bit groups
+offset into printable ASCII. Coordinates are encoded as interleaved
+latitude/longitude pairs; node ids use the same scheme on a single column.
+"""
+
+import numpy as np
+
+
+def encode_values(values):
+    """Encode a 1-D sequence of signed integer deltas as polyline characters."""
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0:
+        return ''
+    unsigned = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+    # Split every value into 5-bit groups, least significant first
+    columns = max((int(unsigned.max()).bit_length() + 4) // 5, 1)
+    groups = np.empty((len(unsigned), columns), dtype=np.uint8)
+    remaining = unsigned.copy()
+    for column in range(columns):
+        groups[:, column] = (remaining & np.uint64(0x1f)).astype(np.uint8)
+        remaining >>= np.uint64(5)
+    # Groups after the most significant non-zero one are not written
+    nonzero = groups != 0
+    group_count = np.where(nonzero.any(axis=1), columns - np.argmax(nonzero[:, ::-1], axis=1), 1)
+
+    used = np.arange(columns) < group_count[:, None]
+    more = np.arange(columns) < (group_count - 1)[:, None]
+    characters = groups + np.where(more, 0x20, 0).astype(np.uint8) + 63
+    return characters[used].tobytes().decode('ascii')
+
+
+def decode_values(text):
+    """Inverse of ``encode_values``: the list of signed integers in an encoded string."""
+    values, value, shift = [], 0, 0
+    for character in text.encode('ascii'):
+        chunk = character - 63
+        value |= (chunk & 0x1f) << shift
+        shift += 5
+        if chunk < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    return values
+
+
+def encode_polyline(latitude, longitude, precision=5):
+    """Encode a path's coordinates (degrees) with ``precision`` decimal places."""
+    scale = 10 ** precision
+    points = np.column_stack([
+        np.round(np.asarray(latitude, dtype=np.float64) * scale),
+        np.round(np.asarray(longitude, dtype=np.float64) * scale),
+    ]).astype(np.int64)
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    return encode_values(deltas.ravel())
+
+
+def decode_polyline(text, precision=5):
+    """List of ``(latitude, longitude)`` pairs in an encoded polyline."""
+    points = np.cumsum(np.array(decode_values(text), dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return [tuple(point) for point in points.tolist()]
+
+
+def encode_ids(node_ids):
+    """Delta-code a sequence of node ids; consecutive OSM ids along a way are often close."""
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    return encode_values(np.diff(node_ids, prepend=np.int64(0)))
+
+
+def decode_ids(text):
+    return np.cumsum(np.array(decode_values(text), dtype=np.int64)).tolist()
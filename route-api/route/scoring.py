@@ -0,0 +1,122 @@
+# route-api/route/scoring.py
+"""Vectorized scoring, filtering and ranking of candidate routes.
+
+Candidates are packed into one flat array of node indices plus offsets, so the
+per-route metrics are computed with a handful of NumPy reductions instead of a
+Python loop over every step of every path.
+"""
+
+import numpy as np
+
+
+class PackedPaths:
+    """Candidate routes as flat node indices: route ``i`` is ``indices[offsets[i]:offsets[i + 1]]``."""
+
+    def __init__(self, indices, offsets, distances):
+        self.indices = indices
+        self.offsets = offsets
+        self.distances = distances
+
+    def __len__(self):
+        return len(self.distances)
+
+    def path(self, i):
+        return self.indices[self.offsets[i]:self.offsets[i + 1]]
+
+    def path_of_node(self):
+        """Route number of every entry in ``indices``."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+
+class RouteScores:
+    """Per-route metrics, one array entry per packed route."""
+
+    def __init__(self, distance, elevation_gain, elevation_loss, poi_count, distinct_poi_count):
+        self.distance = distance
+        self.elevation_gain = elevation_gain
+        self.elevation_loss = elevation_loss
+        self.poi_count = poi_count
+        self.distinct_poi_count = distinct_poi_count
+
+    @property
+    def elevation_change(self):
+        """Total absolute elevation change (climb plus descent)."""
+        return self.elevation_gain + self.elevation_loss
+
+
+def pack_paths(node_store, paths):
+    """Pack ``(path_ids, distance)`` candidates with a single id-to-index lookup."""
+    lengths = np.fromiter((len(path) for path, _ in paths), dtype=np.int64, count=len(paths))
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat_ids = np.fromiter((node_id for path, _ in paths for node_id in path), dtype=np.int64, count=int(offsets[-1]))
+    distances = np.fromiter((distance for _, distance in paths), dtype=np.float64, count=len(paths))
+    return PackedPaths(node_store.indices(flat_ids), offsets, distances)
+
+
+def score_paths(packed, elevation, is_poi):
+    """Elevation gain/loss, POI counts and distance for every packed route in one pass."""
+    route_count = len(packed)
+    path_of_node = packed.path_of_node()
+
+    # Steps between consecutive nodes, dropping the ones that cross from one route into the next
+    heights = elevation[packed.indices].astype(np.float64)
+    steps = np.diff(heights)
+    within = path_of_node[1:] == path_of_node[:-1]
+    steps, step_path = steps[within], path_of_node[1:][within]
+    gain = np.bincount(step_path, weights=np.maximum(steps, 0), minlength=route_count)
+    loss = np.bincount(step_path, weights=np.maximum(-steps, 0), minlength=route_count)
+
+    # A route's POIs are counted at every node but its last, as the route filter always has
+    poi = is_poi[packed.indices]
+    not_last = np.ones(len(packed.indices), dtype=bool)
+    not_last[packed.offsets[1:][np.diff(packed.offsets) > 0] - 1] = False
+    poi &= not_last
+    poi_count = np.bincount(path_of_node[poi], minlength=route_count)
+
+    # A POI passed more than once (a loop through it) counts once towards poi_min
+    poi_pairs = np.unique(path_of_node[poi] * (int(packed.indices.max(initial=0)) + 1) + packed.indices[poi])
+    distinct = np.bincount(poi_pairs // (int(packed.indices.max(initial=0)) + 1), minlength=route_count)
+
+    return RouteScores(packed.distances, gain, loss, poi_count, distinct)
+
+
+def parse_elevation_range(elevation_range):
+    """``"min-max"`` in meters; anything else (e.g. ``"1000+"``) means 1000 m or more."""
+    if elevation_range and '-' in elevation_range:
+        low, high = elevation_range.split('-', 1)
+        return float(low), float(high)
+    return 1000.0, float('inf')
+
+
+def route_keys(scores, priority_factor, elevation_range, poi_min):
+    """``(passes, key)`` per route: whether it passes the range filter, and its sort key (smaller ranks first).
+
+    With ``priority_factor == 'elevation'`` routes must fall inside the elevation
+    range and are keyed by how close their POI count is to ``poi_min``; with
+    ``'poi'`` they need at least ``poi_min`` POIs and are keyed by how close
+    their elevation change is to the middle of the range. POIs are counted
+    once each, however often a route passes them.
+    """
+    min_elev, max_elev = parse_elevation_range(elevation_range)
+    elevation_change = scores.elevation_change
+    if priority_factor == 'elevation':
+        passes = (min_elev <= elevation_change) & (elevation_change <= max_elev)
+        key = np.abs(scores.distinct_poi_count - poi_min).astype(np.float64)
+    elif priority_factor == 'poi':
+        passes = scores.distinct_poi_count >= poi_min
+        key = np.abs(elevation_change - (min_elev + max_elev) / 2)
+    else:
+        passes = np.zeros(len(scores.distance), dtype=bool)
+        key = np.zeros(len(scores.distance))
+    return passes, key
+
+
+def rank_paths(scores, priority_factor, elevation_range, poi_min):
+    """Indices of the routes that pass the range filter, in the order they should be returned.
+
+    Ordering follows ``route_keys``; ties keep search order.
+    """
+    passes, key = route_keys(scores, priority_factor, elevation_range, poi_min)
+    keep = np.flatnonzero(passes)
+    return keep[np.argsort(key[keep], kind='stable')]
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Requested distances within the same bucket share cached results
+distance_bucket_meters = float(os.getenv('ROUTE_CACHE_DISTANCE_BUCKET', '100'))
+
+class RedisBackend:
+    """Shared second-level cache so every worker benefits from each other's hits.
+
+    Entries are namespaced by graph version and expire through Redis TTLs, so a
+    new snapshot simply stops matching the old keys.
+    """
+
+    def __init__(self, url, ttl):
+        import redis  # Optional dependency, only needed when ROUTE_CACHE_REDIS_URL is set
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, body):
+        self.client.set(key, body, ex=int(self.ttl))
+
+
+class RouteCache:
+    """LRU + TTL cache of serialized /route responses, bounded by total bytes.
+
+    Keys combine the graph version with the snapped source/target node ids and
+    the request preferences. When the graph version changes (new snapshot or
+    node attribute refresh) every local entry is dropped.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, ttl=600, backend=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = backend
+        self.entries = OrderedDict()  # key -> (expires_at, body)
+        self.size = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.backend_hits = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def make_key(self, source, target, input_distance, elevation_range, poi_min, priority_factor, search='bidir', geometry='coordinates'):
+        bucket = int(round(input_distance / distance_bucket_meters))
+        return f'route:{self.version}:{source}:{target}:{bucket}:{elevation_range}:{poi_min}:{priority_factor}:{search}:{geometry}'
+
+    def set_version(self, version):
+        """Switch to a new graph version, dropping everything cached for the old one."""
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.size = 0
+                self.version = version
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, body = entry
+                if expires_at > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return body
+                self._remove(key)
+        if self.backend is not None:
+            try:
+                body = self.backend.get(key)
+            except Exception as e:
+                print(f'route cache backend error: {e}')
+                body = None
+            if body is not None:
+                with self.lock:
+                    self.backend_hits += 1
+                    self.hits += 1
+                    self._store(key, body, now)
+                return body
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, body):
+        with self.lock:
+            self._store(key, body, time.monotonic())
+        if self.backend is not None:
+            try:
+                self.backend.set(key, body)
+            except Exception as e:
+                print(f'route cache backend error: {e}')
+
+    def _store(self, key, body, now):
+        if len(body) > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (now + self.ttl, body)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, body = self.entries.pop(key)
+        self.size -= len(body)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'backend_hits': self.backend_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'version': self.version,
+            }
+
+
+def create_route_cache():
+    """Build the cache from ROUTE_CACHE_* environment variables."""
+    max_bytes = int(float(os.getenv('ROUTE_CACHE_MAX_MB', '64')) * 2**20)
+    ttl = float(os.getenv('ROUTE_CACHE_TTL_SECONDS', '600'))
+    backend = None
+    redis_url = os.getenv('ROUTE_CACHE_REDIS_URL')
+    if redis_url:
+        try:
+            backend = RedisBackend(redis_url, ttl)
+        except ImportError:
+            print('ROUTE_CACHE_REDIS_URL is set but the redis package is not installed; using the local cache only')
+    return RouteCache(max_bytes=max_bytes, ttl=ttl, backend=backend)
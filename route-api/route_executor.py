@@ -0,0 +1,306 @@
+"""Parallel candidate route generation on a pool of worker processes.
+
+One request's candidate space is split into independent search tasks (the
+corners of the Pareto preference space, slices of the label search's distance
+window, loop samplers with different seeds),
+which run on a ``ProcessPoolExecutor``. Each worker opens the graph snapshot
+with ``np.memmap`` once at startup, so the graph is shared through the OS page
+cache instead of being pickled to every process; tasks and results only carry
+node ids and a few numbers. A streamed search runs as one task that hands
+each path back through a managed queue as soon as it is found. The parent merges the results, dropping routes
+that more than one task found.
+
+Workers search the snapshot as it was on disk when they started; node
+attribute refreshes applied in the parent only affect scoring and ranking.
+Results from a worker that opened a different snapshot than the parent's
+graph (one published while the pool was starting) are dropped.
+
+Pointed at a tile directory, workers map tiles instead. Each task names the
+tiles of its request's region, and every worker keeps its own LRU of tiles
+and merged regions.
+"""
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+import numpy as np
+from graph_snapshot import snapshot_path, landmarks_path, load_snapshot, snapshot_version
+from graph_tiles import TiledGraph
+from route.BiDirectionalAStar import BiDirectionalAStar, WINDOW
+from route.LoopGenerator import LoopGenerator
+from route.ParetoRouteFinder import ParetoRouteFinder
+from route.SpatialIndex import SpatialIndex
+from route.heuristics import HaversineHeuristic, load_landmarks
+
+# Preference corners searched in parallel; each one yields a different Pareto front
+PARETO_PREFERENCES = [('max', 'max'), ('min', 'max'), ('max', 'min'), ('min', 'min')]
+
+# Set once per worker process by _start_worker
+_worker = {}
+
+
+def _start_worker(path):
+    if os.path.isdir(path):
+        tiles = TiledGraph(path)
+        _worker.update(tiles=tiles, version=tiles.version)
+        return
+    graph, node_store, header = load_snapshot(path)
+    heuristic = HaversineHeuristic(node_store.longitude, node_store.latitude)
+    landmarks = load_landmarks(landmarks_path, graph, header['checksum'], fallback=heuristic)
+    _worker.update(graph=graph, node_store=node_store, heuristic=landmarks or heuristic, spatial_index=None,
+                   version=snapshot_version(header))
+
+
+def _snapshot_version():
+    return _worker['version']
+
+
+def _spatial_index():
+    # Only loop tasks snap waypoints, so the index is built on a worker's first one
+    if _worker['spatial_index'] is None:
+        graph, node_store = _worker['graph'], _worker['node_store']
+        _worker['spatial_index'] = SpatialIndex(node_store.longitude, node_store.latitude,
+                                                mask=graph.degrees() > 0, component=graph.component)
+    return _worker['spatial_index']
+
+
+def _search_state(options, loop):
+    """``(graph, node_store, spatial_index, heuristic)`` a task searches; the index is only looked up for loops."""
+    if 'tiles' in options:
+        return _worker['tiles'].region(options['tiles'])
+    spatial_index = _spatial_index() if loop else None
+    return _worker['graph'], _worker['node_store'], spatial_index, _worker['heuristic']
+
+
+def _counters(finder):
+    return {
+        counter: getattr(finder, counter)
+        for counter in ('truncated', 'nodes_expanded', 'labels_created', 'attempts') if hasattr(finder, counter)
+    }
+
+
+def run_task(task):
+    """Run one search task in a worker; returns ``(paths, counters, snapshot version)`` with paths as int64 id arrays."""
+    kind, source, target, input_distance, options = task
+    graph, node_store, spatial_index, heuristic = _search_state(options, kind == 'loop')
+    if kind == 'loop':
+        finder = LoopGenerator(graph, node_store, spatial_index, heuristic=heuristic, seed=options['seed'])
+        paths = finder.generate(source, input_distance, count=options['count'], time_budget=options['time_budget'])
+    elif kind == 'pareto':
+        finder = ParetoRouteFinder(graph, node_store, elevation_pref=options['elevation_pref'], poi_pref=options['poi_pref'],
+                                   heuristic=heuristic, time_budget=options['time_budget'],
+                                   max_expansions=options['max_expansions'])
+        paths = finder.find_pareto_routes(source, target, input_distance, options['max_elevation_change'])
+    else:
+        finder = BiDirectionalAStar(graph, node_store, heuristic=heuristic, time_budget=options['time_budget'],
+                                    max_expansions=options['max_expansions'])
+        paths = finder.find_paths_within_distance(source, target, input_distance, window=options['window'])
+    return [(np.asarray(path, dtype=np.int64), distance) for path, distance in paths], _counters(finder), _worker['version']
+
+
+def run_stream_task(task, paths, stop):
+    """Run one streamed search in a worker, putting each path on the ``paths`` queue as soon as it is found.
+
+    Items are ``(path_ids, distance, snapshot version)``; a last ``(None, counters,
+    snapshot version)`` ends the stream. The search stops early once ``stop`` is set.
+    """
+    kind, source, target, input_distance, options = task
+    graph, node_store, spatial_index, heuristic = _search_state(options, kind == 'loop')
+    if kind == 'loop':
+        finder = LoopGenerator(graph, node_store, spatial_index, heuristic=heuristic)
+        found = finder.iter_loops(source, input_distance, count=options['count'], time_budget=options['time_budget'])
+    else:
+        finder = BiDirectionalAStar(graph, node_store, heuristic=heuristic, max_expansions=options['max_expansions'])
+        # Deadlines travel as a budget, since monotonic clocks are per process on some platforms
+        found = finder.iter_paths_within_distance(source, target, input_distance,
+                                                  time.monotonic() + options['time_budget'])
+    try:
+        for path, distance in found:
+            paths.put((np.asarray(path, dtype=np.int64), distance, _worker['version']))
+            if stop.is_set():
+                break
+    finally:
+        found.close()
+        paths.put((None, _counters(finder), _worker['version']))
+
+
+class ParallelSearch:
+    """Merged outcome of one request's tasks: the distinct paths plus summed counters."""
+
+    def __init__(self, paths, counters, tasks):
+        self.paths = paths
+        self.tasks = tasks
+        self.truncated = any(task_counters.get('truncated', False) for task_counters in counters)
+        for counter in ('nodes_expanded', 'labels_created', 'attempts'):
+            values = [task_counters[counter] for task_counters in counters if counter in task_counters]
+            if values:
+                setattr(self, counter, sum(values))
+
+
+class StreamedSearch:
+    """Paths of one streamed search as a worker finds them; the counters are set once it ends."""
+
+    def __init__(self, future, paths, stop, version, timeout):
+        self.future = future
+        self.queue = paths
+        self.stop = stop
+        self.version = version
+        self.timeout = timeout
+        self.truncated = False
+
+    def paths(self):
+        """Yield ``(path_ids, distance)`` as they arrive; closing the generator stops the worker's search."""
+        give_up = time.monotonic() + self.timeout
+        try:
+            while True:
+                try:
+                    path, value, version = self.queue.get(timeout=0.1)
+                except (EOFError, OSError):
+                    # The manager stopped: the pool was retired while the client was still reading
+                    self.truncated = True
+                    return
+                except queue.Empty:
+                    # A worker that died, or a task still queued past its budget, never ends its stream
+                    if self.future.done() or time.monotonic() > give_up:
+                        if self.future.done() and self.future.exception() is not None:
+                            print(f'route task failed: {self.future.exception()!r}')
+                        self.truncated = True
+                        return
+                    continue
+                if self.version is not None and version != self.version:
+                    self.truncated = True
+                    return
+                if path is None:
+                    for counter, count in value.items():
+                        setattr(self, counter, count)
+                    return
+                yield path.tolist(), value
+        finally:
+            try:
+                self.stop.set()
+            except (EOFError, OSError):
+                pass
+
+
+class RouteExecutor:
+    """Process pool that splits route requests into independent searches.
+
+    Workers are spawned rather than forked: forking a threaded web server can
+    copy held locks into the child, and loading the memory-mapped snapshot
+    only reads its header, so a fresh interpreter starts quickly anyway.
+    """
+
+    def __init__(self, workers, path=snapshot_path, version=None):
+        self.workers = workers
+        self.path = path
+        self.version = version  # Snapshot version the parent's graph came from; None accepts any
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_start_worker, initargs=(path,))
+        self.manager = None
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'RouteExecutor with {self.workers} workers on {self.path}'
+
+    def warm(self):
+        """Start every worker and the stream manager now, so the first requests do not wait for processes to spawn."""
+        wait([self.pool.submit(_snapshot_version) for _ in range(self.workers)])
+        self._manager()
+
+    def _manager(self):
+        with self.lock:
+            if self.manager is None:
+                # Queues handed to pool workers must be proxies, served by this process
+                self.manager = multiprocessing.get_context('spawn').Manager()
+            return self.manager
+
+    def tasks(self, kind, source, target, input_distance, time_budget, max_expansions,
+              count=5, max_elevation_change=float('inf'), tiles=None):
+        """Split one request into ``(kind, source, target, input_distance, options)`` tasks.
+
+        ``tiles`` names the tiles to search when the pool serves a tile directory.
+        """
+        region = {} if tiles is None else {'tiles': tiles}
+        if kind == 'loop':
+            # Every sampler draws its own waypoints; together they look for a few more loops than needed
+            per_task = max(math.ceil(count / self.workers), 2)
+            return [
+                ('loop', source, target, input_distance, {'seed': seed, 'count': per_task, 'time_budget': time_budget, **region})
+                for seed in range(self.workers)
+            ]
+        if kind == 'pareto':
+            return [
+                ('pareto', source, target, input_distance, {
+                    'elevation_pref': elevation_pref, 'poi_pref': poi_pref, 'time_budget': time_budget,
+                    'max_expansions': max_expansions, 'max_elevation_change': max_elevation_change, **region,
+                })
+                for elevation_pref, poi_pref in PARETO_PREFERENCES
+            ]
+        # One slice of the distance window per worker; a slice prunes at its own upper end, so lower ones finish first
+        bounds = np.linspace(*WINDOW, self.workers + 1).tolist()
+        return [
+            ('bidir', source, target, input_distance, {
+                'window': window, 'time_budget': time_budget, 'max_expansions': max_expansions, **region,
+            })
+            for window in zip(bounds[:-1], bounds[1:])
+        ]
+
+    def search(self, kind, source, target, input_distance, time_budget, max_expansions, **options):
+        """Run a request's tasks in parallel and return a ``ParallelSearch`` of distinct ``(path_ids, distance)``."""
+        tasks = self.tasks(kind, source, target, input_distance, time_budget, max_expansions, **options)
+        futures = [self.pool.submit(run_task, task) for task in tasks]
+        # Tasks stop at their own budget; the slack covers queueing behind other requests' tasks
+        done, not_done = wait(futures, timeout=time_budget * (1 + len(tasks) / self.workers) + 1.0)
+        for future in not_done:
+            future.cancel()
+
+        paths, counters, seen = [], [], set()
+        for future in futures:
+            if future not in done or future.exception() is not None:
+                if future in done:
+                    print(f'route task failed: {future.exception()!r}')
+                counters.append({'truncated': True})
+                continue
+            task_paths, task_counters, version = future.result()
+            if self.version is not None and version != self.version:
+                counters.append({'truncated': True})
+                continue
+            counters.append(task_counters)
+            for path, distance in task_paths:
+                # The same route often sits on several fronts; keep its first copy
+                key = path.tobytes()
+                if key not in seen:
+                    seen.add(key)
+                    paths.append((path.tolist(), distance))
+        return ParallelSearch(paths, counters, len(tasks))
+
+    def stream(self, kind, source, target, input_distance, time_budget, max_expansions, count=5, tiles=None):
+        """Run one search on a worker and return a ``StreamedSearch`` whose paths arrive while it runs.
+
+        ``kind`` is ``'loop'`` or ``'bidir'``; the stream is a single task, so its
+        paths keep the order the search finds them in.
+        """
+        manager = self._manager()
+        paths, stop = manager.Queue(), manager.Event()
+        options = {'count': count, 'time_budget': time_budget, 'max_expansions': max_expansions}
+        if tiles is not None:
+            options['tiles'] = tiles
+        future = self.pool.submit(run_stream_task, (kind, source, target, input_distance, options), paths, stop)
+        # Same slack as ``search`` for waiting behind other requests' tasks
+        return StreamedSearch(future, paths, stop, self.version, time_budget * (1 + 1 / self.workers) + 1.0)
+
+    def shutdown(self, wait=True, cancel_futures=True):
+        self.pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+        if self.manager is not None:
+            self.manager.shutdown()
+
+
+def create_route_executor(path=snapshot_path, version=None):
+    """Build the executor from ROUTE_WORKERS (0, the default, keeps searches in-process)."""
+    workers = int(os.getenv('ROUTE_WORKERS', '0'))
+    if workers <= 0 or not os.path.exists(path):
+        return None
+    return RouteExecutor(workers, path, version)
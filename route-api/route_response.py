@@ -0,0 +1,34 @@
+from route.polyline import encode_polyline, encode_ids
+
+def route_payload(graph, node_store, packed, scores, i, precision=None):
+    """Response entry for route ``i`` of a scored batch: geometry, POIs and metrics.
+
+    By default the geometry is a list of (lat, lon) pairs; with ``precision``
+    it is an encoded polyline plus the delta-coded node ids instead.
+    """
+    indices = packed.path(i)
+    is_poi = node_store.is_poi
+    poi_nodes = [{
+        "coordinates": (float(node_store.latitude[node]), float(node_store.longitude[node])),
+        "description": node_store.description(node)
+    } for node in indices[is_poi[indices]].tolist()]
+    if precision is None:
+        geometry = {"path_segments": node_store.coordinates(indices)}
+    else:
+        geometry = {
+            "polyline": encode_polyline(node_store.latitude[indices], node_store.longitude[indices], precision),
+            "node_ids": encode_ids(graph.node_ids[indices]),
+        }
+    return {
+        **geometry,
+        "poi_nodes": poi_nodes,
+        "distance": round(float(scores.distance[i]) / 1000, 2),
+        "elevation_change": round(float(scores.elevation_change[i]), 2),
+        "poi_count": int(scores.distinct_poi_count[i])
+    }
+
+def geometry_precision(data):
+    """Polyline precision requested with ``"geometry": "polyline"``, or None for coordinate lists."""
+    if data.get('geometry') != 'polyline':
+        return None
+    return max(0, min(int(data.get('precision', 5)), 9))
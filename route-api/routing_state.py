@@ -0,0 +1,184 @@
+"""The routing graph being served and everything derived from it, swapped as a unit.
+
+A ``RoutingState`` bundles one snapshot's graph and node store with its
+spatial index, heuristic, contraction hierarchy and worker pool. Requests take
+``routing.state`` once and use only that, so a swap never mixes the indices of
+two snapshots. When ``graph_update.py`` (or ``graph_snapshot.py build``)
+renames a new snapshot into place, ``SnapshotWatcher`` notices on its next
+poll. It loads the new state on a background thread while requests keep using
+the current one, then swaps it in with a single assignment. Landmark and
+hierarchy files written later for the same snapshot are picked up the same way.
+
+With ``GRAPH_TILES=1`` the watched path is a tile directory (see
+``graph_tiles``) and the state is a ``TiledState``. Such a state builds a
+``RoutingState`` for each request from only the tiles its search can reach.
+A newly published tile index is swapped in the same way.
+"""
+import os
+import threading
+import time
+from create_graph import build_spatial_index, build_heuristic, build_hierarchy
+from graph_snapshot import snapshot_path, landmarks_path, hierarchy_path, load_snapshot, snapshot_version
+from graph_tiles import TiledGraph, tile_index_path, SEARCH_RADIUS_FACTOR, SNAP_RADIUS
+from route_executor import create_route_executor
+
+snapshot_poll_interval = float(os.getenv('GRAPH_SNAPSHOT_POLL_SECONDS', '30'))
+# A retired worker pool is shut down only after requests that took the old state have submitted their tasks
+RETIRE_DELAY_SECONDS = 10
+
+
+class RoutingState:
+    def __init__(self, graph, node_store, spatial_index, heuristic, hierarchy, executor=None, files=None, tiles=None):
+        self.graph = graph
+        self.node_store = node_store
+        self.spatial_index = spatial_index
+        self.heuristic = heuristic
+        self.hierarchy = hierarchy
+        self.executor = executor
+        self.files = files  # snapshot_files() when loaded, to tell when a newer snapshot is published
+        self.tiles = tiles  # Names of the tiles the graph was merged from, None for a whole snapshot
+
+    def __repr__(self):
+        return f'RoutingState of snapshot {self.graph.version}: {self.graph}'
+
+    def for_request(self, source, target, input_distance):
+        """The state a request searches; the whole snapshot serves every request."""
+        return self
+
+    def refresh_if_due(self):
+        return self.node_store.refresh_if_due()
+
+    def retire(self):
+        """Let the worker pool finish the tasks already queued on it, then stop it."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=False)
+
+
+class TiledState:
+    """Serves a tiled snapshot: each request gets a ``RoutingState`` over the tiles around its endpoints."""
+
+    # Tiles are not refreshed from node_changes; rebuilding them picks the changes up
+    node_store = None
+
+    def __init__(self, tiles, executor=None, files=None):
+        self.tiles = tiles
+        self.executor = executor
+        self.files = files
+
+    def __repr__(self):
+        return f'TiledState of {self.tiles}'
+
+    def for_request(self, source, target, input_distance):
+        """``RoutingState`` of the tiles a request may route through; ``source``/``target`` are [lat, lon] pairs.
+
+        No point of a route the finders accept is farther from the start than
+        the longest distance they accept, so tiles outside that disc are never
+        mapped. The target's own tile is added so it snaps even when it is
+        out of reach.
+        """
+        names = self.tiles.tiles_around(source[1], source[0], input_distance * SEARCH_RADIUS_FACTOR + SNAP_RADIUS)
+        names |= self.tiles.tiles_around(target[1], target[0], SNAP_RADIUS)
+        graph, node_store, spatial_index, heuristic = self.tiles.region(names)
+        return RoutingState(graph, node_store, spatial_index, heuristic, None, self.executor, self.files, tuple(sorted(names)))
+
+    def refresh_if_due(self):
+        return 0
+
+    def retire(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=False)
+
+
+def snapshot_files(path=snapshot_path):
+    """Identity of the snapshot (or tile index), landmark and hierarchy files; a rename into place changes the inode."""
+    if os.path.isdir(path):
+        path = tile_index_path(path)
+    identity = []
+    for file in (path, f'{landmarks_path}.npy', f'{hierarchy_path}.npz'):
+        try:
+            stat = os.stat(file)
+            identity.append((stat.st_ino, stat.st_mtime_ns))
+        except OSError:
+            identity.append(None)
+    return tuple(identity)
+
+
+def derive_state(graph, node_store, checksum, files=None, path=snapshot_path):
+    """Build the indexes derived from a graph and node store into a ``RoutingState``."""
+    spatial_index = build_spatial_index(graph, node_store)
+    heuristic = build_heuristic(graph, node_store, checksum)
+    hierarchy = build_hierarchy(graph, checksum)
+    executor = create_route_executor(path, version=graph.version)
+    if executor is not None:
+        executor.warm()
+        print(executor)
+    return RoutingState(graph, node_store, spatial_index, heuristic, hierarchy, executor, files)
+
+
+def load_state(path=snapshot_path):
+    """``RoutingState`` of the snapshot at ``path`` (``TiledState`` of a tile directory).
+
+    Raises OSError or ValueError if it cannot be opened.
+    """
+    files = snapshot_files(path)
+    if os.path.isdir(path):
+        tiles = TiledGraph(path)
+        executor = create_route_executor(path, version=tiles.version)
+        if executor is not None:
+            executor.warm()
+            print(executor)
+        return TiledState(tiles, executor, files)
+    graph, node_store, header = load_snapshot(path)
+    graph.version = snapshot_version(header)
+    return derive_state(graph, node_store, header['checksum'], files, path)
+
+
+class SnapshotWatcher:
+    """Holds the ``RoutingState`` being served and swaps in newer snapshots without a restart."""
+
+    def __init__(self, state, path=snapshot_path):
+        self.state = state
+        self.path = path
+        self.checked_at = time.monotonic()
+        self.loading = False
+        self.failed_files = None  # A published snapshot that could not be loaded is not retried
+        self.swaps = 0
+        self.lock = threading.Lock()
+
+    def check_if_due(self):
+        """Start loading a newly published snapshot if the poll interval passed; returns True if one was found."""
+        now = time.monotonic()
+        if now - self.checked_at < snapshot_poll_interval or self.loading:
+            return False
+        self.checked_at = now
+        files = snapshot_files(self.path)
+        if files[0] is None or files in (self.state.files, self.failed_files):
+            return False
+        with self.lock:
+            if self.loading:
+                return False
+            self.loading = True
+        threading.Thread(target=self.reload, args=(files,), name='snapshot-reload', daemon=True).start()
+        return True
+
+    def reload(self, files):
+        """Load the snapshot on disk and swap it in; on failure keep serving the current one."""
+        try:
+            started = time.monotonic()
+            state = load_state(self.path)
+            retired, self.state = self.state, state
+            self.swaps += 1
+            print(f'swapped in {state} after {time.monotonic() - started:.1f}s')
+        except (OSError, ValueError) as e:
+            print(f'cannot load graph snapshot {self.path} ({e}), keeping {self.state}')
+            self.failed_files = files
+            return
+        finally:
+            self.loading = False
+        time.sleep(RETIRE_DELAY_SECONDS)
+        retired.retire()
+
+    def refresh_if_due(self):
+        """Per-request upkeep: look for a new snapshot, then apply node attribute changes to the current one."""
+        self.check_if_due()
+        return self.state.refresh_if_due()
@@ -21,6 +21,7 @@ import {
   Autocomplete,
 } from "@mui/material";
 import "./App.css";
+import { decodePolyline } from "./polyline";
 import icon from "leaflet/dist/images/marker-icon.png";
 import iconShadow from "leaflet/dist/images/marker-shadow.png";
 import L from "leaflet";
@@ -33,6 +34,7 @@ let DefaultIcon = L.icon({
 L.Marker.prototype.options.icon = DefaultIcon;
 
 const BACKEND_BASE_URL = "http://127.0.0.1:5000";
+const POLYLINE_PRECISION = 5;
 
 function App() {
   const [distanceInput, setDistanceInput] = useState(""); // Input distance as string for safe handling
@@ -124,6 +126,8 @@ function App() {
           elevation_range: elevationRange,
           poi_min: poiMin,
           priority_factor: priorityFactor,
+          geometry: "polyline",
+          precision: POLYLINE_PRECISION,
         }),
       });
 
@@ -135,9 +139,15 @@ function App() {
 
       if (!response.ok) throw new Error("Failed to fetch route");
 
-      const bestPath = data.best_path;
+      // The compact format references the best route by index and encodes its geometry
+      const bestPath =
+        data.format === "polyline" ? data.paths[data.best_path] : data.best_path;
+      const pathSegments =
+        data.format === "polyline"
+          ? decodePolyline(bestPath.polyline, data.precision)
+          : bestPath.path_segments;
 
-      setPathData(bestPath.path_segments);
+      setPathData(pathSegments);
       setDistance(bestPath.distance);
       setPoiNodes(bestPath.poi_nodes);
       setElevationChange(bestPath.elevation_change);
@@ -0,0 +1,39 @@
+// Decode the backend's polyline encoding into a list of integers. Uses arithmetic
+// instead of bitwise operators, which would truncate large node id deltas to 32 bits.
+export const decodeValues = (text) => {
+  const values = [];
+  let value = 0;
+  let scale = 1;
+  for (let i = 0; i < text.length; i++) {
+    const chunk = text.charCodeAt(i) - 63;
+    value += (chunk % 32) * scale;
+    scale *= 32;
+    if (chunk < 32) {
+      values.push(value % 2 ? -(value + 1) / 2 : value / 2);
+      value = 0;
+      scale = 1;
+    }
+  }
+  return values;
+};
+
+// Encoded polyline -> [[lat, lng], ...]
+export const decodePolyline = (text, precision) => {
+  const values = decodeValues(text);
+  const factor = Math.pow(10, precision);
+  const points = [];
+  let lat = 0;
+  let lng = 0;
+  for (let i = 0; i + 1 < values.length; i += 2) {
+    lat += values[i];
+    lng += values[i + 1];
+    points.push([lat / factor, lng / factor]);
+  }
+  return points;
+};
+
+// Delta-coded node ids -> absolute OSM node ids
+export const decodeNodeIds = (text) => {
+  let id = 0;
+  return decodeValues(text).map((delta) => (id += delta));
+};